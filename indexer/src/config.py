@@ -1,11 +1,14 @@
 import logging
 import os
 import re
-from typing import Dict, Optional
+from typing import TYPE_CHECKING, Dict, Optional, Union
 
 import boto3
 from requests.auth import HTTPBasicAuth
 
+if TYPE_CHECKING:
+    from index_core.s3_index import S3ObjectIndex
+
 logger = logging.getLogger(__name__)
 
 # env vars to be set in docker, or locally if connecting to local nodes
@@ -32,8 +35,27 @@ AWS_S3_CLIENT = boto3.client(
 AWS_CLOUDFRONT_DISTRIBUTION_ID = os.environ.get("AWS_CLOUDFRONT_DISTRIBUTION_ID", None)
 AWS_S3_BUCKETNAME = os.environ.get("AWS_S3_BUCKETNAME", None)
 AWS_S3_IMAGE_DIR = os.environ.get("AWS_S3_IMAGE_DIR", None)
-S3_OBJECTS: Dict[str, Dict[str, str]] = {}
+# key -> md5 of the objects in the bucket, an index_core.s3_index.S3ObjectIndex once loaded
+S3_OBJECTS: Union[Dict[str, str], "S3ObjectIndex"] = {}
 AWS_INVALIDATE_CACHE = os.environ.get("AWS_INVALIDATE_CACHE", None)
+# threads uploading stamp files to S3 in the background, 0 uploads them while parsing
+S3_UPLOAD_WORKERS = int(os.environ.get("S3_UPLOAD_WORKERS", 4))
+# uploads waiting for a worker before parsing waits for room
+S3_UPLOAD_QUEUE_SIZE = int(os.environ.get("S3_UPLOAD_QUEUE_SIZE", 1000))
+# directory keeping the files to upload until they are in S3
+S3_UPLOAD_SPOOL_DIR = os.environ.get("S3_UPLOAD_SPOOL_DIR", "s3_spool")
+# seconds the CloudFront invalidation of a replaced file waits for others before a batch is sent
+AWS_INVALIDATION_INTERVAL = int(os.environ.get("AWS_INVALIDATION_INTERVAL", 60))
+# waiting CloudFront invalidations that are sent as a batch without waiting for the interval, at most 3000
+AWS_INVALIDATION_BATCH_SIZE = int(os.environ.get("AWS_INVALIDATION_BATCH_SIZE", 1000))
+# sqlite file keeping the CloudFront invalidations until CloudFront accepted them
+AWS_INVALIDATION_SPOOL_FILE = os.environ.get(
+    "AWS_INVALIDATION_SPOOL_FILE", os.path.join(S3_UPLOAD_SPOOL_DIR, "invalidations.sqlite")
+)
+# objects per page of the S3 listing that fills the s3objects table, written and committed together, at most 1000
+S3_INVENTORY_PAGE_SIZE = int(os.environ.get("S3_INVENTORY_PAGE_SIZE", 1000))
+# list the bucket again on every start for the objects modified since the last listing
+S3_INVENTORY_INCREMENTAL = os.environ.get("S3_INVENTORY_INCREMENTAL", "false").lower() in ("1", "true", "yes")
 
 # Define for Quicknode or similar remote nodes which use a token
 QUICKNODE_URL = os.environ.get("QUICKNODE_URL", None)
@@ -53,6 +75,8 @@ STAMP_TABLE = "StampTableV4"
 SRC20_TABLE = "SRC20"
 SRC20_VALID_TABLE = "SRC20Valid"
 SRC20_BALANCES_TABLE = "balances"
+BALANCE_SNAPSHOTS_TABLE = "balance_snapshots"
+UNDO_JOURNAL_TABLE = "undo_journal"
 SRC_BACKGROUND_TABLE = "srcbackground"
 
 DOMAINNAME = os.environ.get("DOMAINNAME", "stampchain.io")
@@ -263,6 +287,42 @@ DEFAULT_REQUESTS_TIMEOUT = 20  # 20 seconds
 BACKEND_RAW_TRANSACTIONS_CACHE_SIZE = 20000
 BACKEND_RPC_BATCH_NUM_WORKERS = 6
 
+# Blocks closer than this to the tip are checked for reorgs before being parsed
+REORG_CHECK_DEPTH: int = 100
+# Number of blocks fetched and decoded ahead of the one being parsed, 0 disables prefetching
+BLOCK_PREFETCH_DEPTH = int(os.environ.get("BLOCK_PREFETCH_DEPTH", 4))
+# "thread" decodes each tx on a thread pool, "process" ships per-block batches of raw txs to worker processes
+TX_DECODE_MODE = os.environ.get("TX_DECODE_MODE", "thread")
+TX_DECODE_WORKERS = int(os.environ.get("TX_DECODE_WORKERS", os.cpu_count() or 4))
+# outpoint -> scriptPubKey cache used to resolve stamp sources without asking the backend
+PREVOUT_CACHE_SIZE = int(os.environ.get("PREVOUT_CACHE_SIZE", 200000))
+PREVOUT_CACHE_FILE = os.environ.get("PREVOUT_CACHE_FILE", None)  # saved every PREVOUT_CACHE_SAVE_INTERVAL blocks if set
+PREVOUT_CACHE_SAVE_INTERVAL: int = 1000
+# keep-alive connections to the node: one per RPC batch worker, per prefetch thread and for the main thread
+BACKEND_RPC_POOL_SIZE = int(os.environ.get("BACKEND_RPC_POOL_SIZE", BACKEND_RPC_BATCH_NUM_WORKERS + BLOCK_PREFETCH_DEPTH + 1))
+BACKEND_RPC_TRIES: int = 12
+BACKEND_RPC_BACKOFF_BASE: float = 0.5  # seconds, doubled on every retry and jittered
+BACKEND_RPC_BACKOFF_MAX: float = 30.0
+# blocks per CP get_blocks call, on CP servers that handle multi-block requests
+CP_BLOCK_RANGE_SIZE = int(os.environ.get("CP_BLOCK_RANGE_SIZE", 50))
+CP_MULTI_BLOCK_MIN_VERSION: int = 10
+# number of blocks past the one being parsed whose CP issuances are fetched in the background
+CP_PREFETCH_WINDOW = int(os.environ.get("CP_PREFETCH_WINDOW", 500))
+CP_PREFETCH_WORKERS: int = 16
+# sqlite file keeping the CP issuances of confirmed blocks across restarts, disabled if not set
+CP_ISSUANCE_CACHE_FILE = os.environ.get("CP_ISSUANCE_CACHE_FILE", None)
+# keep the SRC-20 balances table in memory and answer balance lookups from it
+SRC20_BALANCE_ENGINE = os.environ.get("SRC20_BALANCE_ENGINE", "false").lower() in ("1", "true", "yes")
+# blocks between snapshots of the SRC-20 balances, rebuild_balances replays only the blocks after the latest one, 0 disables
+BALANCE_SNAPSHOT_INTERVAL = int(os.environ.get("BALANCE_SNAPSHOT_INTERVAL", 10000))
+BALANCE_SNAPSHOT_KEEP: int = 2
+# blocks whose balance changes and SRC20 rows are journaled so that a reorg can undo them, 0 disables
+BLOCK_UNDO_DEPTH = int(os.environ.get("BLOCK_UNDO_DEPTH", REORG_CHECK_DEPTH))
+# read the previous consensus hashes back from the blocks table and verify them against stored ones, for audits
+CONSENSUS_HASH_VERIFY_DB = os.environ.get("CONSENSUS_HASH_VERIFY_DB", "false").lower() in ("1", "true", "yes")
+# blocks reparsed from the transactions table per read and commit
+REPARSE_BATCH_BLOCKS = int(os.environ.get("REPARSE_BATCH_BLOCKS", 100))
+
 from typing import Dict, List, Union
 
 LEGACY_COLLECTIONS: List[Dict[str, Union[str, List[str], List[int], Optional[bool]]]] = [
@@ -1,11 +1,22 @@
 # from botocore.exceptions import NoCredentialsError
 import logging
+import os
+import queue
+import sqlite3
+import threading
 import time
+import uuid
+import zlib
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
 
 import boto3
+import pymysql as mysql
 
 import config
 import index_core.log as log
+from index_core.database import upgrade_schema
+from index_core.s3_index import S3ObjectIndex
 
 logger = logging.getLogger(__name__)
 log.set_logger(logger)  # set root logger
@@ -13,62 +24,170 @@ log.set_logger(logger)  # set root logger
 """ these functions are for optional file upload to AWS S3 and Cloudfront CDN file invalidation when there is an update."""
 
 
-def get_s3_objects(db, bucket_name, s3_client):
+InventoryState = namedtuple("InventoryState", ["last_key", "watermark", "run_started", "complete"])
+
+# S3 stamps LastModified with its own clock, a listing is dated back by this much to cover the difference
+S3_CLOCK_SKEW = timedelta(minutes=5)
+
+
+def get_s3_objects(db, bucket_name, s3_client, incremental=config.S3_INVENTORY_INCREMENTAL):
     """
     Retrieves existing file paths and md5 hashes in S3 to avoid reuploading existing files, which can add to AWS costs.
 
+    The bucket is listed into the s3objects table by `sync_s3_inventory` if it never
+    was or the last listing was interrupted, and the table is then read back.
+
     Args:
         db (object): The database connection object.
         bucket_name (str): The name of the S3 bucket.
         s3_client (object): The S3 client object.
+        incremental (bool): List the bucket again for the objects modified since the last listing.
 
     Returns:
-        dict: A dictionary mapping keys to dictionaries containing the keys and MD5 hashes of the existing S3 objects.
+        S3ObjectIndex: The MD5 hashes of the existing S3 objects, keyed by key.
     """
+    upgrade_schema(db)
+    sync_s3_inventory(db, bucket_name, s3_client, config.AWS_S3_IMAGE_DIR or "", incremental=incremental)
+    with db.cursor(mysql.cursors.SSCursor) as stream:
+        stream.execute("SELECT path_key, md5 FROM s3objects")
+        results = S3ObjectIndex.from_items(stream, prefix=config.AWS_S3_IMAGE_DIR or "")
+    logger.warning(f"Found {len(results)} existing S3 objects from database")
+    return results
 
-    def process_page(page):
-        if "Contents" in page[1]:
-            for obj in page[1]["Contents"]:
-                key = obj["Key"]
-                md5 = obj["ETag"].strip('"')
-                results[key] = {"key": key, "md5": md5}
-
-    logger.warning(f"Checking for existing S3 objects in database: {bucket_name}/{config.AWS_S3_IMAGE_DIR}...")
-    cursor = db.cursor()
-    cursor.execute("SELECT path_key, md5 FROM s3objects")
-    results = cursor.fetchall() or {}
-    results = {row[0]: {"key": row[0], "md5": row[1]} for row in results}
-    cursor.close()
-    if results:
-        logger.warning(f"Found {len(results)} existing S3 objects from database")
-    else:
-        logger.warning("No existing S3 objects found in database")
-        paginator = s3_client.get_paginator("list_objects_v2")
 
-        logger.warning(f"Fetching S3 objects from bucket: {bucket_name}/{config.AWS_S3_IMAGE_DIR}... please wait...")
+def sync_s3_inventory(db, bucket_name, s3_client, prefix, incremental=False, page_size=config.S3_INVENTORY_PAGE_SIZE):
+    """
+    List the objects of a bucket prefix into the s3objects table, one page at a time.
 
-        start_time = time.time()
-        pages = list(
-            paginator.paginate(
-                Bucket=bucket_name,
-                Prefix=config.AWS_S3_IMAGE_DIR,
-                PaginationConfig={"PageSize": 10000},
-            )
+    Each page is written and committed with the last key it listed, so an
+    interrupted listing resumes after that key. A completed listing leaves the
+    time it started as the watermark, and an incremental listing only writes the
+    objects modified after it. S3 lists by key and not by date, so an incremental
+    listing still reads every page.
+
+    Args:
+        db (object): The database connection object.
+        bucket_name (str): The name of the S3 bucket.
+        s3_client (object): The S3 client object.
+        prefix (str): The prefix of the keys to list.
+        incremental (bool): List the prefix again even if a listing completed.
+        page_size (int): The objects per page, at most 1000.
+
+    Returns:
+        int: The number of objects written, or None if the prefix was already listed.
+    """
+    scope = f"{bucket_name}/{prefix}"
+    state = read_inventory_state(db, scope)
+    if state is not None and state.complete and not incremental:
+        return None
+    if state is None or state.complete:
+        state = InventoryState(
+            None, state.watermark if state else None, datetime.now(timezone.utc).replace(tzinfo=None) - S3_CLOCK_SKEW, False
         )
-        total_pages = len(pages)
-        end_time = time.time()
-        execution_time = end_time - start_time
-        print(f"Execution time: {execution_time} seconds for {total_pages} pages")
+        save_inventory_state(db, scope, state)
+        since = f" modified since {state.watermark}" if state.watermark else ""
+        logger.warning(f"Listing the S3 objects of {scope}{since}... please wait...")
+    else:
+        logger.warning(f"Resuming the listing of the S3 objects of {scope} after {state.last_key}...")
+
+    start_time = time.time()
+    pages = written = 0
+    for last_key, objects in iter_s3_pages(s3_client, bucket_name, prefix, state.last_key, state.watermark, page_size):
+        write_s3_objects(db, objects)
+        state = state._replace(last_key=last_key)
+        save_inventory_state(db, scope, state)
+        pages += 1
+        written += len(objects)
+        if pages % 100 == 0:
+            logger.warning(f"Listed {pages} pages of S3 objects, {written} written, at {last_key}")
+    save_inventory_state(db, scope, InventoryState(None, state.run_started, None, True))
+    logger.warning(f"Listed {pages} pages and wrote {written} S3 objects in {time.time() - start_time:.1f}s")
+    return written
+
+
+def read_inventory_state(db, scope):
+    with db.cursor() as cursor:
+        cursor.execute("SELECT last_key, watermark, run_started, complete FROM s3_inventory WHERE scope = %s", (scope,))
+        row = cursor.fetchone()
+        if row is not None:
+            return InventoryState(row[0], row[1], row[2], bool(row[3]))
+        cursor.execute("SELECT 1 FROM s3objects LIMIT 1")
+        if cursor.fetchone():
+            # filled by a listing made before the listings were tracked
+            return InventoryState(None, None, None, True)
+    return None
+
+
+def save_inventory_state(db, scope, state):
+    """Store the listing state of `scope` and commit it with the objects written so far."""
+    with db.cursor() as cursor:
+        cursor.execute(
+            """INSERT INTO s3_inventory (scope, last_key, watermark, run_started, complete) VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE last_key = VALUES(last_key), watermark = VALUES(watermark),
+                run_started = VALUES(run_started), complete = VALUES(complete)""",
+            (scope, state.last_key, state.watermark, state.run_started, int(state.complete)),
+        )
+    db.commit()
 
-        results = {}
 
-        for page in enumerate(pages, start=1):
-            process_page(page)
+def iter_s3_pages(s3_client, bucket_name, prefix, start_after=None, modified_after=None, page_size=1000):
+    """
+    Yield the objects of a bucket prefix as the listing pages arrive.
+
+    Args:
+        s3_client (object): The S3 client object.
+        bucket_name (str): The name of the S3 bucket.
+        prefix (str): The prefix of the keys to list.
+        start_after (str, optional): List the keys after this one.
+        modified_after (datetime, optional): Only yield the objects modified after this naive UTC time.
+        page_size (int): The objects per page, at most 1000.
 
-        add_s3_objects_to_db(db, results)
-        logger.warning(f"Processed {len(results)} S3 objects")
+    Yields:
+        tuple: The last key of a page, and the (key, md5) of its objects.
+    """
+    paginator = s3_client.get_paginator("list_objects_v2")
+    params = {"Bucket": bucket_name, "Prefix": prefix, "PaginationConfig": {"PageSize": page_size}}
+    if start_after:
+        params["StartAfter"] = start_after
+    for page in paginator.paginate(**params):
+        contents = page.get("Contents")
+        if not contents:
+            continue
+        objects = [
+            (obj["Key"], obj["ETag"].strip('"'))
+            for obj in contents
+            if modified_after is None or obj["LastModified"].astimezone(timezone.utc).replace(tzinfo=None) > modified_after
+        ]
+        yield contents[-1]["Key"], objects
+
+
+def write_s3_objects(db, objects):
+    """
+    Write listed objects to the s3objects table in place of the rows of their keys,
+    except for the keys with an upload in progress.
 
-    return results
+    Args:
+        db (object): The database connection object.
+        objects (list): The (key, md5) of the objects.
+    """
+    if not objects:
+        return
+    with db.cursor() as cursor:
+        placeholders = ", ".join(["%s"] * len(objects))
+        cursor.execute(
+            f"SELECT path_key FROM s3objects WHERE path_key IN ({placeholders}) AND status <> 'uploaded'",  # nosec
+            [key for key, _ in objects],
+        )
+        in_progress = {row[0] for row in cursor.fetchall()}
+        objects = [(key, md5) for key, md5 in objects if key not in in_progress]
+        if not objects:
+            return
+        placeholders = ", ".join(["%s"] * len(objects))
+        cursor.execute(f"DELETE FROM s3objects WHERE path_key IN ({placeholders})", [key for key, _ in objects])  # nosec
+        cursor.executemany(
+            "INSERT IGNORE INTO s3objects (id, path_key, md5) VALUES (%s, %s, %s)",
+            [(f"{key}_{md5}", key, md5) for key, md5 in objects],
+        )
 
 
 def update_s3_db_objects(db, filename, file_obj_md5):
@@ -106,36 +225,6 @@ def update_s3_db_objects(db, filename, file_obj_md5):
         logger.warning(f"ERROR: Unable to update the s3objects table. Error: {e}")
 
 
-def add_s3_objects_to_db(db, s3_objects):
-    """
-    Add S3 objects to the s3objects table
-
-    Args:
-        db (object): The database connection object
-        s3_objects (dict): Dictionary of S3 objects to be added to the database
-
-    Returns:
-        None
-
-    Raises:
-        Exception: If there is an error adding S3 objects to the database
-    """
-    try:
-        cursor = db.cursor()
-
-        query = "INSERT IGNORE INTO s3objects (id, path_key, md5) VALUES (%s, %s, %s)"
-        values = [(key + obj["md5"], key, obj["md5"]) for key, obj in s3_objects.items()]
-
-        # Execute the multi-insert operation
-        cursor.executemany(query, values)
-
-        cursor.close()
-
-        logger.info("S3 objects added to the database successfully")
-    except Exception as e:
-        logger.warning(f"ERROR: Unable to add S3 objects to the database. Error: {e}")
-
-
 def invalidate_s3_files(file_paths, aws_cloudfront_distribution_id):
     """
     Invalidates the specified files in the AWS CloudFront distribution.
@@ -152,7 +241,7 @@ def invalidate_s3_files(file_paths, aws_cloudfront_distribution_id):
         DistributionId=aws_cloudfront_distribution_id,
         InvalidationBatch={
             "Paths": {"Quantity": len(file_paths), "Items": file_paths},
-            "CallerReference": str(hash(tuple(file_paths))),
+            "CallerReference": str(uuid.uuid4()),  # the same paths can be invalidated again later
         },
     )
     return response
@@ -212,9 +301,13 @@ def check_existing_and_upload_to_s3(db, filename, mime_type, file_obj, file_obj_
     if mime_type is None:
         mime_type = "binary/octet-stream"
 
-    existing_obj = config.S3_OBJECTS.get(s3_file_path)
-    if existing_obj:
-        if existing_obj["md5"] == file_obj_md5:
+    staged = upload_queue.staged.get(s3_file_path)
+    existing_md5 = staged.md5 if staged is not None else config.S3_OBJECTS.get(s3_file_path)
+    if upload_queue.enabled and existing_md5 != file_obj_md5:
+        upload_queue.enqueue(db, s3_file_path, file_obj, file_obj_md5, mime_type, replacing=existing_md5 is not None)
+        return
+    if existing_md5 is not None:
+        if existing_md5 == file_obj_md5:
             logger.debug(f"File {filename} with hash {file_obj_md5} already exists in S3. Skipping upload.")
         else:
             try:
@@ -230,9 +323,7 @@ def check_existing_and_upload_to_s3(db, filename, mime_type, file_obj, file_obj_
                 update_s3_db_objects(db, filename, file_obj_md5)
             except Exception as e:
                 logger.warning(f"ERROR: Unable to upload {filename} to S3. Error: {e}")
-            if config.AWS_CLOUDFRONT_DISTRIBUTION_ID and config.AWS_INVALIDATE_CACHE:
-                logger.warning(f"Invalidating {filename} with changed hash {file_obj_md5} in Cloudfront...")
-                invalidate_with_retries(s3_file_path, config.AWS_CLOUDFRONT_DISTRIBUTION_ID)
+            invalidation_batcher.add([s3_file_path])
     else:
         try:
             file_obj.seek(0)
@@ -249,32 +340,339 @@ def check_existing_and_upload_to_s3(db, filename, mime_type, file_obj, file_obj_
             logger.warning(f"ERROR: Unable to upload {filename} to S3. Error: {e}")
 
 
-def invalidate_with_retries(s3_file_path, distribution_id):
+MAX_INVALIDATION_PATHS = 3000  # CloudFront limit of paths in progress per distribution
+
+
+class InvalidationBatcher:
+    """
+    Sends the CloudFront invalidations of replaced files in batches from a
+    background thread, so that parsing never waits on CloudFront.
+
+    Paths are kept in a sqlite spool until CloudFront accepted them, so none is
+    lost to a crash or a CloudFront outage. A batch is sent once
+    `config.AWS_INVALIDATION_BATCH_SIZE` paths are waiting or the oldest has
+    waited `config.AWS_INVALIDATION_INTERVAL` seconds, and a rejected batch is
+    tried again with backoff on the same thread.
     """
-    Invalidates the specified file in the AWS CloudFront distribution with retries.
 
-    Args:
-        s3_file_path (str): The file path to be invalidated.
-        distribution_id (str): The ID of the AWS CloudFront distribution.
+    def __init__(
+        self,
+        path=config.AWS_INVALIDATION_SPOOL_FILE,
+        distribution_id=config.AWS_CLOUDFRONT_DISTRIBUTION_ID,
+        batch_size=config.AWS_INVALIDATION_BATCH_SIZE,
+        interval=config.AWS_INVALIDATION_INTERVAL,
+        invalidate=invalidate_s3_files,
+    ):
+        self.path = path
+        self.distribution_id = distribution_id
+        self.batch_size = min(batch_size, MAX_INVALIDATION_PATHS)
+        self.interval = interval
+        self.invalidate = invalidate
+        self.enabled = bool(distribution_id and config.AWS_INVALIDATE_CACHE)
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.conn = None
+        self.thread = None
+        self.failures = 0
+
+    def _connect(self):
+        if self.conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS invalidations (path TEXT PRIMARY KEY, added REAL NOT NULL)")
+            self.conn.commit()
+        return self.conn
+
+    def start(self):
+        """Start the sender thread, which first sends what the previous run left in the spool."""
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self._run, name="cloudfront-invalidations", daemon=True)
+            self.thread.start()
+
+    def add(self, s3_file_paths):
+        """
+        Spool the invalidation of replaced files.
+
+        Args:
+            s3_file_paths (list): The keys of the replaced files in the bucket.
+        """
+        if not self.enabled or not s3_file_paths:
+            return
+        now = time.time()
+        with self.lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR IGNORE INTO invalidations (path, added) VALUES (?, ?)",
+                [("/" + s3_file_path, now) for s3_file_path in s3_file_paths],
+            )
+            conn.commit()
+        self.start()
+        self.wakeup.set()
+
+    def pending(self):
+        """Return the number of paths waiting to be invalidated."""
+        with self.lock:
+            return self._connect().execute("SELECT COUNT(*) FROM invalidations").fetchone()[0]
+
+    def next_batch(self, now=None):
+        """
+        Return the paths to invalidate now, and otherwise the seconds until the
+        next batch is due, or None if the spool is empty.
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            conn = self._connect()
+            count, oldest = conn.execute("SELECT COUNT(*), MIN(added) FROM invalidations").fetchone()
+            if not count:
+                return None, None
+            wait = oldest + self.interval - now
+            if count < self.batch_size and wait > 0:
+                return None, wait
+            rows = conn.execute("SELECT path FROM invalidations ORDER BY added LIMIT ?", (self.batch_size,)).fetchall()
+        return [row[0] for row in rows], 0
+
+    def send(self, paths):
+        """Invalidate `paths` and drop them from the spool. Returns False if CloudFront rejected them."""
+        try:
+            self.invalidate(paths, self.distribution_id)
+        except Exception as e:
+            self.failures += 1
+            logger.warning(f"WARN: Unable to invalidate {len(paths)} files in Cloudfront (try {self.failures}): {e}")
+            return False
+        self.failures = 0
+        with self.lock:
+            conn = self._connect()
+            conn.executemany("DELETE FROM invalidations WHERE path = ?", [(path,) for path in paths])
+            conn.commit()
+        logger.warning(f"Invalidated {len(paths)} replaced files in Cloudfront")
+        return True
 
-    Returns:
-        None
+    def _run(self):
+        while True:
+            self.wakeup.clear()
+            paths, wait = self.next_batch()
+            if paths is None:
+                self.wakeup.wait(wait)
+            elif not self.send(paths):
+                time.sleep(min(3 * 2 ** min(self.failures - 1, 10), max(self.interval, 3)))
 
-    Raises:
-        Exception: If there is an error invalidating the file in CloudFront.
+
+invalidation_batcher = InvalidationBatcher()
+
+
+UploadTask = namedtuple("UploadTask", ["s3_file_path", "md5", "content_type", "replacing"])
+UploadStats = namedtuple("UploadStats", ["queued", "uploaded", "failed", "blocked_seconds"])
+
+UPLOAD_TRIES = 3
+
+
+class S3UploadQueue:
     """
-    try:
-        invalidate_s3_files(["/" + s3_file_path], distribution_id)
-    except Exception as e:
-        logger.warning(f"WARN: Unable to invalidate {s3_file_path} in Cloudfront. RETRYING: {e}")
-        retries = 5
-        while retries > 0:
-            time.sleep(3)
+    Uploads stamp files to S3 on background threads, so that parsing never waits
+    on S3 unless the queue is full.
+
+    A file to upload is written to the spool directory and recorded as pending
+    in the s3objects table inside the block transaction. The workers upload it
+    from the spool, and the upload is marked done with a later block. Pending
+    rows are queued again by `resume` on startup, so no upload is lost to a
+    restart. The CloudFront invalidations of replaced files are left to the
+    `invalidation_batcher`.
+
+    The uploads of a block are only queued by `commit`, once the block is
+    committed, and `discard` drops them with a rolled back block, whose spooled
+    files are then left unused. Each key is uploaded by the same worker, so a
+    key replaced again before its upload ran gets its files in order.
+
+    The S3 client is a parameter so that the queue can run against a local S3
+    stand-in such as moto.
+    """
+
+    def __init__(
+        self,
+        workers=config.S3_UPLOAD_WORKERS,
+        queue_size=config.S3_UPLOAD_QUEUE_SIZE,
+        spool_dir=config.S3_UPLOAD_SPOOL_DIR,
+        s3_client=config.AWS_S3_CLIENT,
+        bucket_name=config.AWS_S3_BUCKETNAME,
+        retry_delay=1.0,
+    ):
+        self.workers = workers
+        self.spool_dir = spool_dir
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.retry_delay = retry_delay
+        self.enabled = bool(
+            workers > 0
+            and config.AWS_SECRET_ACCESS_KEY
+            and config.AWS_ACCESS_KEY_ID
+            and config.AWS_S3_BUCKETNAME
+            and config.AWS_S3_IMAGE_DIR
+        )
+        self.queues = [queue.Queue(maxsize=max(queue_size // max(workers, 1), 1)) for _ in range(max(workers, 1))]
+        self.staged = {}  # s3_file_path: UploadTask written in the open block transaction
+        self.lock = threading.Lock()
+        self.threads = []
+        self.uploaded = []  # (s3_file_path, md5) uploaded since the last `record_uploads`
+        self.uploaded_count = 0
+        self.failed_count = 0
+        self.blocked_seconds = 0.0
+
+    def start(self):
+        if self.threads:
+            return
+        os.makedirs(self.spool_dir, exist_ok=True)
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, args=(self.queues[i],), name=f"s3-upload-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def spool_path(self, s3_file_path, md5):
+        return os.path.join(self.spool_dir, f"{md5}_{os.path.basename(s3_file_path)}")
+
+    def enqueue(self, db, s3_file_path, file_obj, md5, content_type, replacing=False):
+        """
+        Spool a file and stage its upload, queued by `commit` with the block.
+
+        Args:
+            db: The database connection object, the pending row is written in its open transaction.
+            s3_file_path (str): The key of the file in the bucket.
+            file_obj (BytesIO): The file contents.
+            md5 (str): The hex MD5 of the contents.
+            content_type (str): The MIME type of the file.
+            replacing (bool): The key already holds another file, whose CloudFront copy must be invalidated.
+        """
+        self.start()
+        staged = self.staged.get(s3_file_path)
+        if staged is not None:
+            # replaced again in the same block, the bucket still holds the file from before it
+            replacing = staged.replacing
+            if staged.md5 != md5:
+                os.remove(self.spool_path(s3_file_path, staged.md5))
+        path = self.spool_path(s3_file_path, md5)
+        with open(path + ".tmp", "wb") as f:
+            f.write(file_obj.getvalue())
+        os.replace(path + ".tmp", path)
+        with db.cursor() as cursor:
+            cursor.execute("DELETE FROM s3objects WHERE path_key = %s", (s3_file_path,))
+            cursor.execute(
+                "INSERT INTO s3objects (id, path_key, md5, status, content_type) VALUES (%s, %s, %s, %s, %s)",
+                (f"{s3_file_path}_{md5}", s3_file_path, md5, "replacing" if replacing else "pending", content_type),
+            )
+        self.staged[s3_file_path] = UploadTask(s3_file_path, md5, content_type, replacing)
+
+    def commit(self):
+        """Queue the uploads staged by the block just committed, waiting for room if the workers are behind."""
+        staged, self.staged = self.staged, {}
+        for task in staged.values():
+            config.S3_OBJECTS[task.s3_file_path] = task.md5
+            self._put(task)
+
+    def discard(self):
+        """Drop the uploads staged by a block that was rolled back."""
+        self.staged = {}
+
+    def _put(self, task):
+        start = time.perf_counter()
+        self.queues[zlib.crc32(task.s3_file_path.encode()) % len(self.queues)].put(task)
+        with self.lock:
+            self.blocked_seconds += time.perf_counter() - start
+
+    def resume(self, db):
+        """Queue the uploads left pending by the previous run, and start the workers."""
+        self.start()
+        with db.cursor() as cursor:
+            cursor.execute(
+                "SELECT path_key, md5, status, content_type FROM s3objects WHERE status IN ('pending', 'replacing')"
+            )
+            pending = cursor.fetchall()
+        if pending:
+            logger.warning(f"Resuming {len(pending)} pending S3 uploads")
+        for s3_file_path, md5, status, content_type in pending:
+            if os.path.exists(self.spool_path(s3_file_path, md5)):
+                self._put(UploadTask(s3_file_path, md5, content_type, status == "replacing"))
+            elif self._in_bucket(s3_file_path, md5):
+                # uploaded, but the run stopped before recording it
+                with self.lock:
+                    self.uploaded.append((s3_file_path, md5))
+                if status == "replacing":
+                    invalidation_batcher.add([s3_file_path])
+            else:
+                logger.error(f"ERROR: The spooled file of {s3_file_path} is missing, it is not in S3.")
+
+    def _in_bucket(self, s3_file_path, md5):
+        try:
+            response = self.s3_client.head_object(Bucket=self.bucket_name, Key=s3_file_path)
+        except Exception:
+            return False
+        return response["ETag"].strip('"') == md5
+
+    def _work(self, tasks):
+        while True:
+            task = tasks.get()
             try:
-                invalidate_s3_files(["/" + s3_file_path], distribution_id)
+                self._upload(task)
+            finally:
+                tasks.task_done()
+
+    def _upload(self, task):
+        path = self.spool_path(task.s3_file_path, task.md5)
+        for attempt in range(UPLOAD_TRIES):
+            try:
+                with open(path, "rb") as f:
+                    self.s3_client.upload_fileobj(
+                        f, self.bucket_name, task.s3_file_path, ExtraArgs={"ContentType": task.content_type}
+                    )
                 break
             except Exception as e:
-                logger.warning(f"ERROR: Retry failed. Error: {e}")
-                retries -= 1
-        if retries == 0:
-            logger.warning(f"ERROR: Maximum retries reached. Unable to invalidate {s3_file_path} in Cloudfront.")
+                logger.warning(f"failure uploading {task.s3_file_path} to aws (try {attempt + 1}/{UPLOAD_TRIES}): {e}")
+                time.sleep(self.retry_delay * 2**attempt)
+        else:
+            # left pending with its spooled file, retried on next start
+            with self.lock:
+                self.failed_count += 1
+            return
+        if task.replacing:
+            invalidation_batcher.add([task.s3_file_path])
+        os.remove(path)
+        with self.lock:
+            self.uploaded.append((task.s3_file_path, task.md5))
+            self.uploaded_count += 1
+
+    def record_uploads(self, db):
+        """Mark the uploads finished since the last call as done, inside the caller's transaction."""
+        with self.lock:
+            uploaded, self.uploaded = self.uploaded, []
+        if not uploaded:
+            return
+        placeholders = ", ".join(["%s"] * len(uploaded))
+        with db.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE s3objects SET status = 'uploaded' WHERE id IN ({placeholders})",  # nosec
+                [f"{s3_file_path}_{md5}" for s3_file_path, md5 in uploaded],
+            )
+
+    def wait(self):
+        """Wait until every queued upload has been tried."""
+        for tasks in self.queues:
+            tasks.join()
+
+    def snapshot(self):
+        with self.lock:
+            queued = sum(tasks.qsize() for tasks in self.queues)
+            return UploadStats(queued, self.uploaded_count, self.failed_count, self.blocked_seconds)
+
+    def since(self, snapshot):
+        """Return the uploads waiting now, and the uploads, failures and seconds parsing waited since `snapshot`."""
+        current = self.snapshot()
+        return UploadStats(
+            current.queued,
+            current.uploaded - snapshot.uploaded,
+            current.failed - snapshot.failed,
+            current.blocked_seconds - snapshot.blocked_seconds,
+        )
+
+
+upload_queue = S3UploadQueue()
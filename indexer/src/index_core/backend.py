@@ -4,11 +4,15 @@ import concurrent.futures
 import hashlib
 import json
 import logging
+import random
+import threading
 import time
+from collections import namedtuple
 
 import bitcoin as bitcoinlib
 import requests
 from bitcoin.core import CBlock
+from requests.adapters import HTTPAdapter
 from requests.exceptions import ConnectionError, Timeout
 
 import config
@@ -19,31 +23,112 @@ logger = logging.getLogger(__name__)
 raw_transactions_cache = util.DictCache(size=config.BACKEND_RAW_TRANSACTIONS_CACHE_SIZE)  # used in getrawtransaction_batch()
 
 
+RPCStats = namedtuple("RPCStats", ["calls", "seconds", "connections"])
+
+_session = None
+_session_lock = threading.Lock()
+
+
 class BackendRPCError(Exception):
     pass
 
 
+class RPCCounter:
+    """Counts the HTTP posts made to the backend and the time spent waiting on them, across all threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.seconds = 0.0
+
+    def add(self, seconds):
+        with self.lock:
+            self.calls += 1
+            self.seconds += seconds
+
+    def snapshot(self):
+        connections = connection_count()
+        with self.lock:
+            return RPCStats(self.calls, self.seconds, connections)
+
+    def since(self, snapshot):
+        """Return the calls, seconds and new connections counted since `snapshot` was taken."""
+        current = self.snapshot()
+        return RPCStats(
+            current.calls - snapshot.calls,
+            current.seconds - snapshot.seconds,
+            current.connections - snapshot.connections,
+        )
+
+
+def get_session():
+    """
+    Return the keep-alive session shared by all backend calls, creating it on first use.
+
+    Connections to the node are pooled and reused, at most `config.BACKEND_RPC_POOL_SIZE`
+    of them; callers wait for a free connection rather than opening more.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config.BACKEND_RPC_POOL_SIZE, pool_block=True)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update({"content-type": "application/json"})
+            session.verify = not config.BACKEND_SSL_NO_VERIFY
+            _session = session
+        return _session
+
+
+def connection_count():
+    """Return the number of connections the shared session has opened so far, reused ones counted once."""
+    session = _session
+    if session is None:
+        return 0
+    pools = session.get_adapter(config.RPC_URL).poolmanager.pools
+    count = 0
+    for key in pools.keys():
+        pool = pools.get(key)
+        if pool is not None:
+            count += pool.num_connections
+    return count
+
+
+def backoff_delay(attempt):
+    """Exponential backoff with full jitter, so the RPC batch workers don't retry in lockstep."""
+    return random.uniform(0, min(config.BACKEND_RPC_BACKOFF_MAX, config.BACKEND_RPC_BACKOFF_BASE * 2**attempt))  # nosec
+
+
+rpc_counter = RPCCounter()
+
+
 def rpc_call(payload):
     """Calls to bitcoin core and returns the response"""
     url = config.RPC_URL
     response = None
-    TRIES = 12
+    session = get_session()
 
-    for i in range(TRIES):
+    for i in range(config.BACKEND_RPC_TRIES):
+        start = time.perf_counter()
         try:
-            response = requests.post(
+            response = session.post(
                 url,
                 data=json.dumps(payload),
-                headers={"content-type": "application/json"},
-                verify=(not config.BACKEND_SSL_NO_VERIFY),
                 timeout=config.REQUESTS_TIMEOUT,
             )
+            rpc_counter.add(time.perf_counter() - start)
             if i > 0:
                 logger.debug("Successfully connected.")
             break
         except (Timeout, ConnectionError):
-            logger.debug("Could not connect to backend at `{}`. (Try {}/{})".format(util.clean_url_for_log(url), i + 1, TRIES))
-            time.sleep(5)
+            rpc_counter.add(time.perf_counter() - start)
+            logger.debug(
+                "Could not connect to backend at `{}`. (Try {}/{})".format(
+                    util.clean_url_for_log(url), i + 1, config.BACKEND_RPC_TRIES
+                )
+            )
+            time.sleep(backoff_delay(i))
     if response is None:
         if config.TESTNET:
             network = "testnet"
@@ -135,9 +220,12 @@ def getblock(block_hash):  # returns a hex string
     return rpc("getblock", [block_hash, False])
 
 
+def getrawblock(block_hash):
+    return bytes.fromhex(getblock(block_hash))
+
+
 def getcblock(block_hash):
-    block_hex = getblock(block_hash)
-    return CBlock.deserialize(bytes.fromhex(block_hex))
+    return CBlock.deserialize(getrawblock(block_hash))
 
 
 def getrawtransaction(tx_hash, verbose=False, skip_missing=False):
@@ -145,13 +233,37 @@ def getrawtransaction(tx_hash, verbose=False, skip_missing=False):
 
 
 def deserialize(tx_hex):
-    return bitcoinlib.core.CTransaction.deserialize(binascii.unhexlify(tx_hex))
+    """Deserialize a transaction given as hex, or as raw bytes / a memoryview slice of a raw block."""
+    if isinstance(tx_hex, str):
+        tx_hex = binascii.unhexlify(tx_hex)
+    return bitcoinlib.core.CTransaction.deserialize(tx_hex)
+
+
+def raw_tx_bytes(tx):
+    """Return the serialized bytes of a transaction given as hex, bytes, memoryview or CTransaction."""
+    if isinstance(tx, str):
+        return bytes.fromhex(tx)
+    if isinstance(tx, bitcoinlib.core.CTransaction):
+        return tx.serialize()
+    return bytes(tx)
 
 
 def serialize(ctx):
     return bitcoinlib.core.CTransaction.serialize(ctx)
 
 
+def get_ctx_list(block):
+    """Like get_tx_list, but hands out the already decoded CTransaction objects of the block."""
+    transactions = {}
+    tx_hash_list = []
+
+    for ctx in block.vtx:
+        tx_hash = bitcoinlib.core.b2lx(ctx.GetTxid())
+        tx_hash_list.append(tx_hash)
+        transactions[tx_hash] = ctx
+    return (tx_hash_list, transactions)
+
+
 def get_tx_list(block):
     raw_transactions = {}
     tx_hash_list = []
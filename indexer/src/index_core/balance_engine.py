@@ -0,0 +1,124 @@
+"""
+Resident copy of the SRC-20 balances table.
+
+With `config.SRC20_BALANCE_ENGINE` set, the balances table is loaded once and
+the balance lookups of SRC-20 processing are answered from memory. The table
+stays the source of truth: the changes of every block are still written to it,
+inside the block transaction, and the copy is dropped and loaded again whenever
+the table is rebuilt or blocks are purged.
+"""
+
+import logging
+from collections import namedtuple
+from decimal import ROUND_HALF_UP
+from decimal import Decimal as D
+
+import config
+
+logger = logging.getLogger(__name__)
+
+BalanceTuple = namedtuple(
+    "BalanceTuple",
+    [
+        "tick",
+        "address",
+        "total_balance",
+        "highest_block_index",
+        "block_time_unix",
+        "locked_amt",
+    ],
+)
+
+AMT_QUANTUM = D("1e-18")  # balances.amt is a DECIMAL(38,18)
+
+
+def balance_key(tick, address):
+    # balances.id is compared case insensitively by MySQL
+    return f"{tick}_{address}".lower()
+
+
+class BalanceEngine:
+    """casefolded balance id -> [tick, tick_hash, address, amt, locked_amt, last_update, block_time] rows."""
+
+    def __init__(self, enabled=config.SRC20_BALANCE_ENGINE):
+        self.enabled = enabled
+        self.rows = None
+
+    def invalidate(self):
+        """Drop the resident balances, they are loaded again on next use."""
+        self.rows = None
+
+    def ensure_loaded(self, db):
+        if self.rows is not None:
+            return
+        rows = {}
+        with db.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT tick, tick_hash, address, amt, locked_amt, last_update, UNIX_TIMESTAMP(block_time)
+                FROM {config.SRC20_BALANCES_TABLE}
+                """  # nosec
+            )
+            for row in cursor.fetchall():
+                rows[balance_key(row[0], row[2])] = list(row)
+        self.rows = rows
+        logger.info(f"Loaded {len(rows)} SRC-20 balances into memory")
+
+    def get_balances(self, db, tick, tick_hash, addresses):
+        """
+        Look up balances like `src20.get_total_user_balance_from_balances_db`.
+
+        Args:
+            db: The database connection object, used to load the balances on first use.
+            tick (str): The tick.
+            tick_hash (str): The tick hash.
+            addresses (list): The addresses to look up.
+
+        Returns:
+            list: A BalanceTuple for each address that has a balance row.
+        """
+        self.ensure_loaded(db)
+        balances = []
+        for address in addresses:
+            row = self.rows.get(balance_key(tick, address))
+            if (
+                row is not None
+                and row[2] == address
+                and row[0].lower() == tick.lower()
+                and row[1] is not None
+                and row[1].lower() == tick_hash.lower()
+            ):
+                balances.append(BalanceTuple(row[0], row[2], row[3], row[5], row[6], row[4]))
+        return balances
+
+    def get_row(self, db, tick, address):
+        """Return the row with the id of `tick` and `address`, or None if there is none. The row must not be modified."""
+        self.ensure_loaded(db)
+        return self.rows.get(balance_key(tick, address))
+
+    def apply(self, balance_updates, block_index, block_time):
+        """Apply the net changes of a block, the same way `update_balance_table` upserts them into the table."""
+        for balance_dict in balance_updates:
+            key = balance_key(balance_dict["tick"], balance_dict["address"])
+            net_change = D(balance_dict["net_change"]).quantize(AMT_QUANTUM, rounding=ROUND_HALF_UP)
+            row = self.rows.get(key)
+            if row is None:
+                self.rows[key] = [
+                    balance_dict["tick"],
+                    balance_dict["tick_hash"],
+                    balance_dict["address"],
+                    net_change,
+                    None,
+                    block_index,
+                    block_time,
+                ]
+            else:
+                row[3] += net_change
+                row[5] = block_index
+
+    def clear_zero_balances(self):
+        if self.rows is not None:
+            self.rows = {key: row for key, row in self.rows.items() if row[3] != 0}
+
+
+balance_engine = BalanceEngine()
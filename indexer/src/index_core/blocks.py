@@ -8,13 +8,14 @@ import concurrent.futures
 import decimal
 import http
 import logging
+import multiprocessing
 import sys
 import time
 from collections import namedtuple
-from typing import List
+from typing import List, Optional
 
 import bitcoin as bitcoinlib
-from bitcoin.core.script import CScriptInvalidError
+from bitcoin.core.script import CScript, CScriptInvalidError
 from bitcoin.wallet import CBitcoinAddress
 from bitcoinlib.keys import pubkeyhash_to_addr
 from pymysql.connections import Connection
@@ -28,23 +29,28 @@ import index_core.check as check
 import index_core.log as log
 import index_core.script as script
 import index_core.util as util
+from index_core.aws import UploadStats, invalidation_batcher, upload_queue
+from index_core.balance_engine import balance_engine
 from index_core.database import (
+    BlockWriteBatch,
+    first_unparsed_block,
     initialize,
-    insert_block,
-    insert_into_src20_tables,
-    insert_into_stamp_table,
-    insert_transactions,
     is_prev_block_parsed,
+    journal_block,
     next_tx_index,
-    purge_block_db,
     rebuild_balances,
+    reset_parsed_blocks,
+    rollback_blocks,
+    save_balance_snapshot,
     update_block_hashes,
-    update_parsed_block,
 )
-from index_core.exceptions import BlockAlreadyExistsError, BlockUpdateError, BTCOnlyError, DatabaseInsertError, DecodeError
-from index_core.models import StampData, ValidStamp
-from index_core.src20 import Src20Dict  # FIXME: move to models for consistency
+from index_core.exceptions import BlockAlreadyExistsError, BlockUpdateError, BTCOnlyError, DatabaseError, DecodeError
+from index_core.models import StampData, ValidStamp, collection_matcher
+from index_core.prefetch import BlockPrefetcher, fetch_block
+from index_core.prefilter import PrefilterStats, select_candidates
+from index_core.prevouts import prevout_cache
 from index_core.src20 import (
+    Src20BlockLedger,
     clear_zero_balances,
     parse_src20,
     process_balance_updates,
@@ -52,7 +58,7 @@ from index_core.src20 import (
     validate_src20_ledger_hash,
 )
 from index_core.stamp import parse_stamp
-from index_core.xcprequest import fetch_cp_concurrent, filter_issuances_by_tx_hash
+from index_core.xcprequest import IssuancePrefetcher, filter_issuances_by_tx_hash
 
 D = decimal.Decimal
 logger = logging.getLogger(__name__)
@@ -81,11 +87,12 @@ TxResult = namedtuple(
 
 
 class BlockProcessor:
-    def __init__(self, db):
+    def __init__(self, db, batch=None):
         self.db: Connection = db
+        self.batch: BlockWriteBatch = batch
         self.valid_stamps_in_block: List[ValidStamp] = []
         self.parsed_stamps: List[StampData] = []
-        self.processed_src20_in_block: List[Src20Dict] = []
+        self.processed_src20_in_block: Src20BlockLedger = Src20BlockLedger()
 
     def process_transaction_results(self, tx_results):
         for result in tx_results:
@@ -119,26 +126,32 @@ class BlockProcessor:
                 self.processed_src20_in_block.append(src20_dict)
 
         if self.parsed_stamps:
-            insert_into_stamp_table(self.db, self.parsed_stamps)
-            for stamp in self.parsed_stamps:
-                stamp.match_and_insert_collection_data(config.LEGACY_COLLECTIONS, self.db)
+            self.batch.stamps.extend(self.parsed_stamps)
+            self.batch.add_collection_data(*collection_matcher.match(self.parsed_stamps))
 
-    def finalize_block(self, block_index, block_time, txhash_list):
+    def finalize_block(self, block_index, block_time, txhash_list, messages_hash=None):
         if self.processed_src20_in_block:
             balance_updates = update_src20_balances(self.db, block_index, block_time, self.processed_src20_in_block)
-            insert_into_src20_tables(self.db, self.processed_src20_in_block)
+            self.batch.src20.extend(self.processed_src20_in_block)
             valid_src20_str = process_balance_updates(balance_updates)
         else:
             valid_src20_str = ""
 
         if block_index > config.BTC_SRC20_GENESIS_BLOCK and block_index % 100 == 0:
-            clear_zero_balances(self.db)
+            clear_zero_balances(self.db, block_index)
 
         new_ledger_hash, new_txlist_hash, new_messages_hash = create_check_hashes(
-            self.db, block_index, self.valid_stamps_in_block, valid_src20_str, txhash_list
+            self.db,
+            block_index,
+            self.valid_stamps_in_block,
+            valid_src20_str,
+            txhash_list,
+            batch=self.batch,
+            messages_hash=messages_hash,
         )
 
-        if valid_src20_str:
+        # a reparsed block, which keeps its stored messages hash, stays local
+        if valid_src20_str and messages_hash is None:
             validate_src20_ledger_hash(block_index, new_ledger_hash, valid_src20_str)
 
         stamps_in_block = len(self.valid_stamps_in_block)
@@ -146,7 +159,7 @@ class BlockProcessor:
         return new_ledger_hash, new_txlist_hash, new_messages_hash, stamps_in_block, src20_in_block
 
     def insert_transactions(self, tx_results):
-        insert_transactions(self.db, tx_results)
+        self.batch.transactions.extend(tx_results)
 
 
 def process_vout(ctx, stamp_issuance=None):
@@ -217,12 +230,181 @@ def process_vout(ctx, stamp_issuance=None):
     return vOutInfo(pubkeys_compiled, keyburn, is_op_return, fee, is_olga)
 
 
+TransactionInfo = namedtuple(
+    "TransactionInfo",
+    [
+        "source",
+        "destinations",
+        "btc_amount",
+        "fee",
+        "data",
+        "ctx",
+        "keyburn",
+        "is_op_return",
+        "p2wsh_data",
+    ],
+)
+
+EMPTY_TRANSACTION_INFO = TransactionInfo(b"", None, None, None, None, None, None, None, None)
+
+DecodedTx = namedtuple(
+    "DecodedTx",
+    [
+        "destinations",
+        "btc_amount",
+        "fee",
+        "data",
+        "ctx",
+        "keyburn",
+        "is_op_return",
+        "p2wsh_data",
+        "prevout",
+    ],
+)
+
+
+def decode_tx(ctx, stamp_issuance=None):
+    """
+    Decode the stamp data carried by a transaction. This is the CPU bound part of
+    `get_tx_info` and does not touch the backend or the database.
+
+    Args:
+        ctx (CTransaction): The deserialized transaction.
+        stamp_issuance (dict, optional): The CP issuance matching the transaction. Defaults to None.
+
+    Returns:
+        DecodedTx: A named tuple with the decoded outputs and the (hash, n) outpoint of the first input.
+
+    Raises:
+        DecodeError: If the output type is unrecognized.
+        BTCOnlyError: If the transaction is not a stamp.
+    """
+    destinations, btc_amount, data, p2wsh_data = [], 0, b"", b""
+
+    vout_info = process_vout(ctx, stamp_issuance=stamp_issuance)
+    pubkeys_compiled = vout_info.pubkeys_compiled
+    keyburn = getattr(vout_info, "keyburn", None)
+    is_op_return = getattr(vout_info, "is_op_return", None)
+    fee = getattr(vout_info, "fee", None)
+
+    if stamp_issuance is not None:
+        if pubkeys_compiled and vout_info.is_olga:
+            chunk = b""
+            for pubkey in pubkeys_compiled:
+                chunk += pubkey
+            pubkey_len = int.from_bytes(chunk[0:2], byteorder="big")
+            p2wsh_data = chunk[2 : 2 + pubkey_len]
+        else:
+            p2wsh_data = None
+        return DecodedTx(None, btc_amount, round(fee), None, None, keyburn, is_op_return, p2wsh_data, None)
+
+    if pubkeys_compiled:  # this is the combination of the two pubkeys which hold the SRC-20 data
+        chunk = b""
+        for pubkey in pubkeys_compiled:
+            chunk += pubkey[1:-1]  # Skip sign byte and nonce byte. ( this does the concatenation as well)
+    try:
+        src20_destination, src20_data = decode_checkmultisig(ctx, chunk)  # this only decodes src-20 type trx
+    except Exception as e:
+        raise DecodeError(f"unrecognized output type {e}")
+    if src20_destination is None or src20_data is None:
+        raise ValueError("src20_destination and src20_data must not be None")
+    if src20_data is not None:
+        data += src20_data
+        destinations = str(src20_destination)
+
+    if not data:
+        raise BTCOnlyError("no data, not a stamp", ctx)
+
+    vin = ctx.vin[0]
+    return DecodedTx(
+        destinations,
+        btc_amount,
+        round(fee),
+        data,
+        ctx,
+        keyburn,
+        is_op_return,
+        None,
+        (vin.prevout.hash, vin.prevout.n),
+    )
+
+
+def resolve_source(prevout):
+    """
+    Get the address of the output spent by the first input of a transaction.
+
+    Args:
+        prevout (tuple): The (hash, n) of the spent output.
+
+    Returns:
+        str: The decoded source address.
+    """
+    entry = prevout_cache.get(prevout)
+    if entry is not None:
+        if entry[1] is None:
+            prevout_cache.set_address(entry, decode_address(CScript(entry[0])))
+        return entry[1]
+
+    prev_tx_hash, prev_tx_index = prevout
+
+    # Get the full transaction data for the previous transaction.
+    prev_tx = backend.getrawtransaction(util.ib2h(prev_tx_hash))
+    prev_ctx = backend.deserialize(prev_tx)
+    prevout_cache.add_ctx(prev_ctx)
+
+    # Get the output being spent by the input.
+    prev_vout = prev_ctx.vout[prev_tx_index]
+    prev_vout_script_pubkey = prev_vout.scriptPubKey
+
+    # Decode the address associated with the output.
+    return decode_address(prev_vout_script_pubkey)
+
+
+def tx_info_from_decoded(decoded_tx):
+    """
+    Build the TransactionInfo of a decoded transaction, resolving its source address.
+
+    Args:
+        decoded_tx (DecodedTx): The result of `decode_tx`.
+
+    Returns:
+        TransactionInfo: A named tuple containing the transaction information.
+    """
+    if decoded_tx.prevout is None:  # stamp issuance, the source comes from CP
+        return TransactionInfo(
+            None,
+            None,
+            decoded_tx.btc_amount,
+            decoded_tx.fee,
+            None,
+            None,
+            decoded_tx.keyburn,
+            decoded_tx.is_op_return,
+            decoded_tx.p2wsh_data,
+        )
+
+    source = resolve_source(decoded_tx.prevout)
+
+    return TransactionInfo(
+        str(source),
+        decoded_tx.destinations,
+        decoded_tx.btc_amount,
+        decoded_tx.fee,
+        decoded_tx.data,
+        decoded_tx.ctx,
+        decoded_tx.keyburn,
+        decoded_tx.is_op_return,
+        None,
+    )
+
+
 def get_tx_info(tx_hex, block_index=None, db=None, stamp_issuance=None):
     """
     Get transaction information.
 
     Args:
-        tx_hex (str): The hexadecimal representation of the transaction.
+        tx_hex (str | bytes | memoryview | CTransaction): The transaction as hex, raw bytes (or a slice of
+            the raw block), or already deserialized.
         block_index (int, optional): The index of the block. Defaults to None.
         db (object, optional): The database object. Defaults to None.
         stamp_issuance (bool, optional): Flag indicating if the transaction is a stamp issuance. Defaults to None.
@@ -240,102 +422,40 @@ def get_tx_info(tx_hex, block_index=None, db=None, stamp_issuance=None):
         This function parses every transaction, not just stamps/src-20.
         Returns normalized None data for DecodeError and BTCOnlyError.
     """
-    TransactionInfo = namedtuple(
-        "TransactionInfo",
-        [
-            "source",
-            "destinations",
-            "btc_amount",
-            "fee",
-            "data",
-            "ctx",
-            "keyburn",
-            "is_op_return",
-            "p2wsh_data",
-        ],
-    )
-
     try:
         if not block_index:
             block_index = util.CURRENT_BLOCK_INDEX
 
-        destinations, btc_amount, data, p2wsh_data = [], 0, b"", b""
-
-        ctx = backend.deserialize(tx_hex)
-        vout_info = process_vout(ctx, stamp_issuance=stamp_issuance)
-        pubkeys_compiled = vout_info.pubkeys_compiled
-        keyburn = getattr(vout_info, "keyburn", None)
-        is_op_return = getattr(vout_info, "is_op_return", None)
-        fee = getattr(vout_info, "fee", None)
-
-        if stamp_issuance is not None:
-            if pubkeys_compiled and vout_info.is_olga:
-                chunk = b""
-                for pubkey in pubkeys_compiled:
-                    chunk += pubkey
-                pubkey_len = int.from_bytes(chunk[0:2], byteorder="big")
-                p2wsh_data = chunk[2 : 2 + pubkey_len]
-            else:
-                p2wsh_data = None
-            return TransactionInfo(
-                None,
-                None,
-                btc_amount,
-                round(fee),
-                None,
-                None,
-                keyburn,
-                is_op_return,
-                p2wsh_data,
-            )
-
-        if pubkeys_compiled:  # this is the combination of the two pubkeys which hold the SRC-20 data
-            chunk = b""
-            for pubkey in pubkeys_compiled:
-                chunk += pubkey[1:-1]  # Skip sign byte and nonce byte. ( this does the concatenation as well)
-        try:
-            src20_destination, src20_data = decode_checkmultisig(ctx, chunk)  # this only decodes src-20 type trx
-        except Exception as e:
-            raise DecodeError(f"unrecognized output type {e}")
-        if src20_destination is None or src20_data is None:
-            raise ValueError("src20_destination and src20_data must not be None")
-        if src20_data is not None:
-            data += src20_data
-            destinations = str(src20_destination)
-
-        if not data:
-            raise BTCOnlyError("no data, not a stamp", ctx)
-
-        vin = ctx.vin[0]
-
-        prev_tx_hash = vin.prevout.hash
-        prev_tx_index = vin.prevout.n
+        if isinstance(tx_hex, bitcoinlib.core.CTransaction):
+            ctx = tx_hex
+        else:
+            ctx = backend.deserialize(tx_hex)
+        return tx_info_from_decoded(decode_tx(ctx, stamp_issuance=stamp_issuance))
 
-        # Get the full transaction data for the previous transaction.
-        prev_tx = backend.getrawtransaction(util.ib2h(prev_tx_hash))
-        prev_ctx = backend.deserialize(prev_tx)
+    except (DecodeError, BTCOnlyError):
+        return EMPTY_TRANSACTION_INFO
 
-        # Get the output being spent by the input.
-        prev_vout = prev_ctx.vout[prev_tx_index]
-        prev_vout_script_pubkey = prev_vout.scriptPubKey
 
-        # Decode the address associated with the output.
-        source = decode_address(prev_vout_script_pubkey)
+def decode_tx_batch(batch):
+    """
+    Decode a batch of raw transactions. Runs in the worker processes of the
+    "process" decode mode, so it only takes and returns picklable values.
 
-        return TransactionInfo(
-            str(source),
-            destinations,
-            btc_amount,
-            round(fee),
-            data,
-            ctx,
-            keyburn,
-            is_op_return,
-            None,
-        )
+    Args:
+        batch (list): A list of (tx_hash, raw tx bytes, stamp_issuance) tuples.
 
-    except (DecodeError, BTCOnlyError):
-        return TransactionInfo(b"", None, None, None, None, None, None, None, None)
+    Returns:
+        list: A list of (tx_hash, DecodedTx or None) tuples, None meaning the tx carries no stamp data.
+    """
+    results = []
+    for tx_hash, raw_tx, stamp_issuance in batch:
+        try:
+            decoded_tx = decode_tx(bitcoinlib.core.CTransaction.deserialize(raw_tx), stamp_issuance=stamp_issuance)
+            # the CTransaction isn't used past decoding, don't pay for pickling it back
+            results.append((tx_hash, decoded_tx._replace(ctx=None)))
+        except (DecodeError, BTCOnlyError):
+            results.append((tx_hash, None))
+    return results
 
 
 def decode_address(script_pubkey):
@@ -400,107 +520,175 @@ def decode_checkmultisig(ctx, chunk):
 
 
 def reinitialize(db, block_index=None):
-    """Not yet implemented for stamps"""
+    """
+    Prepare the blocks from `block_index` on for a reparse: delete everything
+    parsed from their stored transactions and rebuild the balances as they were
+    before them.
 
-    """Drop all predefined tables and initialize the database once again."""
-    cursor = db.cursor()
+    Args:
+        db: The database connection object.
+        block_index (int, optional): The first block to reparse. Defaults to the first block.
+    """
+    initialize(db)
+    reset_parsed_blocks(db, block_index if block_index is not None else config.BLOCK_FIRST)
+    rebuild_balances(db)
 
-    # Delete all of the results of parsing (including the undolog) - removed since we aren't using any of these tables,
-    # perhaps we purge from the src table here..
 
-    # Create missing tables
-    initialize(db)
+def stored_tx_data(data):
+    """
+    Return the data of a transactions row the way `list_tx` produced it: the str()
+    of the issuance dict for CP stamps, the bytes carried by the transaction otherwise.
+    """
+    if data is not None and data.startswith(b"{'"):
+        try:
+            return data.decode("utf-8")
+        except UnicodeDecodeError:
+            pass
+    return data
 
-    # warning and exit the program
-    Exception("reinitialize() is not implemented yet")
 
-    # clean consensus hashes if first block hash doesn't match with checkpoint.
-    if config.TESTNET:
-        checkpoints = check.CHECKPOINTS_TESTNET
-    elif config.REGTEST:
-        checkpoints = check.CHECKPOINTS_REGTEST
-    else:
-        checkpoints = check.CHECKPOINTS_MAINNET
-
-    columns = [column["name"] for column in cursor.execute("""PRAGMA table_info(blocks)""")]
-    for field in ["ledger_hash", "txlist_hash"]:
-        if field in columns:
-            sql = """SELECT {} FROM blocks  WHERE block_index = ?""".format(field)  # nosec
-            first_block = list(cursor.execute(sql, (config.BLOCK_FIRST,)))
-            if first_block:
-                first_hash = first_block[0][field]
-                if first_hash != checkpoints[config.BLOCK_FIRST][field]:
-                    logger.info("First hash changed. Cleaning {}.".format(field))
-                    cursor.execute("""UPDATE blocks SET {} = NULL""".format(field))  # nosec
-
-    # For rollbacks, just delete new blocks and then reparse what’s left.
-    if block_index:
-        cursor.execute("""DELETE FROM transactions WHERE block_index > ?""", (block_index,))
-        cursor.execute("""DELETE FROM blocks WHERE block_index > ?""", (block_index,))
-    elif config.TESTNET or config.REGTEST:  # block_index NOT specified and we are running testnet
-        # just blow away the consensus hashes with a full testnet reparse, as we could activate
-        # new features retroactively, which could otherwise lead to ConsensusError exceptions being raised.
-        logger.info("Testnet/regtest full reparse detected: Clearing all consensus hashes before performing reparse.")
-        cursor.execute("""UPDATE blocks SET ledger_hash = NULL, txlist_hash = NULL, messages_hash = NULL""")
-
-    cursor.close()
+def read_stored_blocks(db, first_block, last_block):
+    """
+    Read the blocks from `first_block` to `last_block` and their stored transactions.
+
+    Returns:
+        list: The blocks row and the TxResults, in tx_index order, of every block.
+    """
+    with db.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT block_index, block_hash, UNIX_TIMESTAMP(block_time), previous_block_hash, difficulty, messages_hash
+            FROM blocks WHERE block_index BETWEEN %s AND %s ORDER BY block_index
+            """,
+            (first_block, last_block),
+        )
+        blocks = cursor.fetchall()
+        block_rows = {block[0]: block for block in blocks}
+        tx_results = {block_index: [] for block_index in block_rows}
+        # the columns of TxResult, the decoded tx isn't stored and the block fields come from the blocks rows
+        cursor.execute(
+            """
+            SELECT tx_index, source, destination, btc_amount, fee, data, NULL, keyburn, is_op_return, tx_hash,
+                block_index, NULL, NULL, p2wsh_data
+            FROM transactions WHERE block_index BETWEEN %s AND %s ORDER BY tx_index
+            """,
+            (first_block, last_block),
+        )
+        for row in cursor.fetchall():
+            tx = TxResult._make(row)
+            _, block_hash, block_time, *_ = block_rows[tx.block_index]
+            tx_results[tx.block_index].append(
+                tx._replace(
+                    destination=tx.destination if tx.destination != "None" else None,  # saved with str()
+                    data=stored_tx_data(tx.data),
+                    block_hash=block_hash,
+                    block_time=block_time,
+                )
+            )
+    return [(block, tx_results[block[0]]) for block in blocks]
+
+
+def reparse_block(db, block, tx_results):
+    """
+    Parse the stored transactions of a block again and write the results, without committing.
+
+    Returns:
+        tuple: The number of valid stamps and SRC-20 operations in the block.
+    """
+    block_index, block_hash, block_time, previous_block_hash, difficulty, messages_hash = block
+    util.CURRENT_BLOCK_INDEX = block_index
+    batch = BlockWriteBatch(block_index, block_hash, block_time, previous_block_hash, difficulty)
+    block_processor = BlockProcessor(db, batch)
+    block_processor.process_transaction_results(tx_results)
+    new_ledger_hash, new_txlist_hash, new_messages_hash, stamps_in_block, src20_in_block = block_processor.finalize_block(
+        block_index, block_time, None, messages_hash=messages_hash
+    )
+    batch.flush_parsed(db)
+    update_block_hashes(db, block_index, new_txlist_hash, new_ledger_hash, new_messages_hash)
+    record_block(db, block_index)
+    return stamps_in_block, src20_in_block
 
 
 def reparse(db, block_index=None, quiet=False):
-    """Reparse all transactions (atomically). If block_index is set, rollback
-    to the end of that block.
     """
-    Exception("reparse() is not implemented yet")
+    Reparse the stored transactions of the blocks from `block_index` on, rebuilding
+    the stamps, SRC-20 tables, balances and the txlist and ledger hashes without
+    contacting the backend or CP. The messages hashes are kept.
 
-    check.cp_version()
-    reparse_start = time.time()
+    Blocks are read and committed `config.REPARSE_BATCH_BLOCKS` at a time. The blocks
+    still to reparse have no txlist hash, `follow` refuses to start while there are
+    any and a reparse run without `block_index` resumes from them.
 
-    reparsed = False
+    Args:
+        db: The database connection object.
+        block_index (int, optional): The first block to reparse. Defaults to the first block
+            left by an interrupted reparse, or to the first block.
+        quiet (bool, optional): Only log warnings while reparsing. Defaults to False.
 
-    cursor = db.cursor()
+    Raises:
+        DatabaseError: If some of the transactions to reparse were stored without the fields parsing needs.
+    """
+    reparse_start = time.time()
+    with db.cursor() as cursor:
+        cursor.execute("""SELECT MIN(block_index), MAX(block_index) FROM blocks""")
+        first_block, last_block = cursor.fetchone()
+        if first_block is None:
+            logger.warning("No blocks to reparse.")
+            return
+        if block_index is None:
+            block_index = first_unparsed_block(db) or first_block
+        block_index = max(block_index, first_block)
+        cursor.execute(
+            """SELECT MAX(block_index) FROM transactions WHERE block_index >= %s AND is_op_return IS NULL""",
+            (block_index,),
+        )
+        unparseable_block = cursor.fetchone()[0]
+    if unparseable_block is not None:
+        raise DatabaseError(
+            f"The transactions up to block {unparseable_block} were indexed before is_op_return and p2wsh_data were "
+            "stored, reparse after that block or reindex from the backend."
+        )
 
-    if not reparsed:
-        if block_index:
-            logger.info("Could not roll back from undolog. Performing full reparse instead...")
+    if quiet:
+        root_logger = logging.getLogger()
+        root_level = root_logger.getEffectiveLevel()
+        root_logger.setLevel(logging.WARNING)
 
-        if quiet:
-            root_logger = logging.getLogger()
-            root_level = logger.getEffectiveLevel()
-
-        with db:
-            reinitialize(db, block_index)
-
-            # Reparse all blocks, transactions.
-            if quiet:
-                root_logger.setLevel(logging.WARNING)
-
-            # previous_ledger_hash, previous_txlist_hash, previous_messages_hash = None, None, None
-            cursor.execute("""SELECT * FROM blocks ORDER BY block_index""")
-            for block in cursor.fetchall():
-                util.CURRENT_BLOCK_INDEX = block["block_index"]
-                # will need to fetch txhash_list here to parse for consensus hashes in parse_block
-                # previous_ledger_hash, previous_txlist_hash, previous_messages_hash, previous_found_messages_hash = parse_block(
-                #                                                          db, block['block_index'], txhash_list=None,
-                #                                                          previous_ledger_hash=previous_ledger_hash,
-                #                                                          previous_txlist_hash=previous_txlist_hash,
-                #                                                          previous_messages_hash=previous_messages_hash)
-                # if quiet and block['block_index'] % 10 == 0:  # every 10 blocks print status
-                #     root_logger.setLevel(logging.INFO)
-                # logger.info('Block (re-parse): %s (hashes: L:%s / TX:%s / M:%s%s)' % (
-                #     block['block_index'], previous_ledger_hash[-5:], previous_txlist_hash[-5:], previous_messages_hash[-5:],
-                #     (' [overwrote %s]' % previous_found_messages_hash) if previous_found_messages_hash and previous_found_messages_hash != previous_messages_hash else ''))
-                if quiet and block["block_index"] % 10 == 0:
-                    root_logger.setLevel(logging.WARNING)
+    logger.warning(f"Reparsing blocks {block_index} to {last_block}")
+    reinitialize(db, block_index)
+    if balance_engine.enabled:
+        balance_engine.ensure_loaded(db)
+    check.hash_chain.seed(db, block_index)
 
+    reparsed = stamps = src20 = 0
+    try:
+        for batch_start in range(block_index, last_block + 1, config.REPARSE_BATCH_BLOCKS):
+            batch_end = min(batch_start + config.REPARSE_BATCH_BLOCKS - 1, last_block)
+            for block, tx_results in read_stored_blocks(db, batch_start, batch_end):
+                stamps_in_block, src20_in_block = reparse_block(db, block, tx_results)
+                stamps += stamps_in_block
+                src20 += src20_in_block
+                reparsed += 1
+            db.commit()
+            upload_queue.commit()
+            elapsed = time.time() - reparse_start
+            logger.warning(
+                f"Reparsed blocks up to {batch_end} ({reparsed}/{last_block - block_index + 1} blocks, "
+                f"{reparsed / elapsed:.1f} blocks/s, S:{stamps} / S20:{src20})"
+            )
+    except Exception:
+        db.rollback()
+        upload_queue.discard()
+        balance_engine.invalidate()
+        raise
+    finally:
         if quiet:
             root_logger.setLevel(root_level)
 
-    cursor.close()
-    reparse_end = time.time()
-    logger.info("Reparse took {:.3f} minutes.".format((reparse_end - reparse_start) / 60.0))
+    logger.warning("Reparse took {:.3f} minutes.".format((time.time() - reparse_start) / 60.0))
 
 
-def list_tx(db, block_index: int, tx_hash: str, tx_hex=None, stamp_issuance=None):
+def list_tx(db, block_index: int, tx_hash: str, tx_hex=None, stamp_issuance=None, transaction_info=None):
     if not isinstance(tx_hash, str):
         raise TypeError("tx_hash must be a string")
     # NOTE: this is for future reparsing options
@@ -511,10 +699,11 @@ def list_tx(db, block_index: int, tx_hash: str, tx_hex=None, stamp_issuance=None
     # if transactions:
     #     return tx_index
 
-    if tx_hex is None:
-        tx_hex = backend.getrawtransaction(tx_hash)  # TODO: This is the call that is stalling the process the most
+    if transaction_info is None:
+        if tx_hex is None:
+            tx_hex = backend.getrawtransaction(tx_hash)  # TODO: This is the call that is stalling the process the most
 
-    transaction_info = get_tx_info(tx_hex, block_index=block_index, db=db, stamp_issuance=stamp_issuance)
+        transaction_info = get_tx_info(tx_hex, block_index=block_index, db=db, stamp_issuance=stamp_issuance)
     source = getattr(transaction_info, "source", None)
     destination = getattr(transaction_info, "destinations", None)
     btc_amount = getattr(transaction_info, "btc_amount", None)
@@ -566,6 +755,8 @@ def create_check_hashes(
     previous_ledger_hash=None,
     previous_txlist_hash=None,
     previous_messages_hash=None,
+    batch=None,
+    messages_hash=None,
 ):
     """
     Calculate and update the hashes for the given block data. This needs to be modified for a reparse.
@@ -579,25 +770,41 @@ def create_check_hashes(
         previous_ledger_hash (str, optional): The hash of the previous ledger. Defaults to None.
         previous_txlist_hash (str, optional): The hash of the previous transaction list. Defaults to None.
         previous_messages_hash (str, optional): The hash of the previous messages. Defaults to None.
+        batch (BlockWriteBatch, optional): The writes of the block, the hashes are saved with its block row.
+            Defaults to None, updating the block row in the database.
+        messages_hash (str, optional): The stored messages hash of a reparsed block, kept as is since the txids
+            of the block aren't stored. Defaults to None, hashing `txhash_list`.
 
     Returns:
         tuple: A tuple containing the new transaction list hash, ledger hash, and messages hash.
     """
+    verify = config.CONSENSUS_HASH_VERIFY_DB
+    if not verify and not (previous_txlist_hash or previous_ledger_hash or previous_messages_hash):
+        previous_txlist_hash, previous_ledger_hash, previous_messages_hash = check.hash_chain.previous_hashes(db, block_index)
+
     sorted_valid_stamps = sorted(valid_stamps_in_block, key=lambda x: x.get("stamp_number", ""))
     txlist_content = str(sorted_valid_stamps)
     new_txlist_hash, found_txlist_hash = check.consensus_hash(
-        db, block_index, "txlist_hash", previous_txlist_hash, txlist_content
+        db, block_index, "txlist_hash", previous_txlist_hash, txlist_content, verify
     )
 
     ledger_content = str(processed_src20_in_block)
     new_ledger_hash, found_ledger_hash = check.consensus_hash(
-        db, block_index, "ledger_hash", previous_ledger_hash, ledger_content
+        db, block_index, "ledger_hash", previous_ledger_hash, ledger_content, verify
     )
 
-    messages_content = str(txhash_list)
-    new_messages_hash, found_messages_hash = check.consensus_hash(
-        db, block_index, "messages_hash", previous_messages_hash, messages_content
-    )
+    if messages_hash is None:
+        messages_content = str(txhash_list)
+        new_messages_hash, found_messages_hash = check.consensus_hash(
+            db, block_index, "messages_hash", previous_messages_hash, messages_content, verify
+        )
+    else:
+        new_messages_hash = messages_hash
+    check.hash_chain.advance(block_index, new_txlist_hash, new_ledger_hash, new_messages_hash)
+
+    if batch is not None:
+        batch.set_hashes(new_txlist_hash, new_ledger_hash, new_messages_hash)
+        return new_ledger_hash, new_txlist_hash, new_messages_hash
 
     try:
         update_block_hashes(db, block_index, new_txlist_hash, new_ledger_hash, new_messages_hash)
@@ -608,13 +815,25 @@ def create_check_hashes(
     return new_ledger_hash, new_txlist_hash, new_messages_hash
 
 
-def commit_and_update_block(db, block_index):
+def record_block(db, block_index):
     """
-    Commits the changes to the database, updates the parsed block, and increments the block index.
+    Journal a written block, record the S3 uploads finished meanwhile and snapshot
+    the balances on the snapshot interval, inside the block's transaction.
+    """
+    journal_block(db, block_index)
+    upload_queue.record_uploads(db)
+    if config.BALANCE_SNAPSHOT_INTERVAL and block_index % config.BALANCE_SNAPSHOT_INTERVAL == 0:
+        save_balance_snapshot(db, block_index)
+
+
+def commit_and_update_block(db, block_index, batch):
+    """
+    Writes the block and commits it in a single transaction, and increments the block index.
 
     Args:
         db: The database connection object.
         block_index: The current block index.
+        batch (BlockWriteBatch): The writes of the block.
 
     Raises:
         Exception: If an error occurs during the commit or update process.
@@ -623,10 +842,16 @@ def commit_and_update_block(db, block_index):
         None
     """
     try:
+        batch.flush(db)
+        record_block(db, block_index)
         db.commit()
-        update_parsed_block(db, block_index)
+        upload_queue.commit()
         block_index += 1
         return block_index
+    except BlockAlreadyExistsError as e:
+        logger.warning(e)
+        db.rollback()
+        sys.exit(f"Exiting due to block already existing. {e}")
     except Exception as e:
         print("Error message:", e)
         db.rollback()
@@ -642,6 +867,10 @@ def log_block_info(
     new_messages_hash: str,
     stamps_in_block: int,
     src20_in_block: int,
+    prefilter_stats: Optional[PrefilterStats] = None,
+    rpc_stats: Optional[backend.RPCStats] = None,
+    cp_ahead: Optional[int] = None,
+    upload_stats: Optional[UploadStats] = None,
 ):
     """
     Logs the information of a block.
@@ -652,13 +881,34 @@ def log_block_info(
     - new_ledger_hash (str): The hash of the new ledger.
     - new_txlist_hash (str): The hash of the new transaction list.
     - new_messages_hash (str): The hash of the new messages.
+    - prefilter_stats (PrefilterStats, optional): The candidate/total tx counts of the block.
+    - rpc_stats (RPCStats, optional): The backend calls made, seconds spent on them and connections opened
+      while processing the block.
+    - cp_ahead (int, optional): The number of following blocks whose CP issuances are already fetched.
+    - upload_stats (UploadStats, optional): The S3 uploads waiting, done and failed, and the seconds parsing waited
+      for room in the upload queue, while processing the block.
 
     Returns:
     None
     """
     logger = logging.getLogger(__name__)
+    if prefilter_stats is not None:
+        candidates = f" / C:{prefilter_stats.candidates}/{prefilter_stats.total}"
+    else:
+        candidates = ""
+    if rpc_stats is not None:
+        rpc = " / RPC:{}/{:.2f}s/+{}conn".format(rpc_stats.calls, rpc_stats.seconds, rpc_stats.connections)
+    else:
+        rpc = ""
+    cp = f" / CP+{cp_ahead}" if cp_ahead is not None else ""
+    if upload_stats is not None:
+        s3 = " / S3:{}q/{}up/{}err/{:.2f}s".format(
+            upload_stats.queued, upload_stats.uploaded, upload_stats.failed, upload_stats.blocked_seconds
+        )
+    else:
+        s3 = ""
     logger.warning(
-        "Block: %s (%ss, hashes: L:%s / TX:%s / M:%s / S:%s / S20:%s)"
+        "Block: %s (%ss, hashes: L:%s / TX:%s / M:%s / S:%s / S20:%s%s%s%s%s)"
         % (
             str(block_index),
             "{:.2f}".format(time.time() - start_time),
@@ -667,11 +917,15 @@ def log_block_info(
             new_messages_hash[-5:],
             stamps_in_block,
             src20_in_block,
+            candidates,
+            rpc,
+            cp,
+            s3,
         )
     )
 
 
-def process_tx(db, tx_hash, block_index, stamp_issuances, raw_transactions):
+def process_tx(db, tx_hash, block_index, stamp_issuances, raw_transactions, transaction_info=None):
     stamp_issuance = filter_issuances_by_tx_hash(stamp_issuances, tx_hash)
 
     tx_hex = raw_transactions[tx_hash]
@@ -685,7 +939,7 @@ def process_tx(db, tx_hash, block_index, stamp_issuances, raw_transactions):
         keyburn,
         is_op_return,
         p2wsh_data,
-    ) = list_tx(db, block_index, tx_hash, tx_hex, stamp_issuance=stamp_issuance)
+    ) = list_tx(db, block_index, tx_hash, tx_hex, stamp_issuance=stamp_issuance, transaction_info=transaction_info)
 
     return TxResult(
         None,
@@ -705,6 +959,148 @@ def process_tx(db, tx_hash, block_index, stamp_issuances, raw_transactions):
     )
 
 
+_decode_pool = None
+
+
+def _init_decode_worker(network):
+    bitcoinlib.SelectParams(network)
+
+
+def get_decode_pool():
+    """Return the process pool used by the "process" decode mode, creating it on first use."""
+    global _decode_pool
+    if _decode_pool is None:
+        if config.TESTNET:
+            network = "testnet"
+        elif config.REGTEST:
+            network = "regtest"
+        else:
+            network = "mainnet"
+        # spawn rather than fork, the block prefetch threads may be holding locks at fork time
+        _decode_pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=config.TX_DECODE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_decode_worker,
+            initargs=(network,),
+        )
+    return _decode_pool
+
+
+def make_decode_batches(txhash_list, stamp_issuances, raw_transactions, num_batches):
+    """Split the transactions of a block into `num_batches` batches for `decode_tx_batch`."""
+    batch_size = max(1, -(-len(txhash_list) // num_batches))
+    batches = []
+    for chunk in util.chunkify(txhash_list, batch_size):
+        batch = []
+        for tx_hash in chunk:
+            stamp_issuance = filter_issuances_by_tx_hash(stamp_issuances, tx_hash)
+            batch.append((tx_hash, backend.raw_tx_bytes(raw_transactions[tx_hash]), stamp_issuance))
+        batches.append(batch)
+    return batches
+
+
+def decode_candidate(tx_hash, raw_tx, stamp_issuance):
+    """Decode one transaction for the "thread" decode mode, same return value as the items of `decode_tx_batch`."""
+    try:
+        if isinstance(raw_tx, bitcoinlib.core.CTransaction):
+            ctx = raw_tx
+        else:
+            ctx = backend.deserialize(raw_tx)
+        return tx_hash, decode_tx(ctx, stamp_issuance=stamp_issuance)
+    except (DecodeError, BTCOnlyError):
+        return tx_hash, None
+
+
+def decode_block_in_processes(txhash_list, stamp_issuances, raw_transactions):
+    """
+    Decode the transactions of a block on the process pool, in one batch per worker.
+
+    Returns:
+        list: The (tx_hash, DecodedTx or None) of every transaction, in the order of `txhash_list`.
+    """
+    batches = make_decode_batches(txhash_list, stamp_issuances, raw_transactions, config.TX_DECODE_WORKERS)
+    decoded_txs = []
+    for batch_results in get_decode_pool().map(decode_tx_batch, batches):
+        decoded_txs.extend(batch_results)
+    return decoded_txs
+
+
+def decode_block_in_threads(txhash_list, stamp_issuances, raw_transactions):
+    """
+    Decode the transactions of a block with one thread pool task per transaction.
+
+    Returns:
+        list: The (tx_hash, DecodedTx or None) of every transaction, in the order of `txhash_list`.
+    """
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        futures = [
+            executor.submit(
+                decode_candidate,
+                tx_hash,
+                raw_transactions[tx_hash],
+                filter_issuances_by_tx_hash(stamp_issuances, tx_hash),
+            )
+            for tx_hash in txhash_list
+        ]
+        return [future.result() for future in futures]
+
+
+def load_parent_outputs(decoded_txs):
+    """
+    Load the parent transactions of all decoded stamps of a block that the prevout
+    cache can't answer, with a single `getrawtransaction_batch` call, so the source
+    lookups of `tx_info_from_decoded` never go to the backend one tx at a time.
+
+    Args:
+        decoded_txs (list): The (tx_hash, DecodedTx or None) of the transactions of the block.
+
+    Returns:
+        int: The number of parent transactions fetched from the backend.
+    """
+    parent_txids = set()
+    for _, decoded_tx in decoded_txs:
+        if decoded_tx is not None and decoded_tx.prevout is not None and decoded_tx.prevout not in prevout_cache:
+            parent_txids.add(util.ib2h(decoded_tx.prevout[0]))
+    if not parent_txids:
+        return 0
+    for tx_hex in backend.getrawtransaction_batch(list(parent_txids)).values():
+        prevout_cache.add_ctx(backend.deserialize(tx_hex))
+    return len(parent_txids)
+
+
+def decode_block_transactions(db, txhash_list, block_index, stamp_issuances, raw_transactions):
+    """
+    Decode all transactions of a block in two phases: first decode them all with the
+    decode mode set in `config.TX_DECODE_MODE`, which gives the outpoints whose
+    addresses are the stamp sources, then fetch the missing parent transactions in
+    one batch and resolve the sources and CP issuance fields.
+
+    Args:
+        db: The database connection object.
+        txhash_list (list): The txids of the block, in block order.
+        block_index (int): The index of the block.
+        stamp_issuances (dict): The CP stamp issuances of the block, keyed by tx_hash.
+        raw_transactions (dict): The transactions keyed by txid, as hex, raw bytes, memoryview or CTransaction.
+
+    Returns:
+        list: The TxResult of every transaction in the block, in the order of `txhash_list`.
+    """
+    if config.TX_DECODE_MODE == "process":
+        decoded_txs = decode_block_in_processes(txhash_list, stamp_issuances, raw_transactions)
+    else:
+        decoded_txs = decode_block_in_threads(txhash_list, stamp_issuances, raw_transactions)
+
+    load_parent_outputs(decoded_txs)
+
+    results = []
+    for tx_hash, decoded_tx in decoded_txs:
+        transaction_info = tx_info_from_decoded(decoded_tx) if decoded_tx is not None else EMPTY_TRANSACTION_INFO
+        results.append(
+            process_tx(db, tx_hash, block_index, stamp_issuances, raw_transactions, transaction_info=transaction_info)
+        )
+    return results
+
+
 def follow(db):
     """
     Continuously follows the blockchain, parsing and indexing new blocks
@@ -716,12 +1112,27 @@ def follow(db):
 
     Returns:
         None
+
+    Raises:
+        DatabaseError: If a reparse was interrupted and left blocks without their hashes.
     """
 
     # Check software version.
     check.cp_version()  # FIXME: need to add version checks for the endpoints and hash validations
     initialize(db)
+    unparsed_block = first_unparsed_block(db)
+    if unparsed_block is not None:
+        raise DatabaseError(
+            f"Blocks from {unparsed_block} on were left unparsed by an interrupted reparse, run `reparse` to finish it."
+        )
     rebuild_balances(db)
+    if balance_engine.enabled:
+        balance_engine.ensure_loaded(db)
+    prevout_cache.load()
+    if upload_queue.enabled:
+        upload_queue.resume(db)
+    if invalidation_batcher.enabled:
+        invalidation_batcher.start()
 
     # Get index of last block.
     if util.CURRENT_BLOCK_INDEX == 0:
@@ -748,12 +1159,15 @@ def follow(db):
         else:
             raise e
 
-    stamp_issuances_list = None
+    issuance_prefetcher = IssuancePrefetcher()
+    prefetcher = BlockPrefetcher() if config.BLOCK_PREFETCH_DEPTH > 0 else None
     # profiler = cProfile.Profile()
     # should_profile = True
 
     while True:
         start_time = time.time()
+        rpc_start = backend.rpc_counter.snapshot()
+        upload_start = upload_queue.snapshot() if upload_queue.enabled else None
 
         try:
             block_tip = backend.getblockcount()
@@ -774,17 +1188,9 @@ def follow(db):
         if block_index <= block_tip:
             db.ping()
 
-            if stamp_issuances_list and (stamp_issuances_list[block_index] or stamp_issuances_list[block_index] == []):
-                stamp_issuances = stamp_issuances_list[block_index]
-            else:
-                if block_index + 1 == block_tip:
-                    indicator = True
-                else:
-                    indicator = None
-                stamp_issuances_list = fetch_cp_concurrent(block_index, block_tip, indicator=indicator)
-                stamp_issuances = stamp_issuances_list[block_index]
-
-            if block_tip - block_index < 100:
+            stamp_issuances = issuance_prefetcher.get(block_index, block_tip)
+
+            if block_tip - block_index < config.REORG_CHECK_DEPTH:
                 requires_rollback = False
                 while True:
                     if block_index == config.BLOCK_FIRST:
@@ -820,38 +1226,32 @@ def follow(db):
                     logger.warning("Blockchain reorganization at block {}.".format(block_index))
                     block_index -= 1
                     logger.warning("Rolling back to block {} to avoid problems.".format(block_index))
-                    purge_block_db(db, block_index)
-                    rebuild_balances(db)
+                    rollback_blocks(db, block_index)
                     requires_rollback = False
-                    stamp_issuances_list = None
+                    issuance_prefetcher.reset()
+                    if prefetcher:
+                        prefetcher.reset()
                     continue
 
-            block_hash = backend.getblockhash(block_index)
-            cblock = backend.getcblock(block_hash)
-            previous_block_hash = bitcoinlib.core.b2lx(cblock.hashPrevBlock)
-            block_time = cblock.nTime
-            txhash_list, raw_transactions = backend.get_tx_list(cblock)
+            # only prefetch blocks that are too deep to be reorganized before we get to them
+            if prefetcher and block_tip - block_index >= config.REORG_CHECK_DEPTH:
+                block = prefetcher.get(block_index, block_tip - config.REORG_CHECK_DEPTH)
+            else:
+                if prefetcher:
+                    prefetcher.reset()
+                block = fetch_block(block_index)
+            block_hash = block.block_hash
+            block_header = block.scanned_block.header
+            previous_block_hash = bitcoinlib.core.b2lx(block_header.hashPrevBlock)
+            block_time = block_header.nTime
+            txhash_list = block.txhash_list
             util.CURRENT_BLOCK_INDEX = block_index
 
-            try:
-                insert_block(
-                    db,
-                    block_index,
-                    block_hash,
-                    block_time,
-                    previous_block_hash,
-                    cblock.difficulty,
-                )
-            except BlockAlreadyExistsError as e:
-                logger.warning(e)
-                sys.exit(f"Exiting due to block already existing. {e}")
-            except DatabaseInsertError as e:
-                logger.error(e)
-                sys.exit("Critical database error encountered. Exiting.")
+            batch = BlockWriteBatch(block_index, block_hash, block_time, previous_block_hash, block_header.difficulty)
 
             valid_stamps_in_block: List[ValidStamp] = []
 
-            if not stamp_issuances_list[block_index] and block_index < config.CP_SRC20_GENESIS_BLOCK:
+            if not stamp_issuances and block_index < config.CP_SRC20_GENESIS_BLOCK:
                 valid_src20_str = ""
                 new_ledger_hash, new_txlist_hash, new_messages_hash = create_check_hashes(
                     db,
@@ -859,9 +1259,9 @@ def follow(db):
                     valid_stamps_in_block,
                     valid_src20_str,
                     txhash_list,
+                    batch=batch,
                 )
 
-                stamp_issuances_list.pop(block_index, None)
                 log_block_info(
                     block_index,
                     start_time,
@@ -870,35 +1270,25 @@ def follow(db):
                     new_messages_hash,
                     0,
                     0,
+                    rpc_stats=backend.rpc_counter.since(rpc_start),
+                    cp_ahead=issuance_prefetcher.ahead,
+                    upload_stats=upload_queue.since(upload_start) if upload_start is not None else None,
                 )
-                block_index = commit_and_update_block(db, block_index)
+                block_index = commit_and_update_block(db, block_index, batch)
                 continue
 
+            raw_transactions, prefilter_stats = select_candidates(block.scanned_block, stamp_issuances.keys())
+            candidate_list = [tx_hash for tx_hash in txhash_list if tx_hash in raw_transactions]
             tx_results = []
 
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                futures = []
-                for tx_hash in txhash_list:
-                    future = executor.submit(
-                        process_tx,
-                        db,
-                        tx_hash,
-                        block_index,
-                        stamp_issuances,
-                        raw_transactions,
+            for result in decode_block_transactions(db, candidate_list, block_index, stamp_issuances, raw_transactions):
+                if result.data is not None:
+                    result = result._replace(
+                        block_index=block_index,
+                        block_hash=block_hash,
+                        block_time=block_time,
                     )
-                    futures.append(future)
-
-                for future in concurrent.futures.as_completed(futures):
-                    result = future.result()
-                    if result.data is not None:
-                        result = result._replace(
-                            block_index=block_index,
-                            block_hash=block_hash,
-                            block_time=block_time,
-                        )
-                        tx_results.append(result)
-                        # tx_index += 1
+                    tx_results.append(result)
 
             tx_results = sorted(tx_results, key=lambda x: txhash_list.index(x.tx_hash))
             # Assign tx_index after sorting
@@ -906,7 +1296,7 @@ def follow(db):
                 tx_results[i] = result._replace(tx_index=tx_index)
                 tx_index += 1
 
-            block_processor = BlockProcessor(db)
+            block_processor = BlockProcessor(db, batch)
             block_processor.insert_transactions(tx_results)
             block_processor.process_transaction_results(tx_results)
 
@@ -914,7 +1304,6 @@ def follow(db):
                 block_processor.finalize_block(block_index, block_time, txhash_list)
             )
 
-            stamp_issuances_list.pop(block_index, None)
             log_block_info(
                 block_index,
                 start_time,
@@ -923,8 +1312,14 @@ def follow(db):
                 new_messages_hash,
                 stamps_in_block,
                 src20_in_block,
+                prefilter_stats,
+                backend.rpc_counter.since(rpc_start),
+                issuance_prefetcher.ahead,
+                upload_queue.since(upload_start) if upload_start is not None else None,
             )
-            block_index = commit_and_update_block(db, block_index)
+            if block_index % config.PREVOUT_CACHE_SAVE_INTERVAL == 0:
+                prevout_cache.save()
+            block_index = commit_and_update_block(db, block_index, batch)
 
             # if should_profile:
             #     profiler.disable()
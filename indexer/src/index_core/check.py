@@ -130,20 +130,67 @@ class ConsensusError(Exception):
     pass
 
 
-def consensus_hash(db, block_index, field, previous_consensus_hash, content):
+def initial_consensus_hash(block_index, field):
+    """Return the hash a chain starts from at `block_index`, or None if the block continues the chain."""
+    if block_index <= config.BLOCK_FIRST and field != "ledger_hash":
+        return util.dhash_string(CONSENSUS_HASH_SEED)
+    elif block_index == config.CP_SRC20_GENESIS_BLOCK + 1 and field == "ledger_hash":
+        return util.shash_string("")
+    return None
+
+
+def calculate_consensus_hash(block_index, field, previous_consensus_hash, content):
+    """Hash the content of a block onto the previous hash of the `field` chain."""
+    if config.TESTNET:
+        consensus_hash_version = CONSENSUS_HASH_VERSION_TESTNET
+    elif config.REGTEST:
+        consensus_hash_version = CONSENSUS_HASH_VERSION_REGTEST
+    else:
+        consensus_hash_version = CONSENSUS_HASH_VERSION_MAINNET
+
+    if field == "ledger_hash" and block_index == config.CP_SRC20_GENESIS_BLOCK:
+        return "e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855"
+    elif field == "ledger_hash" and block_index > config.CP_SRC20_GENESIS_BLOCK and content:
+        concatenated_content = previous_consensus_hash.encode("utf-8") + content.encode("utf-8")
+        return util.shash_string(concatenated_content)
+    elif field == "ledger_hash" and content == "":
+        return ""
+    return util.dhash_string(previous_consensus_hash + "{}{}".format(consensus_hash_version, "".join(content)))
+
+
+def check_consensus_checkpoint(block_index, field, calculated_hash):
+    """Raise a ConsensusError if `calculated_hash` doesn't match the checkpoint of the block."""
+    if config.TESTNET:
+        checkpoints = CHECKPOINTS_TESTNET
+    elif config.REGTEST:
+        checkpoints = CHECKPOINTS_REGTEST
+    else:
+        checkpoints = CHECKPOINTS_MAINNET
+
+    if field != "messages_hash" and block_index in checkpoints and checkpoints[block_index][field] != calculated_hash:
+        raise ConsensusError(
+            "Incorrect {} consensus hash for block {}.  Calculated {} but expected {}".format(
+                field,
+                block_index,
+                calculated_hash,
+                checkpoints[block_index][field],
+            )
+        )
+
+
+def consensus_hash(db, block_index, field, previous_consensus_hash, content, verify=True):
     field_position = config.BLOCK_FIELDS_POSITION
     cursor = db.cursor()
     # block_index = util.CURRENT_BLOCK_INDEX
 
     # initialize previous hash on first block.
-    if block_index <= config.BLOCK_FIRST and field != "ledger_hash":
+    initial_hash = initial_consensus_hash(block_index, field)
+    if initial_hash is not None:
         if previous_consensus_hash:
+            if field == "ledger_hash":
+                raise ConsensusError("Expected previous_consensus_hash to be unset for the SRC20 genesis block.")
             raise ConsensusError("Expected previous_consensus_hash to be unset for the first block.")
-        previous_consensus_hash = util.dhash_string(CONSENSUS_HASH_SEED)
-    elif block_index == config.CP_SRC20_GENESIS_BLOCK + 1 and field == "ledger_hash":
-        if previous_consensus_hash:
-            raise ConsensusError("Expected previous_consensus_hash to be unset for the SRC20 genesis block.")
-        previous_consensus_hash = util.shash_string("")
+        previous_consensus_hash = initial_hash
 
     # Get previous hash.
     if not previous_consensus_hash and field != "ledger_hash":
@@ -168,30 +215,15 @@ def consensus_hash(db, block_index, field, previous_consensus_hash, content):
             raise ConsensusError(f"Empty previous {field} for block {block_index}. Please launch a `reparse`.")
 
     # Calculate current hash.
-    if config.TESTNET:
-        consensus_hash_version = CONSENSUS_HASH_VERSION_TESTNET
-    elif config.REGTEST:
-        consensus_hash_version = CONSENSUS_HASH_VERSION_REGTEST
-    else:
-        consensus_hash_version = CONSENSUS_HASH_VERSION_MAINNET
-
-    if field == "ledger_hash" and block_index == config.CP_SRC20_GENESIS_BLOCK:
-        calculated_hash = "e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855"
-    elif field == "ledger_hash" and block_index > config.CP_SRC20_GENESIS_BLOCK and content:
-        concatenated_content = previous_consensus_hash.encode("utf-8") + content.encode("utf-8")
-        calculated_hash = util.shash_string(concatenated_content)
-    elif field == "ledger_hash" and content == "":
-        calculated_hash = ""
-    else:
-        calculated_hash = util.dhash_string(previous_consensus_hash + "{}{}".format(consensus_hash_version, "".join(content)))
+    calculated_hash = calculate_consensus_hash(block_index, field, previous_consensus_hash, content)
 
-    # Verify hash (if already in database) or save hash (if not).
-    cursor.execute("""SELECT * FROM blocks WHERE block_index = %s""", (block_index,))
-    results = cursor.fetchall()
-    if results:
-        found_hash = results[0][config.BLOCK_FIELDS_POSITION[field]]
-    else:
-        found_hash = None
+    # Verify hash (if already in database), new hashes are saved with the block row.
+    found_hash = None
+    if verify:
+        cursor.execute("""SELECT * FROM blocks WHERE block_index = %s""", (block_index,))
+        results = cursor.fetchall()
+        if results:
+            found_hash = results[0][config.BLOCK_FIELDS_POSITION[field]]
     if found_hash and field != "messages_hash":
         # Check against existing value.
         if calculated_hash != found_hash:
@@ -200,32 +232,73 @@ def consensus_hash(db, block_index, field, previous_consensus_hash, content):
                     field, block_index, calculated_hash, found_hash
                 )
             )
-    else:
-        # Save new hash.
-        cursor.execute(
-            """UPDATE blocks SET {} = %s WHERE block_index = %s""".format(field),
-            (calculated_hash, block_index),
-        )  # nosec
 
     # Check against checkpoints.
-    if config.TESTNET:
-        checkpoints = CHECKPOINTS_TESTNET
-    elif config.REGTEST:
-        checkpoints = CHECKPOINTS_REGTEST
-    else:
-        checkpoints = CHECKPOINTS_MAINNET
+    check_consensus_checkpoint(block_index, field, calculated_hash)
 
-    if field != "messages_hash" and block_index in checkpoints and checkpoints[block_index][field] != calculated_hash:
-        raise ConsensusError(
-            "Incorrect {} consensus hash for block {}.  Calculated {} but expected {}".format(
-                field,
-                block_index,
-                calculated_hash,
-                checkpoints[block_index][field],
+    return calculated_hash, found_hash
+
+
+class ConsensusHashChain:
+    """
+    The consensus hashes of the last parsed block, carried forward so that
+    `consensus_hash` doesn't have to read them back from the blocks table.
+
+    The chain seeds itself from the blocks table whenever it is asked for a
+    block that doesn't follow the last one it saw, on startup and after a
+    rollback.
+    """
+
+    def __init__(self):
+        self.block_index = None
+        self.txlist_hash = None
+        self.messages_hash = None
+        self.ledger_hash = None  # the last non-empty ledger hash
+
+    def seed(self, db, block_index):
+        """Load the hashes of the block before `block_index`."""
+        with db.cursor() as cursor:
+            cursor.execute(
+                """SELECT txlist_hash, messages_hash FROM blocks WHERE block_index = %s""",
+                (block_index - 1,),
             )
+            result = cursor.fetchone()
+            self.txlist_hash, self.messages_hash = result if result else (None, None)
+            cursor.execute(
+                """SELECT ledger_hash FROM blocks WHERE ledger_hash IS NOT NULL AND ledger_hash <> '' AND block_index < %s
+                ORDER BY block_index DESC LIMIT 1""",
+                (block_index,),
+            )
+            result = cursor.fetchone()
+            self.ledger_hash = result[0] if result else None
+        self.block_index = block_index - 1
+
+    def previous_hashes(self, db, block_index):
+        """
+        Return the previous hashes to hash `block_index` with, None where
+        `consensus_hash` must start a new chain.
+
+        Returns:
+            tuple: The previous txlist, ledger and messages hashes.
+        """
+        if self.block_index != block_index - 1:
+            self.seed(db, block_index)
+        first_block = block_index <= config.BLOCK_FIRST
+        return (
+            None if first_block else self.txlist_hash,
+            None if block_index == config.CP_SRC20_GENESIS_BLOCK + 1 else self.ledger_hash,
+            None if first_block else self.messages_hash,
         )
 
-    return calculated_hash, found_hash
+    def advance(self, block_index, txlist_hash, ledger_hash, messages_hash):
+        self.block_index = block_index
+        self.txlist_hash = txlist_hash
+        self.messages_hash = messages_hash
+        if ledger_hash:
+            self.ledger_hash = ledger_hash
+
+
+hash_chain = ConsensusHashChain()
 
 
 class VersionError(Exception):
@@ -1,5 +1,6 @@
 import decimal
 import logging
+import sys
 from datetime import datetime, timezone
 from typing import Any, Callable, Dict, List, TypeVar, cast
 
@@ -9,14 +10,18 @@ import config
 import index_core.exceptions as exceptions
 import index_core.log as log
 from config import (
+    BALANCE_SNAPSHOTS_TABLE,
     BLOCK_FIELDS_POSITION,
     BLOCKS_TABLE,
+    SRC20_BALANCES_TABLE,
     SRC20_TABLE,
     SRC20_VALID_TABLE,
     SRC_BACKGROUND_TABLE,
     STAMP_TABLE,
     TRANSACTIONS_TABLE,
+    UNDO_JOURNAL_TABLE,
 )
+from index_core.balance_engine import balance_engine
 from index_core.exceptions import BlockAlreadyExistsError, BlockUpdateError, DatabaseInsertError
 
 logger = logging.getLogger(__name__)
@@ -33,6 +38,29 @@ class CacheMixin:
     cache: Dict[str, bool] = {}
 
 
+# columns of table_schema.sql that databases created before them lack, added by `initialize`
+ADDED_COLUMNS = [
+    (TRANSACTIONS_TABLE, "is_op_return", "tinyint(1) DEFAULT NULL"),
+    (TRANSACTIONS_TABLE, "p2wsh_data", "MEDIUMBLOB DEFAULT NULL"),
+    ("s3objects", "status", "VARCHAR(16) NOT NULL DEFAULT 'uploaded'"),
+    ("s3objects", "content_type", "VARCHAR(255) DEFAULT NULL"),
+]
+
+# tables of table_schema.sql that databases created before them lack, created by `upgrade_schema`
+ADDED_TABLES = {
+    "s3_inventory": """
+        CREATE TABLE IF NOT EXISTS s3_inventory (
+          `scope` VARCHAR(255) NOT NULL,
+          `last_key` VARCHAR(255) DEFAULT NULL,
+          `watermark` DATETIME DEFAULT NULL,
+          `run_started` DATETIME DEFAULT NULL,
+          `complete` TINYINT(1) NOT NULL DEFAULT 0,
+          PRIMARY KEY (`scope`)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_as_ci
+    """,
+}
+
+
 def initialize(db):
     """initialize data, create and populate the database."""
     cursor = db.cursor()
@@ -53,6 +81,24 @@ def initialize(db):
     cursor.execute("""DELETE FROM transactions WHERE block_index < %s""", (config.BLOCK_FIRST,))
     cursor.close()
 
+    upgrade_schema(db)
+
+
+def upgrade_schema(db):
+    """Add the tables and columns of table_schema.sql that the database was created without."""
+    with db.cursor() as cursor:
+        for table, definition in ADDED_TABLES.items():
+            cursor.execute(definition)
+        for table, column, definition in ADDED_COLUMNS:
+            cursor.execute(
+                """SELECT COUNT(*) FROM information_schema.COLUMNS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s""",
+                (table, column),
+            )
+            if not cursor.fetchone()[0]:
+                logger.warning(f"Adding column {column} to {table}")
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN `{column}` {definition}")  # nosec
+
 
 TOTAL_MINTED_CACHE: dict[str, int] = {}
 
@@ -73,31 +119,8 @@ def reset_all_caches():
         if hasattr(func, attr):
             setattr(func, attr, {})
 
-    global TOTAL_MINTED_CACHE
-    TOTAL_MINTED_CACHE = {}
-
-
-def update_parsed_block(db, block_index):
-    """
-    Update the 'indexed' flag of a block in the database.
-
-    Args:
-        db (database connection): The database connection object.
-        block_index (int): The index of the block to update.
-
-    Returns:
-        None
-    """
-    cursor = db.cursor()
-    cursor.execute(
-        """
-                    UPDATE blocks SET indexed = 1
-                    WHERE block_index = %s
-                    """,
-        (block_index,),
-    )
-    db.commit()
-    cursor.close()
+    # cleared in place, src20 holds a reference to it
+    TOTAL_MINTED_CACHE.clear()
 
 
 def is_prev_block_parsed(db, block_index):
@@ -133,45 +156,68 @@ def is_prev_block_parsed(db, block_index):
     if block is not None and block[BLOCK_FIELDS_POSITION["indexed"]] == 1:
         return True
     else:
-        purge_block_db(db, block_index - 1)
-        rebuild_balances(db)
+        rollback_blocks(db, block_index - 1)
         return False
 
 
+SRC20_COLUMNS = [
+    "id",
+    "tx_hash",
+    "tx_index",
+    "amt",
+    "block_index",
+    "creator",
+    "deci",
+    "lim",
+    "max",
+    "op",
+    "p",
+    "tick",
+    "destination",
+    "block_time",
+    "tick_hash",
+    "status",
+]
+SRC20_VALID_COLUMNS = SRC20_COLUMNS + ["creator_bal", "destination_bal"]
+
+
 def insert_into_src20_tables(db, processed_src20_in_block):
+    """Insert the SRC-20 operations of a block into SRC20, and the valid ones into SRC20Valid, one statement each."""
+    src20_rows = []
+    src20_valid_rows = []
+    for i, src20_dict in enumerate(processed_src20_in_block):
+        id = f"{i}_{src20_dict.get('tx_index')}_"
+        id += f"{src20_dict.get('tx_hash')}"
+        row = src20_row(id, src20_dict)
+        src20_rows.append(row)
+        if src20_dict.get("valid") == 1:
+            src20_valid_rows.append(
+                row + (src20_dict.get("total_balance_creator"), src20_dict.get("total_balance_destination"))
+            )
+
     with db.cursor() as src20_cursor:
-        for i, src20_dict in enumerate(processed_src20_in_block):
-            id = f"{i}_{src20_dict.get('tx_index')}_"
-            id += f"{src20_dict.get('tx_hash')}"
-            insert_into_src20_table(src20_cursor, SRC20_TABLE, id, src20_dict)
-            if src20_dict.get("valid") == 1:
-                insert_into_src20_table(src20_cursor, SRC20_VALID_TABLE, id, src20_dict)
+        for table_name, column_names, rows in (
+            (SRC20_TABLE, SRC20_COLUMNS, src20_rows),
+            (SRC20_VALID_TABLE, SRC20_VALID_COLUMNS, src20_valid_rows),
+        ):
+            if rows:
+                placeholders = ", ".join(["%s"] * len(column_names))
+                src20_cursor.executemany(
+                    f"""
+                    INSERT INTO {table_name} ({", ".join(column_names)})
+                    VALUES ({placeholders})
+                    """,  # nosec
+                    rows,
+                )
 
 
-def insert_into_src20_table(cursor, table_name, id, src20_dict):
+def src20_row(id, src20_dict):
+    """Return the values of the SRC20_COLUMNS of an SRC-20 operation."""
     block_time = src20_dict.get("block_time")
     if isinstance(block_time, int):
         block_time = datetime.fromtimestamp(block_time, tz=timezone.utc)
 
-    column_names = [
-        "id",
-        "tx_hash",
-        "tx_index",
-        "amt",
-        "block_index",
-        "creator",
-        "deci",
-        "lim",
-        "max",
-        "op",
-        "p",
-        "tick",
-        "destination",
-        "block_time",
-        "tick_hash",
-        "status",
-    ]
-    column_values = [
+    return (
         id,
         src20_dict.get("tx_hash"),
         src20_dict.get("tx_index"),
@@ -188,26 +234,7 @@ def insert_into_src20_table(cursor, table_name, id, src20_dict):
         block_time,
         src20_dict.get("tick_hash"),
         src20_dict.get("status"),
-    ]
-
-    if "total_balance_creator" in src20_dict and table_name == SRC20_VALID_TABLE:
-        column_names.append("creator_bal")
-        column_values.append(src20_dict.get("total_balance_creator"))
-
-    if "total_balance_destination" in src20_dict and table_name == SRC20_VALID_TABLE:
-        column_names.append("destination_bal")
-        column_values.append(src20_dict.get("total_balance_destination"))
-
-    placeholders = ", ".join(["%s"] * len(column_names))
-
-    query = f"""
-        INSERT INTO {table_name} ({", ".join(column_names)})
-        VALUES ({placeholders})
-    """  # nosec
-
-    cursor.execute(query, tuple(column_values))
-
-    return
+    )
 
 
 def insert_transactions(db, transactions):
@@ -238,6 +265,9 @@ def insert_transactions(db, transactions):
                     tx.fee,
                     tx.data,
                     tx.keyburn,
+                    # stored for reparse, never NULL on rows indexed since these columns exist
+                    int(bool(tx.is_op_return)),
+                    tx.p2wsh_data,
                 )
             )
         with db.cursor() as cursor:
@@ -253,8 +283,10 @@ def insert_transactions(db, transactions):
                     btc_amount,
                     fee,
                     data,
-                    keyburn
-                ) VALUES (%s, %s, %s, %s, FROM_UNIXTIME(%s), %s, %s, %s, %s, %s, %s)""",
+                    keyburn,
+                    is_op_return,
+                    p2wsh_data
+                ) VALUES (%s, %s, %s, %s, FROM_UNIXTIME(%s), %s, %s, %s, %s, %s, %s, %s, %s)""",
                 (values),
             )
     except Exception as e:
@@ -309,6 +341,55 @@ def insert_into_stamp_table(db, parsed_stamps: List):
         raise ValueError(f"Error occurred while inserting to StampTable: {e}")
 
 
+def insert_into_collection_tables(db, collection_inserts, stamp_inserts, creator_inserts):
+    """
+    Insert the legacy collection memberships of a block's stamps, see
+    `CollectionMatcher.match`. Each list is written with one multi-row statement.
+
+    Args:
+        db: The database connection object.
+        collection_inserts (list): (collection_id, collection_name) tuples, collection_id being the 16 byte md5 digest.
+        stamp_inserts (list): (collection_id, stamp) tuples.
+        creator_inserts (list): (collection_id, creator_address) tuples.
+    """
+    with db.cursor() as cursor:
+        if collection_inserts:
+            cursor.executemany(
+                """
+                INSERT INTO collections (collection_id, collection_name)
+                VALUES (%s, %s)
+                ON DUPLICATE KEY UPDATE collection_name=VALUES(collection_name)
+                """,
+                collection_inserts,
+            )
+        if stamp_inserts:
+            cursor.executemany(
+                """
+                INSERT INTO collection_stamps (collection_id, stamp)
+                VALUES (%s, %s)
+                ON DUPLICATE KEY UPDATE collection_id=VALUES(collection_id), stamp=VALUES(stamp)
+                """,
+                stamp_inserts,
+            )
+        if creator_inserts:
+            cursor.executemany(
+                """
+                INSERT INTO creator (address)
+                VALUES (%s)
+                ON DUPLICATE KEY UPDATE address=address
+                """,
+                list(dict.fromkeys(creator_address for _, creator_address in creator_inserts)),
+            )
+            cursor.executemany(
+                """
+                INSERT INTO collection_creators (collection_id, creator_address)
+                VALUES (%s, %s)
+                ON DUPLICATE KEY UPDATE collection_id=VALUES(collection_id), creator_address=VALUES(creator_address)
+                """,
+                creator_inserts,
+            )
+
+
 def get_srcbackground_data(db, tick):
     """
     Retrieves the background image data for a given tick and p value.
@@ -343,69 +424,218 @@ def get_srcbackground_data(db, tick):
             return None, None, None
 
 
+AMT_DECIMALS = 18  # balances.amt is a DECIMAL(38,18)
+EXACT_CONTEXT = decimal.Context(prec=100)
+
+
+def to_scaled_amt(amt):
+    """Return a DECIMAL(38,18) amount as an integer number of 10**-18 units."""
+    return int(amt.scaleb(AMT_DECIMALS, context=EXACT_CONTEXT))
+
+
+def from_scaled_amt(amt):
+    return D(amt).scaleb(-AMT_DECIMALS, context=EXACT_CONTEXT)
+
+
+def add_to_balance(all_balances, tick, tick_hash, address, amt, block_index, block_time):
+    """
+    Add a scaled amount to a compact balance of `rebuild_balances`.
+
+    The balances are kept as [tick, tick_hash, address, scaled amt, last_update, block_time]
+    lists keyed by balance id, with interned strings, so that the whole history
+    fits in small containers.
+    """
+    id_field = tick + "_" + address
+    balance = all_balances.get(id_field)
+    if balance is None:
+        all_balances[id_field] = [sys.intern(tick), sys.intern(tick_hash), sys.intern(address), amt, block_index, block_time]
+    else:
+        balance[1] = sys.intern(tick_hash)
+        balance[3] += amt
+        balance[4] = block_index
+        balance[5] = block_time
+
+
+def replay_src20_valid(db, all_balances, after_block=None, through_block=None):
+    """
+    Apply the valid SRC-20 TRANSFER and MINT rows to a set of compact balances,
+    in block order, streaming the rows from the server.
+
+    Args:
+        db: The database connection object.
+        all_balances (dict): The compact balances to update, keyed by balance id.
+        after_block (int, optional): Only replay the rows above this block.
+        through_block (int, optional): Only replay the rows up to this block.
+
+    Returns:
+        int: The last block replayed, `after_block` if there were no rows.
+    """
+    conditions = ["(op = 'TRANSFER' OR op = 'MINT')", "amt > 0"]
+    params = []
+    if after_block is not None:
+        conditions.append("block_index > %s")
+        params.append(after_block)
+    if through_block is not None:
+        conditions.append("block_index <= %s")
+        params.append(through_block)
+    query = f"""
+    SELECT op, creator, destination, tick, tick_hash, amt, block_time, block_index
+    FROM {SRC20_VALID_TABLE}
+    WHERE {" AND ".join(conditions)}
+    ORDER by block_index
+    """  # nosec
+
+    last_block = after_block
+    with db.cursor(mysql.cursors.SSCursor) as stream:
+        stream.execute(query, params)
+        for op, creator, destination, tick, tick_hash, amt, block_time, block_index in stream:
+            amt = to_scaled_amt(amt)
+            add_to_balance(all_balances, tick, tick_hash, destination, amt, block_index, block_time)
+            if op == "TRANSFER":
+                add_to_balance(all_balances, tick, tick_hash, creator, -amt, block_index, block_time)
+            last_block = block_index
+    return last_block
+
+
+def load_balance_snapshot(db):
+    """
+    Load the latest balance snapshot. Snapshots above a purged block are purged
+    with it, so the latest one is always valid.
+
+    Args:
+        db: The database connection object.
+
+    Returns:
+        tuple: The block index of the snapshot and its compact balances keyed by balance id, (None, {}) if there is none.
+    """
+    with db.cursor() as cursor:
+        cursor.execute(f"SELECT MAX(block_index) FROM {BALANCE_SNAPSHOTS_TABLE}")  # nosec
+        snapshot_block = cursor.fetchone()[0]
+    if snapshot_block is None:
+        return None, {}
+    all_balances: dict[str, list] = {}
+    with db.cursor(mysql.cursors.SSCursor) as stream:
+        stream.execute(
+            f"""
+            SELECT id, tick, tick_hash, address, amt, last_update, block_time
+            FROM {BALANCE_SNAPSHOTS_TABLE}
+            WHERE block_index = %s
+            """,  # nosec
+            (snapshot_block,),
+        )
+        for id_field, tick, tick_hash, address, amt, last_update, block_time in stream:
+            all_balances[id_field] = [
+                sys.intern(tick),
+                sys.intern(tick_hash),
+                sys.intern(address),
+                to_scaled_amt(amt),
+                last_update,
+                block_time,
+            ]
+    return snapshot_block, all_balances
+
+
+def insert_balance_snapshot(cursor, block_index, all_balances):
+    """
+    Store the balances as of `block_index` and drop the snapshots older than the
+    last `config.BALANCE_SNAPSHOT_KEEP`. Nothing is committed.
+
+    Args:
+        cursor: The database cursor.
+        block_index (int): The block the balances are valid at.
+        all_balances (dict): The compact balances keyed by balance id.
+    """
+    logger.info(f"Saving a snapshot of {len(all_balances)} balances at block {block_index}")
+    cursor.execute(f"DELETE FROM {BALANCE_SNAPSHOTS_TABLE} WHERE block_index = %s", (block_index,))  # nosec
+    cursor.executemany(
+        f"""INSERT INTO {BALANCE_SNAPSHOTS_TABLE}(block_index, id, tick, tick_hash, address, amt, last_update, block_time)
+        VALUES(%s,%s,%s,%s,%s,%s,%s,%s)""",  # nosec
+        (
+            (block_index, key, tick, tick_hash, address, from_scaled_amt(amt), last_update, block_time)
+            for key, (tick, tick_hash, address, amt, last_update, block_time) in all_balances.items()
+        ),
+    )
+    cursor.execute(
+        f"SELECT DISTINCT block_index FROM {BALANCE_SNAPSHOTS_TABLE} ORDER BY block_index DESC LIMIT %s",  # nosec
+        (config.BALANCE_SNAPSHOT_KEEP,),
+    )
+    kept = [row[0] for row in cursor.fetchall()]
+    if len(kept) == config.BALANCE_SNAPSHOT_KEEP:
+        cursor.execute(f"DELETE FROM {BALANCE_SNAPSHOTS_TABLE} WHERE block_index < %s", (kept[-1],))  # nosec
+
+
+def save_balance_snapshot(db, block_index):
+    """
+    Snapshot the balances at `block_index`, replaying only the blocks after the
+    previous snapshot. Runs inside the caller's transaction.
+
+    Args:
+        db: The database connection object.
+        block_index (int): The last parsed block.
+    """
+    snapshot_block, all_balances = load_balance_snapshot(db)
+    if snapshot_block is not None and snapshot_block >= block_index:
+        return
+    replay_src20_valid(db, all_balances, after_block=snapshot_block, through_block=block_index)
+    with db.cursor() as cursor:
+        insert_balance_snapshot(cursor, block_index, all_balances)
+
+
+def balances_match(db, all_balances):
+    """
+    Compare the balances table with rebuilt compact balances, streaming the
+    table and looking each row up by its exact id. Nothing depends on the order
+    the server sorts the ids in, which differs from Python's for ids with
+    trailing spaces under the PAD SPACE collations.
+
+    Args:
+        db: The database connection object.
+        all_balances (dict): The compact balances keyed by balance id.
+
+    Returns:
+        bool: True if the table holds exactly these balances.
+    """
+    row_count = 0
+    with db.cursor(mysql.cursors.SSCursor) as stream:
+        stream.execute(
+            f"""
+            SELECT id, tick, tick_hash, address, amt, last_update
+            FROM {SRC20_BALANCES_TABLE} WHERE p = 'SRC-20'
+            """  # nosec
+        )
+        for id_field, tick, tick_hash, address, amt, last_update in stream:
+            balance = all_balances.get(id_field)
+            if balance is None or amt is None:
+                return False
+            if [tick, tick_hash, address, to_scaled_amt(amt), last_update] != balance[:5]:
+                return False
+            row_count += 1
+    # the ids of the table are unique, so every balance was matched once
+    return row_count == len(all_balances)
+
+
 def rebuild_balances(db):
+    balance_engine.invalidate()
     cursor = db.cursor()
 
     try:
         logger.info("Validating Balances Table..")
 
         db.begin()
-        query = """
-        SELECT id, tick, tick_hash, address, amt, last_update
-        FROM balances where p = 'SRC-20'
-        """
-        cursor.execute(query)
-        existing_balances = [tuple(row) for row in cursor.fetchall()]
-
-        query = f"""
-        SELECT op, creator, destination, tick, tick_hash, amt, block_time, block_index
-        FROM {SRC20_VALID_TABLE}
-        WHERE (op = 'TRANSFER' OR op = 'MINT') AND amt > 0
-        ORDER by block_index
-        """  # nosec
-        cursor.execute(query)
-        src20_valid_list = cursor.fetchall()
-
-        all_balances: dict[str, dict[str, Any]] = {}
-        for [
-            op,
-            creator,
-            destination,
-            tick,
-            tick_hash,
-            amt,
-            block_time,
-            block_index,
-        ] in src20_valid_list:
-            destination_id = tick + "_" + destination
-            destination_amt = D(0) if destination_id not in all_balances else all_balances[destination_id]["amt"]
-            destination_amt += amt
-
-            all_balances[destination_id] = {
-                "tick": tick,
-                "tick_hash": tick_hash,
-                "address": destination,
-                "amt": destination_amt,
-                "last_update": block_index,
-                "block_time": block_time,
-            }
-
-            if op == "TRANSFER":
-                creator_id = tick + "_" + creator
-                creator_amt = D(0) if creator_id not in all_balances else all_balances[creator_id]["amt"]
-                creator_amt -= amt
-                all_balances[creator_id] = {
-                    "tick": tick,
-                    "tick_hash": tick_hash,
-                    "address": creator,
-                    "amt": creator_amt,
-                    "last_update": block_index,
-                    "block_time": block_time,
-                }
-
-        if set(existing_balances) == set((key,) + tuple(value.values())[:-1] for key, value in all_balances.items()):
+        snapshot_block, all_balances = load_balance_snapshot(db)
+        if snapshot_block is not None:
+            logger.info(f"Replaying SRC-20 balances after the snapshot at block {snapshot_block}")
+        last_block = replay_src20_valid(db, all_balances, after_block=snapshot_block)
+        if (
+            config.BALANCE_SNAPSHOT_INTERVAL
+            and last_block is not None
+            and last_block - (snapshot_block or 0) >= config.BALANCE_SNAPSHOT_INTERVAL
+        ):
+            insert_balance_snapshot(cursor, last_block, all_balances)
+
+        if balances_match(db, all_balances):
             logger.info("No changes in balances. Skipping deletion and insertion." "")
-            cursor.close()
+            db.commit()
             return
         else:
             logger.warning("Purging and rebuilding {} table".format("balances"))
@@ -417,19 +647,10 @@ def rebuild_balances(db):
 
             logger.warning("Inserting {} balances".format(len(all_balances)))
 
-            values = [
-                (
-                    key,
-                    value["tick"],
-                    value["tick_hash"],
-                    value["address"],
-                    value["amt"],
-                    value["last_update"],
-                    value["block_time"],
-                    "SRC-20",
-                )
-                for key, value in all_balances.items()
-            ]
+            values = (
+                (key, tick, tick_hash, address, from_scaled_amt(amt), last_update, block_time, "SRC-20")
+                for key, (tick, tick_hash, address, amt, last_update, block_time) in all_balances.items()
+            )
 
             cursor.executemany(
                 """INSERT INTO balances(id, tick, tick_hash, address, amt, last_update, block_time, p)
@@ -459,9 +680,12 @@ def purge_block_db(db, block_index):
         None
     """
     reset_all_caches()
+    balance_engine.invalidate()
     cursor = db.cursor()
 
     tables = [
+        UNDO_JOURNAL_TABLE,
+        BALANCE_SNAPSHOTS_TABLE,
         SRC20_VALID_TABLE,
         SRC20_TABLE,
         STAMP_TABLE,
@@ -485,6 +709,167 @@ def purge_block_db(db, block_index):
     cursor.close()
 
 
+def insert_undo_entries(cursor, block_index, entries):
+    """
+    Journal how to undo part of a block, see `undo_blocks`. Nothing is committed.
+
+    Args:
+        cursor: The database cursor.
+        block_index (int): The block being parsed.
+        entries (list): (table_name, row_id, tick, tick_hash, address, amt, last_update, block_time) tuples. For
+            the balances table they hold the state of the row before the block, amt None if the block creates it.
+    """
+    if not config.BLOCK_UNDO_DEPTH or not entries:
+        return
+    placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s, FROM_UNIXTIME(%s))"] * len(entries))
+    cursor.execute(
+        f"""
+        INSERT INTO {UNDO_JOURNAL_TABLE}
+        (block_index, table_name, row_id, tick, tick_hash, address, amt, last_update, block_time)
+        VALUES {placeholders}
+        """,  # nosec
+        [value for entry in entries for value in (block_index,) + tuple(entry)],
+    )
+
+
+def journal_block(db, block_index):
+    """
+    Mark a block as fully journaled and prune the journal to the last
+    `config.BLOCK_UNDO_DEPTH` blocks. Runs inside the block's transaction.
+
+    Args:
+        db: The database connection object.
+        block_index (int): The block being committed.
+    """
+    if not config.BLOCK_UNDO_DEPTH:
+        return
+    with db.cursor() as cursor:
+        insert_undo_entries(cursor, block_index, [(BLOCKS_TABLE, str(block_index), None, None, None, None, None, None)])
+        cursor.execute(
+            f"DELETE FROM {UNDO_JOURNAL_TABLE} WHERE block_index <= %s",  # nosec
+            (block_index - config.BLOCK_UNDO_DEPTH,),
+        )
+
+
+def undo_blocks(db, block_index):
+    """
+    Restore the balances rows changed by the blocks from `block_index` on by
+    replaying the undo journal backwards. Nothing is committed.
+
+    Args:
+        db: The database connection object.
+        block_index (int): The first block to undo.
+
+    Returns:
+        bool: False, with nothing changed, if some of the blocks have no marker in the journal.
+    """
+    if not config.BLOCK_UNDO_DEPTH:
+        return False
+    with db.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT COUNT(*) FROM {BLOCKS_TABLE}
+            WHERE block_index >= %s AND NOT EXISTS (
+                SELECT 1 FROM {UNDO_JOURNAL_TABLE}
+                WHERE {UNDO_JOURNAL_TABLE}.table_name = %s AND {UNDO_JOURNAL_TABLE}.block_index = {BLOCKS_TABLE}.block_index
+            )
+            """,  # nosec
+            (block_index, BLOCKS_TABLE),
+        )
+        if cursor.fetchone()[0]:
+            return False
+
+        cursor.execute(
+            f"""
+            SELECT table_name, row_id, tick, tick_hash, address, amt, last_update, block_time
+            FROM {UNDO_JOURNAL_TABLE}
+            WHERE block_index >= %s AND table_name != %s
+            ORDER BY seq DESC
+            """,  # nosec
+            (block_index, BLOCKS_TABLE),
+        )
+        entries = cursor.fetchall()
+        for table_name, row_id, tick, tick_hash, address, amt, last_update, block_time in entries:
+            if amt is None:
+                cursor.execute(f"DELETE FROM {SRC20_BALANCES_TABLE} WHERE id = %s", (row_id,))  # nosec
+            else:
+                cursor.execute(
+                    f"""
+                    INSERT INTO {SRC20_BALANCES_TABLE}
+                    (id, address, tick, amt, last_update, block_time, p, tick_hash)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE
+                        address = VALUES(address),
+                        tick = VALUES(tick),
+                        amt = VALUES(amt),
+                        last_update = VALUES(last_update),
+                        block_time = VALUES(block_time),
+                        tick_hash = VALUES(tick_hash)
+                    """,  # nosec
+                    (row_id, address, tick, amt, last_update, block_time, "SRC-20", tick_hash),
+                )
+    logger.warning(f"Undid {len(entries)} journaled changes of the blocks from {block_index}")
+    return True
+
+
+def rollback_blocks(db, block_index):
+    """
+    Remove the blocks from `block_index` on. Their balance changes are undone
+    from the undo journal when it covers them all, otherwise the balances are
+    rebuilt from the SRC20Valid history.
+
+    Args:
+        db: The database connection object.
+        block_index (int): The first block to remove.
+    """
+    journaled = undo_blocks(db, block_index)
+    purge_block_db(db, block_index)
+    if not journaled:
+        rebuild_balances(db)
+
+
+def reset_parsed_blocks(db, block_index):
+    """
+    Delete what was parsed from the stored transactions of the blocks from
+    `block_index` on, keeping their blocks and transactions rows, so that they
+    can be reparsed. Their txlist and ledger hashes are cleared, they mark the
+    blocks still to reparse. Balances are not rebuilt.
+
+    Args:
+        db: The database connection object.
+        block_index (int): The first block to reset.
+    """
+    reset_all_caches()
+    balance_engine.invalidate()
+    with db.cursor() as cursor:
+        cursor.execute(
+            f"""
+            DELETE collection_stamps FROM collection_stamps
+            JOIN {STAMP_TABLE} ON {STAMP_TABLE}.stamp = collection_stamps.stamp
+            WHERE {STAMP_TABLE}.block_index >= %s
+            """,  # nosec
+            (block_index,),
+        )
+        for table in [UNDO_JOURNAL_TABLE, BALANCE_SNAPSHOTS_TABLE, SRC20_VALID_TABLE, SRC20_TABLE, STAMP_TABLE]:
+            logger.warning("Purging {} from database after block: {}".format(table, block_index))
+            cursor.execute(f"DELETE FROM {table} WHERE block_index >= %s", (block_index,))  # nosec
+        cursor.execute(
+            f"UPDATE {BLOCKS_TABLE} SET txlist_hash = NULL, ledger_hash = NULL WHERE block_index >= %s",  # nosec
+            (block_index,),
+        )
+    db.commit()
+
+
+def first_unparsed_block(db):
+    """
+    Return the first block left without a txlist hash by `reset_parsed_blocks`,
+    or None if every stored block is parsed.
+    """
+    with db.cursor() as cursor:
+        cursor.execute("""SELECT MIN(block_index) FROM blocks WHERE txlist_hash IS NULL""")
+        return cursor.fetchone()[0]
+
+
 def get_src20_deploy(db, tick, src20_processed_in_block):
     """
     Retrieves the 'lim', 'max', and 'dec' values for a given 'tick' DEPLOY. The function first attempts to find these values
@@ -520,6 +905,8 @@ def get_src20_deploy(db, tick, src20_processed_in_block):
 
 
 def get_src20_deploy_in_block(processed_blocks, tick):
+    if hasattr(processed_blocks, "get_deploy"):  # src20.Src20BlockLedger, indexed by tick
+        return processed_blocks.get_deploy(tick)
     for item in processed_blocks:
         if item.get("tick") == tick and item.get("op") == "DEPLOY" and item.get("valid") == 1:
             return item.get("lim"), item.get("max"), item.get("dec")
@@ -730,7 +1117,18 @@ def next_tx_index(db):
     return tx_index
 
 
-def insert_block(db, block_index, block_hash, block_time, previous_block_hash, difficulty):
+def insert_block(
+    db,
+    block_index,
+    block_hash,
+    block_time,
+    previous_block_hash,
+    difficulty,
+    txlist_hash=None,
+    ledger_hash=None,
+    messages_hash=None,
+    indexed=None,
+):
     """
     Insert a new block into the database, does not commit
 
@@ -741,6 +1139,10 @@ def insert_block(db, block_index, block_hash, block_time, previous_block_hash, d
         block_time (int): The timestamp of the block.
         previous_block_hash (str): The hash of the previous block.
         difficulty (float): The difficulty of the block.
+        txlist_hash (str, optional): The transaction list hash of the block.
+        ledger_hash (str, optional): The ledger hash of the block.
+        messages_hash (str, optional): The messages hash of the block.
+        indexed (int, optional): 1 if the block is fully parsed.
 
     Returns:
         None
@@ -752,9 +1154,23 @@ def insert_block(db, block_index, block_hash, block_time, previous_block_hash, d
                         block_hash,
                         block_time,
                         previous_block_hash,
-                        difficulty
-                        ) VALUES(%s,%s,FROM_UNIXTIME(%s),%s,%s)"""
-    args = (block_index, block_hash, block_time, previous_block_hash, float(difficulty))
+                        difficulty,
+                        ledger_hash,
+                        txlist_hash,
+                        messages_hash,
+                        indexed
+                        ) VALUES(%s,%s,FROM_UNIXTIME(%s),%s,%s,%s,%s,%s,%s)"""
+    args = (
+        block_index,
+        block_hash,
+        block_time,
+        previous_block_hash,
+        float(difficulty),
+        ledger_hash,
+        txlist_hash,
+        messages_hash,
+        indexed,
+    )
 
     try:
         cursor.execute(block_query, args)
@@ -797,3 +1213,75 @@ def update_block_hashes(db, block_index, txlist_hash, ledger_hash, messages_hash
         raise BlockUpdateError(f"Error executing query: {block_query} with arguments: {args}. Error message: {e}")
     finally:
         cursor.close()
+
+
+class BlockWriteBatch:
+    """
+    The writes of one block, gathered while it is parsed and issued by `flush`
+    as a few multi-row statements in the block's transaction.
+
+    The blocks row is written last, complete with its consensus hashes and the
+    indexed flag, so a committed block is always a fully parsed one.
+    """
+
+    def __init__(self, block_index, block_hash, block_time, previous_block_hash, difficulty):
+        self.block_index = block_index
+        self.block_hash = block_hash
+        self.block_time = block_time
+        self.previous_block_hash = previous_block_hash
+        self.difficulty = difficulty
+        self.txlist_hash = None
+        self.ledger_hash = None
+        self.messages_hash = None
+        self.transactions: List = []
+        self.stamps: List = []
+        self.src20: List = []
+        self.collection_inserts: Dict[tuple, None] = {}
+        self.collection_stamp_inserts: Dict[tuple, None] = {}
+        self.collection_creator_inserts: Dict[tuple, None] = {}
+
+    def set_hashes(self, txlist_hash, ledger_hash, messages_hash):
+        self.txlist_hash = txlist_hash
+        self.ledger_hash = ledger_hash
+        self.messages_hash = messages_hash
+
+    def add_collection_data(self, collection_inserts, stamp_inserts, creator_inserts):
+        self.collection_inserts.update(dict.fromkeys(collection_inserts))
+        self.collection_stamp_inserts.update(dict.fromkeys(stamp_inserts))
+        self.collection_creator_inserts.update(dict.fromkeys(creator_inserts))
+
+    def flush(self, db):
+        """
+        Issue the writes of the block, without committing.
+
+        Raises:
+            BlockAlreadyExistsError: If the block is already in the blocks table.
+        """
+        insert_block(
+            db,
+            self.block_index,
+            self.block_hash,
+            self.block_time,
+            self.previous_block_hash,
+            self.difficulty,
+            self.txlist_hash,
+            self.ledger_hash,
+            self.messages_hash,
+            indexed=1,
+        )
+        if self.transactions:
+            insert_transactions(db, self.transactions)
+        self.flush_parsed(db)
+
+    def flush_parsed(self, db):
+        """Issue the writes of the stamps, SRC-20 operations and collections of the block, without committing."""
+        if self.stamps:
+            insert_into_stamp_table(db, self.stamps)
+        if self.src20:
+            insert_into_src20_tables(db, self.src20)
+        insert_into_collection_tables(
+            db,
+            list(self.collection_inserts),
+            list(self.collection_stamp_inserts),
+            list(self.collection_creator_inserts),
+        )
@@ -0,0 +1,92 @@
+"""
+On-disk store of the CP stamp issuances of confirmed blocks.
+
+The issuances of a block never change once the block is buried, so they are
+kept in a small sqlite file and `xcprequest` only asks the CP API for blocks
+it hasn't seen yet. Blocks within `config.REORG_CHECK_DEPTH` of the CP tip are
+never stored, they are fetched again until they are deep enough.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+
+import config
+import index_core.util as util
+
+logger = logging.getLogger(__name__)
+
+
+class IssuanceStore:
+    """block_index -> {tx_hash: stamp issuance} store backed by sqlite, a no-op when `path` is not set."""
+
+    def __init__(self, path=config.CP_ISSUANCE_CACHE_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = None
+
+    def _connect(self):
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS issuances (block_index INTEGER PRIMARY KEY, issuances TEXT NOT NULL)"
+            )
+            self.conn.commit()
+            logger.info(f"Using the CP issuance cache at {self.path}")
+        return self.conn
+
+    def get_many(self, block_indexes):
+        """
+        Look up the stored issuances of several blocks.
+
+        Args:
+            block_indexes (list): The block indexes to look up.
+
+        Returns:
+            dict: The stamp issuances of the stored blocks keyed by tx_hash, keyed by block index.
+        """
+        if not self.path or not block_indexes:
+            return {}
+        placeholders = ",".join("?" * len(block_indexes))
+        with self.lock:
+            rows = (
+                self._connect()
+                .execute(
+                    f"SELECT block_index, issuances FROM issuances WHERE block_index IN ({placeholders})",  # nosec
+                    list(block_indexes),
+                )
+                .fetchall()
+            )
+        return {block_index: json.loads(issuances) for block_index, issuances in rows}
+
+    def get(self, block_index):
+        """Return the stored issuances of a block, or None if the block isn't stored."""
+        return self.get_many([block_index]).get(block_index)
+
+    def put_many(self, results):
+        """
+        Store the issuances of the blocks that are deep enough below the CP tip.
+
+        Args:
+            results (dict): The stamp issuances of every block keyed by tx_hash, keyed by block index.
+        """
+        if not self.path or util.CP_BLOCK_COUNT is None:
+            return
+        last_confirmed = util.CP_BLOCK_COUNT - config.REORG_CHECK_DEPTH
+        rows = [
+            (block_index, json.dumps(issuances)) for block_index, issuances in results.items() if block_index <= last_confirmed
+        ]
+        if not rows:
+            return
+        with self.lock:
+            conn = self._connect()
+            conn.executemany("INSERT OR REPLACE INTO issuances (block_index, issuances) VALUES (?, ?)", rows)
+            conn.commit()
+
+    def put(self, block_index, issuances):
+        self.put_many({block_index: issuances})
+
+
+issuance_store = IssuanceStore()
@@ -5,7 +5,7 @@ import logging
 import zlib
 from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import ClassVar, Dict, List, Optional, TypedDict, Union
+from typing import Dict, List, Optional, Set, Tuple, TypedDict, Union
 
 import magic
 import msgpack
@@ -19,6 +19,7 @@ from config import (
     CP_SRC721_GENESIS_BLOCK,
     DOMAINNAME,
     INVALID_BTC_STAMP_SUFFIX,
+    LEGACY_COLLECTIONS,
     STRIP_WHITESPACE,
     SUPPORTED_SUB_PROTOCOLS,
 )
@@ -99,7 +100,6 @@ class StampData:
     src20_dict: Optional[dict] = None
     pval_src20: Optional[bool] = None
     is_posh: Optional[bool] = False
-    precomputed_collections: ClassVar[List[Dict]] = []
 
     @staticmethod
     def check_custom_suffix(bytestring_data):
@@ -123,94 +123,6 @@ class StampData:
     def generate_collection_id(name: str) -> bytes:
         return hashlib.md5(name.encode(), usedforsecurity=False).digest()
 
-    @classmethod
-    def precompute_collections(cls, collections: List[Dict]):
-        if not cls.precomputed_collections:
-            for collection in collections:
-                collection_id = cls.generate_collection_id(collection["name"]).hex()
-                file_hashes_set = set(collection.get("file_hashes", []))
-                stamps_set = set(collection.get("stamps", []))
-                is_posh = collection.get("is_posh", False)
-                cls.precomputed_collections.append(
-                    {
-                        "collection_id": collection_id,
-                        "name": collection["name"],
-                        "file_hashes": file_hashes_set,
-                        "stamps": stamps_set,
-                        "creators": collection.get("creators", []),
-                        "is_posh": is_posh,
-                    }
-                )
-
-    def match_and_insert_collection_data(self, collections: List[Dict], db):
-        if not self.__class__.precomputed_collections:
-            self.__class__.precompute_collections(collections)
-
-        collection_inserts = []
-        stamp_inserts = []
-        creator_inserts = []
-
-        for collection in self.__class__.precomputed_collections:
-            if (
-                self.file_hash in collection["file_hashes"]
-                or self.stamp in collection["stamps"]
-                or (self.is_posh and collection["is_posh"])
-            ):
-                collection_inserts.append((collection["collection_id"], collection["name"]))
-                stamp_inserts.append((collection["collection_id"], self.stamp))
-                for creator in collection["creators"]:
-                    creator_inserts.append((collection["collection_id"], creator))
-
-        if collection_inserts:
-            self.insert_into_collections(db, collection_inserts)
-        if stamp_inserts:
-            self.insert_into_collection_stamps(db, stamp_inserts)
-        if creator_inserts:
-            self.ensure_creators_exist(db, creator_inserts)
-            self.insert_into_collection_creators(db, creator_inserts)
-
-    @staticmethod
-    def ensure_creators_exist(db, creator_inserts: List[tuple]):
-        cursor = db.cursor()
-        for _, creator_address in creator_inserts:
-            cursor.execute("SELECT 1 FROM creator WHERE address = %s", (creator_address,))
-            if cursor.fetchone() is None:
-                cursor.execute("INSERT INTO creator (address) VALUES (%s)", (creator_address,))
-        db.commit()
-
-    @staticmethod
-    def insert_into_collections(db, collection_inserts: List[tuple]):
-        query = """
-        INSERT INTO collections (collection_id, collection_name)
-        VALUES (UNHEX(%s), %s)
-        ON DUPLICATE KEY UPDATE collection_name=VALUES(collection_name)
-        """
-        cursor = db.cursor()
-        cursor.executemany(query, collection_inserts)
-        db.commit()
-
-    @staticmethod
-    def insert_into_collection_stamps(db, stamp_inserts: List[tuple]):
-        query = """
-        INSERT INTO collection_stamps (collection_id, stamp)
-        VALUES (UNHEX(%s), %s)
-        ON DUPLICATE KEY UPDATE collection_id=VALUES(collection_id), stamp=VALUES(stamp)
-        """
-        cursor = db.cursor()
-        cursor.executemany(query, stamp_inserts)
-        db.commit()
-
-    @staticmethod
-    def insert_into_collection_creators(db, creator_inserts: List[tuple]):
-        query = """
-        INSERT INTO collection_creators (collection_id, creator_address)
-        VALUES (UNHEX(%s), %s)
-        ON DUPLICATE KEY UPDATE collection_id=VALUES(collection_id), creator_address=VALUES(creator_address)
-        """
-        cursor = db.cursor()
-        cursor.executemany(query, creator_inserts)
-        db.commit()
-
     def is_javascript(self, bytestring_data):
         """
         Determines if the given bytestring data is JavaScript.
@@ -578,3 +490,59 @@ class StampData:
 
         self.update_cpid_and_stamp_url(filename)
         return True
+
+
+class CollectionMatcher:
+    """
+    Matches the stamps of a block to the legacy collections through reverse
+    indexes on file hash and stamp number, built once from the collections.
+    """
+
+    def __init__(self, collections: List[Dict]):
+        self.collections = []  # (collection_id, name, creators)
+        self.by_file_hash: Dict[str, List[int]] = {}
+        self.by_stamp: Dict[int, List[int]] = {}
+        self.posh: List[int] = []
+        for position, collection in enumerate(collections):
+            collection_id = StampData.generate_collection_id(collection["name"])
+            self.collections.append((collection_id, collection["name"], collection.get("creators", [])))
+            for file_hash in collection.get("file_hashes", []):
+                self.by_file_hash.setdefault(file_hash, []).append(position)
+            for stamp in collection.get("stamps", []):
+                self.by_stamp.setdefault(stamp, []).append(position)
+            if collection.get("is_posh", False):
+                self.posh.append(position)
+
+    def match(self, stamps: List[StampData]):
+        """
+        Match the parsed stamps of a block to the collections.
+
+        Args:
+            stamps (list): The StampData of the block.
+
+        Returns:
+            tuple: The (collection_id, name), (collection_id, stamp) and (collection_id, creator) rows of the stamps,
+            collection_id being the md5 digest of the name.
+        """
+        collection_inserts: List[Tuple[bytes, str]] = []
+        stamp_inserts: List[Tuple[bytes, Optional[int]]] = []
+        creator_inserts: List[Tuple[bytes, str]] = []
+
+        for stamp_data in stamps:
+            positions: Set[int] = set()
+            if stamp_data.file_hash is not None:
+                positions.update(self.by_file_hash.get(stamp_data.file_hash, ()))
+            if stamp_data.stamp is not None:
+                positions.update(self.by_stamp.get(stamp_data.stamp, ()))
+            if stamp_data.is_posh:
+                positions.update(self.posh)
+            for position in sorted(positions):
+                collection_id, name, creators = self.collections[position]
+                collection_inserts.append((collection_id, name))
+                stamp_inserts.append((collection_id, stamp_data.stamp))
+                creator_inserts.extend((collection_id, creator) for creator in creators)
+
+        return collection_inserts, stamp_inserts, creator_inserts
+
+
+collection_matcher = CollectionMatcher(LEGACY_COLLECTIONS)
@@ -0,0 +1,131 @@
+"""
+Bounded look-ahead fetching of blocks from the backend.
+
+While `blocks.follow` parses and commits block N, the prefetcher keeps up to
+`config.BLOCK_PREFETCH_DEPTH` of the following blocks fetched and scanned, with
+the outputs of their stamp candidates and of the parents these spend already
+in the prevout cache.
+Blocks are always handed out in order, so the consumer keeps its per-block
+commit semantics.
+"""
+
+import collections
+import concurrent.futures
+import logging
+from collections import namedtuple
+
+import config
+import index_core.backend as backend
+import index_core.util as util
+from index_core.prefilter import scan_block
+from index_core.prevouts import prevout_cache
+
+logger = logging.getLogger(__name__)
+
+PrefetchedBlock = namedtuple(
+    "PrefetchedBlock",
+    [
+        "block_index",
+        "block_hash",
+        "scanned_block",
+        "txhash_list",
+    ],
+)
+
+
+def fetch_block(block_index):
+    """
+    Fetch and scan a block from the backend.
+
+    Args:
+        block_index (int): The height of the block.
+
+    Returns:
+        PrefetchedBlock: The block hash, scanned block and txid list.
+    """
+    block_hash = backend.getblockhash(block_index)
+    scanned_block = scan_block(backend.getrawblock(block_hash))
+    txhash_list = [scanned_tx.tx_hash for scanned_tx in scanned_block.transactions]
+    candidates = [scanned_tx for scanned_tx in scanned_block.transactions[1:] if scanned_tx.is_multisig]
+    prevout_cache.add_block(scanned_block, [scanned_tx.tx_hash for scanned_tx in candidates])
+    fetch_parent_outputs(candidates)
+    return PrefetchedBlock(block_index, block_hash, scanned_block, txhash_list)
+
+
+def fetch_parent_outputs(candidates):
+    """
+    Load the parents from earlier blocks of the multisig candidates of a block into
+    the prevout cache, with a single `getrawtransaction_batch` call. The parents of
+    the CP issuances, which are only known once the block is parsed, are left to
+    `blocks.load_parent_outputs`.
+
+    Args:
+        candidates (list): The ScannedTx of the multisig candidates of the block.
+
+    Returns:
+        int: The number of parent transactions fetched from the backend.
+    """
+    parent_txids = {
+        util.ib2h(scanned_tx.prevout[0])
+        for scanned_tx in candidates
+        if scanned_tx.prevout is not None and scanned_tx.prevout not in prevout_cache
+    }
+    if not parent_txids:
+        return 0
+    for tx_hex in backend.getrawtransaction_batch(list(parent_txids)).values():
+        prevout_cache.add_ctx(backend.deserialize(tx_hex))
+    return len(parent_txids)
+
+
+class BlockPrefetcher:
+    """Fetches up to `depth` blocks ahead of the consumer on a small thread pool."""
+
+    def __init__(self, depth=config.BLOCK_PREFETCH_DEPTH):
+        if int(depth) < 1:
+            raise AttributeError("depth < 1 or not a number")
+        self.depth = depth
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=depth, thread_name_prefix="block_prefetch")
+        self.pending: collections.deque = collections.deque()
+        self.next_index = None
+
+    def get(self, block_index, last_index):
+        """
+        Return the block at `block_index`, and schedule the following blocks up
+        to `last_index` while the caller works on it. Asking for a block other
+        than the next expected one (rollback, unparsed previous block) discards
+        everything in flight and restarts from `block_index`.
+
+        Args:
+            block_index (int): The height of the block to return.
+            last_index (int): The highest block height that may be prefetched.
+
+        Returns:
+            PrefetchedBlock: The fetched block.
+        """
+        if not self.pending or self.pending[0][0] != block_index:
+            if self.pending:
+                logger.info(f"Block prefetch out of order at {block_index}, restarting.")
+            self.reset()
+            self.next_index = block_index
+        self._fill(max(last_index, block_index))
+        _, future = self.pending.popleft()
+        block = future.result()
+        self._fill(last_index)
+        return block
+
+    def _fill(self, last_index):
+        while len(self.pending) < self.depth and self.next_index <= last_index:
+            future = self.executor.submit(fetch_block, self.next_index)
+            self.pending.append((self.next_index, future))
+            self.next_index += 1
+
+    def reset(self):
+        """Drop all queued and in-flight blocks."""
+        for _, future in self.pending:
+            future.cancel()
+        self.pending.clear()
+        self.next_index = None
+
+    def shutdown(self):
+        self.reset()
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,190 @@
+"""
+Byte level scanner for raw blocks.
+
+Walks the serialized transactions of a block without building CTransaction
+objects, computes their txids and flags the ones that can carry stamp data.
+Without a CP issuance, `get_tx_info` only finds data behind a bare 1-of-3
+OP_CHECKMULTISIG output (OP_1 <push> <push> <push> OP_3 OP_CHECKMULTISIG), so
+every other transaction can skip the full decode path.
+"""
+
+import hashlib
+import logging
+from collections import namedtuple
+
+import bitcoin as bitcoinlib
+from bitcoin.core import CBlockHeader
+
+logger = logging.getLogger(__name__)
+
+BLOCK_HEADER_SIZE = 80
+
+ScannedTx = namedtuple(
+    "ScannedTx",
+    [
+        "tx_hash",
+        "start",
+        "end",
+        "is_multisig",
+        "is_p2wsh",
+        "prevout",
+    ],
+)
+
+ScannedBlock = namedtuple("ScannedBlock", ["header", "raw_block", "transactions"])
+
+PrefilterStats = namedtuple("PrefilterStats", ["total", "candidates", "multisig", "p2wsh", "issuances"])
+
+
+def _read_varint(buf, offset):
+    prefix = buf[offset]
+    if prefix < 0xFD:
+        return prefix, offset + 1
+    if prefix == 0xFD:
+        return int.from_bytes(buf[offset + 1 : offset + 3], "little"), offset + 3
+    if prefix == 0xFE:
+        return int.from_bytes(buf[offset + 1 : offset + 5], "little"), offset + 5
+    return int.from_bytes(buf[offset + 1 : offset + 9], "little"), offset + 9
+
+
+def scan_transaction(buf, offset):
+    """
+    Scan one serialized transaction.
+
+    Args:
+        buf (memoryview): The raw block.
+        offset (int): The position of the transaction in the block.
+
+    Returns:
+        tuple: The ScannedTx and the position right after the transaction.
+    """
+    start = offset
+    offset += 4  # nVersion
+    is_segwit = buf[offset] == 0 and buf[offset + 1] != 0  # marker and flag bytes
+    if is_segwit:
+        offset += 2
+    body_start = offset
+
+    num_inputs, offset = _read_varint(buf, offset)
+    prevout = None
+    for i in range(num_inputs):
+        if i == 0:
+            prevout = (bytes(buf[offset : offset + 32]), int.from_bytes(buf[offset + 32 : offset + 36], "little"))
+        script_len, offset = _read_varint(buf, offset + 36)
+        offset += script_len + 4  # scriptSig and nSequence
+
+    num_outputs, offset = _read_varint(buf, offset)
+    is_multisig, is_p2wsh = False, False
+    for _ in range(num_outputs):
+        script_len, offset = _read_varint(buf, offset + 8)  # skip nValue
+        if (
+            script_len > 3
+            and buf[offset] == 0x51
+            and buf[offset + script_len - 2] == 0x53
+            and buf[offset + script_len - 1] == 0xAE
+        ):
+            is_multisig = True
+        elif script_len == 34 and buf[offset] == 0x00 and buf[offset + 1] == 0x20:
+            is_p2wsh = True
+        offset += script_len
+    body_end = offset
+
+    if is_segwit:
+        for _ in range(num_inputs):
+            num_items, offset = _read_varint(buf, offset)
+            for _ in range(num_items):
+                item_len, offset = _read_varint(buf, offset)
+                offset += item_len
+    offset += 4  # nLockTime
+
+    # the txid excludes the marker, flag and witness data
+    sha = hashlib.sha256()
+    if is_segwit:
+        sha.update(buf[start : start + 4])
+        sha.update(buf[body_start:body_end])
+        sha.update(buf[offset - 4 : offset])
+    else:
+        sha.update(buf[start:offset])
+    tx_hash = bitcoinlib.core.b2lx(hashlib.sha256(sha.digest()).digest())
+
+    return ScannedTx(tx_hash, start, offset, is_multisig, is_p2wsh, prevout), offset
+
+
+def iter_outputs(raw_tx):
+    """
+    Yield the outputs of a serialized transaction.
+
+    Args:
+        raw_tx (bytes | memoryview): The serialized transaction.
+
+    Yields:
+        tuple: The (n, scriptPubKey bytes) of every output.
+    """
+    buf = memoryview(raw_tx)
+    offset = 4  # nVersion
+    if buf[offset] == 0 and buf[offset + 1] != 0:  # marker and flag bytes
+        offset += 2
+    num_inputs, offset = _read_varint(buf, offset)
+    for _ in range(num_inputs):
+        script_len, offset = _read_varint(buf, offset + 36)
+        offset += script_len + 4
+    num_outputs, offset = _read_varint(buf, offset)
+    for n in range(num_outputs):
+        script_len, offset = _read_varint(buf, offset + 8)
+        yield n, bytes(buf[offset : offset + script_len])
+        offset += script_len
+
+
+def scan_block(raw_block):
+    """
+    Scan all transactions of a raw block.
+
+    Args:
+        raw_block (bytes): The serialized block.
+
+    Returns:
+        ScannedBlock: The decoded header, the raw block and the ScannedTx of every transaction in block order.
+    """
+    buf = memoryview(raw_block)
+    header = CBlockHeader.deserialize(bytes(buf[:BLOCK_HEADER_SIZE]))
+    num_txs, offset = _read_varint(buf, BLOCK_HEADER_SIZE)
+    transactions = []
+    for _ in range(num_txs):
+        scanned_tx, offset = scan_transaction(buf, offset)
+        transactions.append(scanned_tx)
+    if offset != len(buf):
+        raise ValueError(f"block has {len(buf) - offset} trailing bytes after {num_txs} transactions")
+    return ScannedBlock(header, raw_block, transactions)
+
+
+def select_candidates(scanned_block, issuance_tx_hashes):
+    """
+    Pick the transactions that need the full `get_tx_info` path: bare 1-of-3
+    multisig outputs, or a matching CP issuance (which covers P2WSH stamps, those
+    are only decoded for issuances). The coinbase is never a candidate.
+
+    Args:
+        scanned_block (ScannedBlock): The scanned block.
+        issuance_tx_hashes (set): The tx hashes of the CP stamp issuances in the block.
+
+    Returns:
+        tuple: A dict of candidate txs keyed by tx hash, as memoryview slices of the raw block,
+            and the PrefilterStats of the block.
+    """
+    buf = memoryview(scanned_block.raw_block)
+    raw_transactions = {}
+    multisig, p2wsh, issuances = 0, 0, 0
+    for scanned_tx in scanned_block.transactions[1:]:
+        multisig += scanned_tx.is_multisig
+        p2wsh += scanned_tx.is_p2wsh
+        is_issuance = scanned_tx.tx_hash in issuance_tx_hashes
+        issuances += is_issuance
+        if scanned_tx.is_multisig or is_issuance:
+            raw_transactions[scanned_tx.tx_hash] = buf[scanned_tx.start : scanned_tx.end]
+    stats = PrefilterStats(len(scanned_block.transactions), len(raw_transactions), multisig, p2wsh, issuances)
+    logger.debug(
+        "Prefilter: {} of {} txs are candidates (multisig: {}, p2wsh: {}, issuances: {})".format(
+            stats.candidates, stats.total, stats.multisig, stats.p2wsh, stats.issuances
+        )
+    )
+    return raw_transactions, stats
@@ -0,0 +1,136 @@
+"""
+Cache of previous outputs for source address resolution.
+
+The source of a stamp transaction is the address of the output spent by its
+first input. Resolving it used to mean fetching and deserializing the whole
+parent transaction from the backend. The parents are mostly earlier
+transactions of the same block or outputs of earlier stamp transactions
+(chained mints), so the outputs of those are cached here, keyed by outpoint.
+A txid commits to its outputs, so entries never go stale, not even on reorgs.
+"""
+
+import logging
+import os
+import threading
+
+import bitcoin as bitcoinlib
+import msgpack
+
+import config
+import index_core.util as util
+from index_core.prefilter import iter_outputs
+
+logger = logging.getLogger(__name__)
+
+
+def _outpoint_key(tx_hash, n):
+    return tx_hash + n.to_bytes(4, "little")
+
+
+class PrevoutCache:
+    """Bounded outpoint -> [scriptPubKey, address] cache, optionally saved to a msgpack file."""
+
+    def __init__(self, size=config.PREVOUT_CACHE_SIZE, path=config.PREVOUT_CACHE_FILE):
+        self.cache = util.DictCache(size=size)
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.save_lock = threading.Lock()
+
+    def get(self, prevout):
+        """
+        Look up an outpoint.
+
+        Args:
+            prevout (tuple): The (hash, n) of the output, hash in internal byte order.
+
+        Returns:
+            list: The [scriptPubKey, address] of the output, address being None until
+                it's set with `set_address`, or None if the output isn't cached.
+        """
+        key = _outpoint_key(*prevout)
+        with self.cache.lock:
+            entry = self.cache.dict.get(key)
+            if entry is not None:
+                self.cache.dict.move_to_end(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def __contains__(self, prevout):
+        return _outpoint_key(*prevout) in self.cache
+
+    def set_address(self, entry, address):
+        entry[1] = address
+
+    def add_transaction(self, tx_hash, raw_tx):
+        """
+        Cache all outputs of a transaction.
+
+        Args:
+            tx_hash (bytes): The txid in internal byte order.
+            raw_tx (bytes | memoryview): The serialized transaction.
+        """
+        for n, script_pubkey in iter_outputs(raw_tx):
+            self.cache[_outpoint_key(tx_hash, n)] = [script_pubkey, None]
+
+    def add_ctx(self, ctx):
+        """Cache all outputs of a deserialized transaction."""
+        tx_hash = ctx.GetTxid()
+        for n, vout in enumerate(ctx.vout):
+            self.cache[_outpoint_key(tx_hash, n)] = [bytes(vout.scriptPubKey), None]
+
+    def add_block(self, scanned_block, candidate_hashes):
+        """
+        Cache the outputs of the candidates of a block, which later stamp transactions
+        often spend, and of the in-block parents of those candidates.
+
+        Args:
+            scanned_block (ScannedBlock): The scanned block.
+            candidate_hashes (set): The tx hashes of the stamp candidates in the block.
+        """
+        buf = memoryview(scanned_block.raw_block)
+        block_txs = {scanned_tx.tx_hash: scanned_tx for scanned_tx in scanned_block.transactions}
+        wanted = set(candidate_hashes)
+        for tx_hash in candidate_hashes:
+            prevout = block_txs[tx_hash].prevout
+            wanted.add(bitcoinlib.core.b2lx(prevout[0]))
+        for tx_hash in wanted:
+            scanned_tx = block_txs.get(tx_hash)
+            if scanned_tx is not None:
+                self.add_transaction(bitcoinlib.core.lx(tx_hash), buf[scanned_tx.start : scanned_tx.end])
+
+    def load(self):
+        """Load the entries saved by `save`, if the cache is file backed and the file exists."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "rb") as f:
+                entries = msgpack.unpackb(f.read(), raw=False)
+        except (OSError, ValueError, msgpack.UnpackException) as e:
+            logger.warning(f"Could not load the prevout cache from {self.path}: {e}")
+            return
+        for key, script_pubkey, address in entries[-self.cache.size :]:
+            self.cache[key] = [script_pubkey, address]
+        logger.info(f"Loaded {len(self.cache)} cached prevouts from {self.path}")
+
+    def save(self):
+        """Write the cache to its file, oldest entries first, replacing the previous file atomically."""
+        if not self.path:
+            return
+        with self.cache.lock:
+            entries = [[key, entry[0], entry[1]] for key, entry in self.cache.dict.items()]
+        with self.save_lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(msgpack.packb(entries, use_bin_type=True))
+            os.replace(tmp_path, self.path)
+        logger.debug(f"Saved {len(entries)} cached prevouts to {self.path}")
+
+    def stats(self):
+        return {"size": len(self.cache), "hits": self.hits, "misses": self.misses}
+
+
+prevout_cache = PrevoutCache()
@@ -0,0 +1,172 @@
+"""
+Compact index of the objects in the S3 bucket.
+
+Uploads are skipped for files already in the bucket with the same md5, so the
+key and md5 of every stamp file are kept in memory. Stamp files are named
+`{tx_hash}.{suffix}`, so their entries are packed into fixed width records of
+the 32 raw bytes of the tx_hash, a suffix number and the 16 raw bytes of the
+md5, kept in one sorted bytes buffer searched by bisection. Changes go to a
+small dict merged into the buffer once it grows. Keys and ETags that don't fit
+the record, such as other file names or multipart ETags, are kept as strings.
+"""
+
+KEY_SIZE = 33  # tx_hash + suffix number
+RECORD_SIZE = KEY_SIZE + 16
+
+
+class S3ObjectIndex:
+    """S3 key -> hex md5 lookup, answering `get` like the dict it replaces."""
+
+    def __init__(self, prefix="", merge_size=65536):
+        self.prefix = prefix
+        self.merge_size = merge_size
+        self.suffixes = []
+        self.suffix_numbers = {}
+        self.records = b""  # sorted records
+        self.changes = {}  # record key -> md5 bytes, newer than `records`
+        self.other = {}  # key -> md5 of the entries that aren't records
+
+    @classmethod
+    def from_items(cls, items, prefix="", merge_size=65536):
+        """
+        Build an index in one pass.
+
+        Args:
+            items (iterable): The (key, md5) of the objects, such as a streaming cursor.
+            prefix (str): The key prefix of the stamp files.
+            merge_size (int): The changes kept apart before they are merged into the records.
+
+        Returns:
+            S3ObjectIndex: The index.
+        """
+        index = cls(prefix, merge_size)
+        records = {}
+        for key, md5 in items:
+            record = index._pack(key, md5)
+            if record is None:
+                index.other[key] = md5
+                records.pop(index._record_key(key), None)
+            else:
+                index.other.pop(key, None)
+                records[record[0]] = record[1]
+        index.records = b"".join(key + md5 for key, md5 in sorted(records.items()))
+        return index
+
+    def _record_key(self, key, add_suffix=False):
+        """Return the record key of `key`, or None if it isn't the key of a stamp file."""
+        if not key.startswith(self.prefix):
+            return None
+        tx_hash, dot, suffix = key[len(self.prefix) :].partition(".")
+        if len(tx_hash) != 64 or not dot or tx_hash != tx_hash.lower():
+            return None
+        number = self.suffix_numbers.get(suffix)
+        if number is None:
+            if not add_suffix or len(self.suffixes) == 256:
+                return None
+            number = self.suffix_numbers[suffix] = len(self.suffixes)
+            self.suffixes.append(suffix)
+        try:
+            return bytes.fromhex(tx_hash) + bytes((number,))
+        except ValueError:
+            return None
+
+    def _pack(self, key, md5):
+        """Return the record key and md5 bytes of an entry, or None if it doesn't fit a record."""
+        if len(md5) != 32 or md5 != md5.lower():
+            return None
+        record_key = self._record_key(key, add_suffix=True)
+        if record_key is None:
+            return None
+        try:
+            return record_key, bytes.fromhex(md5)
+        except ValueError:
+            return None
+
+    def _find(self, record_key):
+        """Return the offset of the record of `record_key` in the records, or None."""
+        records = self.records
+        lo, hi = 0, len(records) // RECORD_SIZE
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = mid * RECORD_SIZE
+            found = records[start : start + KEY_SIZE]
+            if found < record_key:
+                lo = mid + 1
+            elif found > record_key:
+                hi = mid
+            else:
+                return start
+        return None
+
+    def _search(self, record_key):
+        start = self._find(record_key)
+        if start is None:
+            return None
+        return self.records[start + KEY_SIZE : start + RECORD_SIZE]
+
+    def get(self, key, default=None):
+        """Return the hex md5 of the object at `key`, or `default` if there is none."""
+        if key in self.other:
+            return self.other[key]
+        record_key = self._record_key(key)
+        if record_key is None:
+            return default
+        md5 = self.changes.get(record_key)
+        if md5 is None:
+            md5 = self._search(record_key)
+        return md5.hex() if md5 is not None else default
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __setitem__(self, key, md5):
+        record = self._pack(key, md5)
+        if record is None:
+            self.other[key] = md5
+            self._discard_record(key)
+            return
+        self.other.pop(key, None)
+        self.changes[record[0]] = record[1]
+        if len(self.changes) >= self.merge_size:
+            self.merge()
+
+    def _discard_record(self, key):
+        """Drop the record of `key`, whose md5 is now kept as a string."""
+        record_key = self._record_key(key)
+        if record_key is None:
+            return
+        self.changes.pop(record_key, None)
+        start = self._find(record_key)
+        if start is not None:
+            self.records = self.records[:start] + self.records[start + RECORD_SIZE :]
+
+    def merge(self):
+        """Merge the changes into the sorted records."""
+        if not self.changes:
+            return
+        records = self.records
+        merged = []
+        start = 0
+        for record_key, md5 in sorted(self.changes.items()):
+            # bisect for the position of the change among the records left
+            lo, hi = start // RECORD_SIZE, len(records) // RECORD_SIZE
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if records[mid * RECORD_SIZE : mid * RECORD_SIZE + KEY_SIZE] < record_key:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            position = lo * RECORD_SIZE
+            merged.append(records[start:position])
+            merged.append(record_key + md5)
+            start = position
+            if records[position : position + KEY_SIZE] == record_key:
+                start += RECORD_SIZE  # replaced
+        merged.append(records[start:])
+        self.records = b"".join(merged)
+        self.changes = {}
+
+    def __len__(self):
+        """The number of entries."""
+        self.merge()
+        return len(self.records) // RECORD_SIZE + len(self.other)
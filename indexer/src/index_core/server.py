@@ -351,7 +351,6 @@ def start_all(db: Connection) -> None:
     blocks.follow(db)
 
 
-# TODO
 def reparse(db, block_index=None, quiet=True):
-    connect_to_backend()
+    # the stored transactions are reparsed, the backend isn't needed
     blocks.reparse(db, block_index=block_index, quiet=quiet)
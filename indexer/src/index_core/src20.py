@@ -19,7 +19,14 @@ from config import (
     SRC_VALIDATION_SECRET_API2,
     TICK_PATTERN_SET,
 )
-from index_core.database import TOTAL_MINTED_CACHE, get_src20_deploy, get_srcbackground_data, get_total_src20_minted_from_db
+from index_core.balance_engine import balance_engine
+from index_core.database import (
+    TOTAL_MINTED_CACHE,
+    get_src20_deploy,
+    get_srcbackground_data,
+    get_total_src20_minted_from_db,
+    insert_undo_entries,
+)
 from index_core.util import decode_unicode_escapes, escape_non_ascii_characters
 
 D = Decimal
@@ -40,6 +47,89 @@ class Src20Dict(TypedDict, total=False):
     tick_hash: Optional[str]
 
 
+class Src20BlockLedger(list):
+    """
+    The SRC-20 operations processed in the current block, in processing order, as
+    they are hashed and inserted at the end of the block. `append` and `extend`
+    keep them indexed by (tick, tick_hash, address) and by tick for the first valid
+    deploy and the latest mint total, so the running state lookups done while
+    processing the block don't rescan it. Entries must not be modified once added.
+    """
+
+    def __init__(self, src20_dicts=()):
+        super().__init__()
+        self.positions: Dict[tuple, List[int]] = {}
+        self.deploys: Dict[str, tuple] = {}
+        self.mint_totals: Dict[str, D] = {}
+        self.extend(src20_dicts)
+
+    def append(self, src20_dict):
+        self._index(len(self), src20_dict)
+        super().append(src20_dict)
+
+    def extend(self, src20_dicts):
+        for src20_dict in src20_dicts:
+            self.append(src20_dict)
+
+    def _index(self, position, src20_dict):
+        tick = src20_dict.get("tick")
+        if src20_dict.get("op") == "MINT" and "total_minted" in src20_dict:
+            self.mint_totals[tick] = src20_dict["total_minted"]
+        if src20_dict.get("valid") == 1:
+            if src20_dict.get("op") == "DEPLOY" and tick not in self.deploys:
+                self.deploys[tick] = (src20_dict.get("lim"), src20_dict.get("max"), src20_dict.get("dec"))
+            for address in {src20_dict.get("creator"), src20_dict.get("destination")}:
+                self.positions.setdefault((tick, src20_dict.get("tick_hash"), address), []).append(position)
+
+    def get_deploy(self, tick):
+        """Return the (lim, max, dec) of the first valid deploy of `tick` in the block, or (None, None, None)."""
+        return self.deploys.get(tick, (None, None, None))
+
+    def get_mint_total(self, tick):
+        """Return the total_minted of the latest mint of `tick` in the block, or 0."""
+        return self.mint_totals.get(tick, 0)
+
+    def get_running_balances(self, tick, tick_hash, addresses):
+        """
+        Find the latest balances of `addresses` set by valid operations in the block.
+        The entries involving the addresses are visited newest first, exactly like
+        the former scan of the whole block, including its removal of found
+        addresses from `addresses` while iterating over it.
+
+        Args:
+            tick (str): The tick.
+            tick_hash (str): The tick hash.
+            addresses (list): The addresses, found ones are removed from it.
+
+        Returns:
+            list: The (address, total_balance) of every address found.
+        """
+        positions = set()
+        for address in addresses:
+            positions.update(self.positions.get((tick, tick_hash, address), ()))
+        found = []
+        for position in sorted(positions, reverse=True):
+            prior_tx = self[position]
+            for address in addresses:
+                total_balance = None
+                if prior_tx["creator"] == address and "total_balance_creator" in prior_tx:
+                    total_balance = prior_tx["total_balance_creator"]
+                elif prior_tx["destination"] == address and "total_balance_destination" in prior_tx:
+                    total_balance = prior_tx["total_balance_destination"]
+                if total_balance is not None:
+                    found.append((address, total_balance))
+                    addresses.remove(address)
+            if not addresses:
+                break
+        return found
+
+
+def as_block_ledger(src20_processed_in_block):
+    if isinstance(src20_processed_in_block, Src20BlockLedger):
+        return src20_processed_in_block
+    return Src20BlockLedger(src20_processed_in_block)
+
+
 class Src20Validator:
     @property
     def errors(self):
@@ -659,18 +749,13 @@ def get_running_mint_total(db, src20_processed_in_block, tick):
 
     Args:
         db (Database): The database object.
-        src20_processed_in_block (list): The list of processed SRC20 items in a block.
+        src20_processed_in_block (Src20BlockLedger): The processed SRC20 items in a block.
         tick (int): The tick value.
 
     Returns:
         Decimal: The running mint total for the given tick.
     """
-    total_minted = 0
-    if len(src20_processed_in_block) > 0:
-        for item in reversed(src20_processed_in_block):
-            if item["tick"] == tick and item["op"] == "MINT" and "total_minted" in item:
-                total_minted = item["total_minted"]
-                break
+    total_minted = as_block_ledger(src20_processed_in_block).get_mint_total(tick)
     if total_minted == 0:
         total_minted = get_total_src20_minted_from_db(db, tick)
 
@@ -689,7 +774,7 @@ def get_running_user_balances(db, tick, tick_hash, addresses, src20_processed_in
     - tick (int): The tick value.
     - tick_hash (str): The tick hash value.
     - addresses (list or str): The list or string of addresses to calculate the balances for.
-    - src20_processed_in_block (list): The list of already processed src20 transactions in the block.
+    - src20_processed_in_block (Src20BlockLedger): The already processed src20 transactions in the block.
 
     Returns:
     - list: A list of namedtuples containing the tick, address, and total balance for each address.
@@ -704,54 +789,28 @@ def get_running_user_balances(db, tick, tick_hash, addresses, src20_processed_in
 
     balances = []
 
-    if any(item["tick"] == tick for item in src20_processed_in_block):
-        try:
-            for prior_tx in reversed(
-                src20_processed_in_block
-            ):  # if there is a total-balance in a trx in the block with the same address, tick, and tick_hash, use that value for total_balance_x
-                if prior_tx.get("valid") == 1:  # Check if the dict has a valid key with a value of 1
-                    for address in addresses:
-                        total_balance = None
-                        locked_balance = None
-                        if (
-                            prior_tx["creator"] == address
-                            and prior_tx["tick"] == tick
-                            and prior_tx["tick_hash"] == tick_hash
-                            and "total_balance_creator"
-                            in prior_tx  # this gets added to the tuple which will be returned for the address and later added to src20_valid.??
-                        ):
-                            if "total_balance_creator" in prior_tx:
-                                total_balance = prior_tx["total_balance_creator"]
-
-                        elif (
-                            prior_tx["destination"] == address
-                            and prior_tx["tick"] == tick
-                            and prior_tx["tick_hash"] == tick_hash
-                            and "total_balance_destination" in prior_tx
-                        ):
-                            if "total_balance_destination" in prior_tx:
-                                total_balance = prior_tx["total_balance_destination"]
-                        if (
-                            total_balance is not None
-                        ):  # we got this address balance from the db in a prior loop and it exists in the src20_valid_dict so we can use it
-                            balances.append(BalanceCurrent(tick, address, D(total_balance), locked_balance))
-                            addresses.remove(address)
-        except Exception as e:
-            logger.error(f"An exception in user balance: {e}")
-            raise
+    try:
+        for address, total_balance in as_block_ledger(src20_processed_in_block).get_running_balances(
+            tick, tick_hash, addresses
+        ):
+            balances.append(BalanceCurrent(tick, address, D(total_balance), None))
+    except Exception as e:
+        logger.error(f"An exception in user balance: {e}")
+        raise
 
     if addresses:
         try:
-            total_balance_tuple = get_total_user_balance_from_balances_db(db, tick, tick_hash, addresses)
+            if balance_engine.enabled:
+                total_balance_tuple = balance_engine.get_balances(db, tick, tick_hash, addresses)
+            else:
+                total_balance_tuple = get_total_user_balance_from_balances_db(db, tick, tick_hash, addresses)
+            db_balances = {}
+            for balance in total_balance_tuple:
+                db_balances.setdefault(balance.address, balance)
             for address in addresses:
-                total_balance = next(
-                    (balance.total_balance for balance in total_balance_tuple if balance.address == address),
-                    0,
-                )
-                locked_balance = next(
-                    (balance.locked_amt for balance in total_balance_tuple if balance.address == address),
-                    0,
-                )  # NOTE: this is not fully implemented
+                db_balance = db_balances.get(address)
+                total_balance = db_balance.total_balance if db_balance is not None else 0
+                locked_balance = db_balance.locked_amt if db_balance is not None else 0  # NOTE: this is not fully implemented
                 # if total_balance is negative throw an exception
                 if total_balance < 0:
                     raise Exception(f"Negative balance for address {address} in tick {tick}")
@@ -930,6 +989,24 @@ def get_tick_holders_from_balances(db, tick):
 
 def update_src20_balances(db, block_index, block_time, processed_src20_in_block):
     balance_updates: List[Dict[str, Union[str, D]]] = []
+    balance_index: Dict[tuple, Dict[str, Union[str, D]]] = {}
+
+    def add_balance_change(src20_dict, address, field):
+        key = (src20_dict["tick"], src20_dict["tick_hash"], address)
+        balance_dict = balance_index.get(key)
+        if balance_dict is None:
+            balance_dict = {
+                "tick": src20_dict["tick"],
+                "tick_hash": src20_dict["tick_hash"],
+                "address": address,
+                "credit": D(0),
+                "debit": D(0),
+            }
+            balance_dict[field] = D(src20_dict["amt"])
+            balance_index[key] = balance_dict
+            balance_updates.append(balance_dict)
+        else:
+            balance_dict[field] += D(src20_dict["amt"])
 
     for src20_dict in processed_src20_in_block:
         if src20_dict.get("valid") == 1:
@@ -937,74 +1014,13 @@ def update_src20_balances(db, block_index, block_time, processed_src20_in_block)
             try:
                 if src20_dict["op"] == "MINT":
                     # Credit to destination (creator can be a mint service)
-                    balance_dict = next(
-                        (
-                            item
-                            for item in balance_updates
-                            if item["tick"] == src20_dict["tick"]
-                            and item["tick_hash"] == src20_dict["tick_hash"]
-                            and item["address"] == src20_dict["destination"]
-                        ),
-                        None,
-                    )
-                    if balance_dict is None:
-                        balance_dict = {
-                            "tick": src20_dict["tick"],
-                            "tick_hash": src20_dict["tick_hash"],
-                            "address": src20_dict["destination"],
-                            "credit": D(src20_dict["amt"]),
-                            "debit": D(0),
-                        }
-                        balance_updates.append(balance_dict)
-                    else:
-                        balance_dict["credit"] += D(src20_dict["amt"])
+                    add_balance_change(src20_dict, src20_dict["destination"], "credit")
 
                 elif src20_dict["op"] == "TRANSFER":
                     # Debit from creator
-                    balance_dict = next(
-                        (
-                            item
-                            for item in balance_updates
-                            if item["tick"] == src20_dict["tick"]
-                            and item["tick_hash"] == src20_dict["tick_hash"]
-                            and item["address"] == src20_dict["creator"]
-                        ),
-                        None,
-                    )
-                    if balance_dict is None:
-                        balance_dict = {
-                            "tick": src20_dict["tick"],
-                            "tick_hash": src20_dict["tick_hash"],
-                            "address": src20_dict["creator"],
-                            "credit": D(0),
-                            "debit": D(src20_dict["amt"]),
-                        }
-                        balance_updates.append(balance_dict)
-                    else:
-                        balance_dict["debit"] += D(src20_dict["amt"])
-
+                    add_balance_change(src20_dict, src20_dict["creator"], "debit")
                     # Credit to destination
-                    balance_dict = next(
-                        (
-                            item
-                            for item in balance_updates
-                            if item["tick"] == src20_dict["tick"]
-                            and item["tick_hash"] == src20_dict["tick_hash"]
-                            and item["address"] == src20_dict["destination"]
-                        ),
-                        None,
-                    )
-                    if balance_dict is None:
-                        balance_dict = {
-                            "tick": src20_dict["tick"],
-                            "tick_hash": src20_dict["tick_hash"],
-                            "address": src20_dict["destination"],
-                            "credit": D(src20_dict["amt"]),
-                            "debit": D(0),
-                        }
-                        balance_updates.append(balance_dict)
-                    else:
-                        balance_dict["credit"] += D(src20_dict["amt"])
+                    add_balance_change(src20_dict, src20_dict["destination"], "credit")
 
             except Exception as e:
                 logger.error(f"Error updating SRC20 balances: {e}")
@@ -1016,48 +1032,75 @@ def update_src20_balances(db, block_index, block_time, processed_src20_in_block)
 
 
 def update_balance_table(db, balance_updates, block_index, block_time):
-    """update the balances table with the balance_updates list"""
-    cursor = db.cursor()
-
+    """update the balances table with the balance_updates list, in a single upsert"""
+    if not balance_updates:
+        return
     for balance_dict in balance_updates:
-        try:
-            net_change = balance_dict.get("credit", 0) - balance_dict.get("debit", 0)
-            balance_dict["net_change"] = net_change
-            id_field = balance_dict["tick"] + "_" + balance_dict["address"]
-
-            cursor.execute(f"SELECT amt FROM {SRC20_BALANCES_TABLE} WHERE id = %s", (id_field,))  # nosec
-            result = cursor.fetchone()
-            if result is not None:
-                balance_dict["original_amt"] = result[0]
-            else:
-                balance_dict["original_amt"] = 0
-
+        balance_dict["net_change"] = balance_dict.get("credit", 0) - balance_dict.get("debit", 0)
+
+    ids = [balance_dict["tick"] + "_" + balance_dict["address"] for balance_dict in balance_updates]
+    # the id column compares case insensitively
+    previous_rows = {}
+    if balance_engine.enabled:
+        for balance_dict, id_field in zip(balance_updates, ids):
+            row = balance_engine.get_row(db, balance_dict["tick"], balance_dict["address"])
+            if row is not None:
+                previous_rows[id_field.lower()] = (row[0], row[1], row[2], row[3], row[5], row[6])
+    else:
+        with db.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT id, tick, tick_hash, address, amt, last_update, UNIX_TIMESTAMP(block_time)
+                FROM {SRC20_BALANCES_TABLE} WHERE id IN %s
+                """,  # nosec
+                (ids,),
+            )
+            previous_rows = {row[0].lower(): tuple(row[1:]) for row in cursor.fetchall()}
+
+    undo_entries = []
+    for balance_dict, id_field in zip(balance_updates, ids):
+        previous_row = previous_rows.get(id_field.lower())
+        if previous_row is None:
+            # created by the block, undone by deleting it
+            previous_row = (balance_dict["tick"], balance_dict["tick_hash"], balance_dict["address"], None, None, None)
+        balance_dict["original_amt"] = previous_row[3] if previous_row[3] is not None else 0
+        undo_entries.append((SRC20_BALANCES_TABLE, id_field) + tuple(previous_row))
+
+    values = []
+    for balance_dict in balance_updates:
+        values.extend(
+            (
+                balance_dict["tick"] + "_" + balance_dict["address"],
+                balance_dict["address"],
+                balance_dict["tick"],
+                balance_dict["net_change"],
+                block_index,
+                block_time,
+                "SRC-20",
+                balance_dict["tick_hash"],
+            )
+        )
+    placeholders = ", ".join(["(%s, %s, %s, %s, %s, FROM_UNIXTIME(%s), %s, %s)"] * len(balance_updates))
+    try:
+        with db.cursor() as cursor:
+            insert_undo_entries(cursor, block_index, undo_entries)
             cursor.execute(
-                """
+                f"""
                 INSERT INTO balances
                 (id, address, tick, amt, last_update, block_time, p, tick_hash)
-                VALUES (%s, %s, %s, %s, %s, FROM_UNIXTIME(%s), %s, %s)
+                VALUES {placeholders}
                 ON DUPLICATE KEY UPDATE
                     amt = amt + VALUES(amt),
                     last_update = VALUES(last_update)
-            """,
-                (
-                    id_field,
-                    balance_dict["address"],
-                    balance_dict["tick"],
-                    net_change,
-                    block_index,
-                    block_time,
-                    "SRC-20",
-                    balance_dict["tick_hash"],
-                ),
+            """,  # nosec
+                values,
             )
+    except Exception as e:
+        logger.error("Error updating balances table:", e)
+        raise e
 
-        except Exception as e:
-            logger.error("Error updating balances table:", e)
-            raise e
-
-    cursor.close()
+    if balance_engine.enabled:
+        balance_engine.apply(balance_updates, block_index, block_time)
     return
 
 
@@ -1093,18 +1136,28 @@ def process_balance_updates(balance_updates):
     return valid_src20_str
 
 
-def clear_zero_balances(db):
+def clear_zero_balances(db, block_index=None):
     """
     Deletes all balances with an amount of 0 from the database.
 
     Args:
         db: The database connection object.
+        block_index (int, optional): The block being parsed, the deleted rows are journaled with it.
 
     Returns:
         None
     """
     with db.cursor() as cursor:
+        if block_index is not None:
+            cursor.execute(
+                f"""
+                SELECT id, tick, tick_hash, address, amt, last_update, UNIX_TIMESTAMP(block_time)
+                FROM {SRC20_BALANCES_TABLE} WHERE amt = 0
+                """  # nosec
+            )
+            insert_undo_entries(cursor, block_index, [(SRC20_BALANCES_TABLE,) + tuple(row) for row in cursor.fetchall()])
         cursor.execute(f"DELETE FROM {SRC20_BALANCES_TABLE} WHERE amt = 0")  # nosec
+    balance_engine.clear_zero_balances()
     return
 
 
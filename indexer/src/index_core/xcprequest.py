@@ -1,3 +1,4 @@
+import collections
 import concurrent.futures
 import json
 import logging
@@ -9,11 +10,13 @@ from tqdm import tqdm
 
 import config
 import index_core.util as util
+from index_core.issuance_store import issuance_store
 
 logger = logging.getLogger(__name__)
 
 url = config.CP_RPC_URL
 auth = config.CP_AUTH
+_multi_block_supported = None
 
 
 def _create_payload(method, params):
@@ -23,43 +26,121 @@ def _create_payload(method, params):
     return base_payload
 
 
-def fetch_cp_concurrent(block_index, block_tip, indicator=None):
-    """testing with this method because we were initially getting invalid results
-    when using the get_blocks[xxx,yyyy,zzz] method to the CP API
-    FIXME: now with version 10.x the concurrent method has been fixed so we can pull multiple blocks at once
-            will need to check CP version first to validate this will work, and fallback to this method"""
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-
-        blocks_to_fetch = 1000
-        futures = []
-        results_dict = {}
-
-        if block_tip > block_index + blocks_to_fetch:
-            block_tip = block_index + blocks_to_fetch
-        else:
-            blocks_to_fetch = block_tip - block_index + 1
-
-        pbar = tqdm(
-            total=blocks_to_fetch,
-            desc=f"Fetching CP Trx [{block_index}..{block_tip}]",
-            leave=True,
-        )
-
-        while block_index <= block_tip:
-            future = executor.submit(get_xcp_block_data, block_index, indicator=indicator)
-            future.block_index = block_index
-            futures.append(future)
-            block_index += 1
-
-        for future in concurrent.futures.as_completed(futures):
-            result = future.result()
-            results_dict[future.block_index] = result
-            pbar.update(1)
-
-        pbar.close()
-
-        sorted_results = dict(sorted(results_dict.items(), key=lambda x: x[0]))
-    return sorted_results
+class IssuancePrefetcher:
+    """
+    Keeps the CP stamp issuances of up to `window` blocks past the one being
+    parsed fetched in the background, so the parser only waits on CP when it
+    has caught up with it. Results are handed out, and dropped, one block at
+    a time in order.
+
+    CP servers that support multi-block `get_blocks` requests are asked for
+    `config.CP_BLOCK_RANGE_SIZE` blocks per call, older ones get one call per block.
+    """
+
+    def __init__(self, window=config.CP_PREFETCH_WINDOW, workers=config.CP_PREFETCH_WORKERS):
+        if int(window) < 1:
+            raise AttributeError("window < 1 or not a number")
+        self.window = window
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cp_prefetch")
+        self.pending: collections.deque = collections.deque()
+        self.results: dict = {}
+        self.next_index = None
+        self.range_size = None
+
+    def get(self, block_index, block_tip):
+        """
+        Return the stamp issuances of `block_index`, and keep fetching the
+        following blocks up to `block_tip`. Asking for the block after the tip
+        the window reached just continues from it, asking for any other block
+        than the next expected one (rollback, unparsed previous block) discards
+        everything fetched or in flight and restarts from `block_index`.
+
+        Args:
+            block_index (int): The block to return the issuances of.
+            block_tip (int): The highest block that may be fetched.
+
+        Returns:
+            dict: The stamp issuances of the block, keyed by tx_hash.
+        """
+        caught_up = block_index == self.next_index and not self.results and not self.pending
+        if block_index not in self.results and not (self.pending and self.pending[0][0] == block_index) and not caught_up:
+            if self.next_index is not None:
+                logger.debug(f"CP prefetch out of order at {block_index}, restarting.")
+            self.reset()
+            self.next_index = block_index
+        self._fill(max(block_tip, block_index))
+        while block_index not in self.results:
+            _, _, future = self.pending.popleft()
+            self.results.update(future.result())
+        self._collect()
+        self._fill(block_tip)
+        return self.results.pop(block_index)
+
+    @property
+    def ahead(self):
+        """The number of blocks past the last one handed out whose issuances are already fetched."""
+        self._collect()
+        return len(self.results)
+
+    def _collect(self):
+        while self.pending and self.pending[0][2].done():
+            _, _, future = self.pending.popleft()
+            self.results.update(future.result())
+
+    def _fill(self, last_index):
+        if self.range_size is None:
+            range_size = config.CP_BLOCK_RANGE_SIZE if supports_multi_block_fetch() else 1
+            self.range_size = min(range_size, self.window)
+        in_flight = sum(last - first + 1 for first, last, _ in self.pending)
+        while self.next_index <= last_index:
+            first = self.next_index
+            last = min(first + self.range_size - 1, last_index)
+            # wait for room for a full range, unless it's the last one before the tip
+            if len(self.results) + in_flight + last - first + 1 > self.window:
+                break
+            # only show the "waiting for CP" progress bar for the tip, the rest is expected to be parsed already
+            indicator = True if last == last_index else None
+            if self.range_size > 1:
+                future = self.executor.submit(get_xcp_blocks_data, list(range(first, last + 1)), indicator=indicator)
+            else:
+                future = self.executor.submit(_get_xcp_block_data_dict, first, indicator=indicator)
+            self.pending.append((first, last, future))
+            in_flight += last - first + 1
+            self.next_index = last + 1
+
+    def reset(self):
+        """Drop all fetched and in-flight results."""
+        for _, _, future in self.pending:
+            future.cancel()
+        self.pending.clear()
+        self.results.clear()
+        self.next_index = None
+        self.range_size = None
+
+    def shutdown(self):
+        self.reset()
+        self.executor.shutdown(wait=False)
+
+
+def _get_xcp_block_data_dict(block_index, indicator=None):
+    return {block_index: get_xcp_block_data(block_index, indicator=indicator)}
+
+
+def supports_multi_block_fetch():
+    """
+    Check once whether the CP server returns correct results for `get_blocks`
+    with several block indexes, which is the case from version 10 on.
+    """
+    global _multi_block_supported
+    if _multi_block_supported is None:
+        version = get_cp_version()
+        try:
+            _multi_block_supported = int(version.split(".")[0]) >= config.CP_MULTI_BLOCK_MIN_VERSION
+        except (AttributeError, ValueError):
+            logger.warning("Could not read the CP version, fetching CP blocks one at a time.")
+            return False
+        logger.info(f"CP version {version}, multi-block fetch {'enabled' if _multi_block_supported else 'disabled'}.")
+    return _multi_block_supported
 
 
 def _handle_cp_call_with_retry(func, params, block_index, indicator=None):
@@ -139,6 +220,14 @@ def _get_block(params={}):
     return json.loads(response.text)["result"]
 
 
+def _get_blocks(params={}):
+    """Like `_get_block`, with a longer timeout for multi-block responses."""
+    payload = _create_payload("get_blocks", params)
+    headers = {"content-type": "application/json"}
+    response = requests.post(url, data=json.dumps(payload), headers=headers, auth=auth, timeout=config.REQUESTS_TIMEOUT)
+    return json.loads(response.text)["result"]
+
+
 def _get_all_tx_by_block(block_index, indicator=None):
     return _handle_cp_call_with_retry(
         func=_get_block,
@@ -149,6 +238,10 @@ def _get_all_tx_by_block(block_index, indicator=None):
 
 
 def get_xcp_block_data(block_index: int, indicator=None):
+    stored_issuances = issuance_store.get(block_index)
+    if stored_issuances is not None:
+        return stored_issuances
+
     max_retries = 25
     retry_delay = 5  # seconds
 
@@ -163,6 +256,7 @@ def get_xcp_block_data(block_index: int, indicator=None):
         if block_data_from_xcp is not None:
             try:
                 parsed_block_data = _parse_issuances_from_block(block_data=block_data_from_xcp)
+                issuance_store.put(block_index, parsed_block_data["issuances"])
                 return parsed_block_data["issuances"]
             except (TypeError, IndexError, KeyError) as e:
                 logger.warning(f"Error parsing block data for block {block_index}: {e}")
@@ -176,11 +270,69 @@ def get_xcp_block_data(block_index: int, indicator=None):
     sys.exit(1)
 
 
+def get_xcp_blocks_data(block_indexes, indicator=None):
+    """
+    Get the stamp issuances of several blocks, from the issuance store when they
+    are stored and otherwise with a single `get_blocks` call. Blocks missing from
+    the response, or a response that can't be parsed, are fetched again one at a
+    time with `get_xcp_block_data`.
+
+    Args:
+        block_indexes (list): The block indexes to fetch, in ascending order.
+        indicator (bool, optional): Show a progress bar while waiting for CP to parse the blocks.
+
+    Returns:
+        dict: The stamp issuances of every block keyed by tx_hash, keyed by block index.
+    """
+    stored = issuance_store.get_many(block_indexes)
+    to_fetch = [block_index for block_index in block_indexes if block_index not in stored]
+    if not to_fetch:
+        return stored
+
+    results = {}
+    block_data_from_xcp = _handle_cp_call_with_retry(
+        func=_get_blocks,
+        params={"block_indexes": to_fetch},
+        block_index=to_fetch[-1],
+        indicator=indicator,
+    )
+    if block_data_from_xcp is not None:
+        try:
+            results = _parse_issuances_from_blocks(block_data_from_xcp)
+        except (TypeError, ValueError, KeyError) as e:
+            logger.warning(f"Error parsing block data for blocks {to_fetch[0]}..{to_fetch[-1]}: {e}")
+            results = {}
+    results = {block_index: issuances for block_index, issuances in results.items() if block_index in to_fetch}
+    issuance_store.put_many(results)
+    results.update(stored)
+    missing = [block_index for block_index in block_indexes if block_index not in results]
+    if missing:
+        logger.warning(f"{len(missing)} blocks missing from CP range {block_indexes[0]}..{block_indexes[-1]}, refetching.")
+        for block_index in missing:
+            results[block_index] = get_xcp_block_data(block_index, indicator=indicator)
+    return results
+
+
+def _parse_issuances_from_blocks(block_data):
+    """Parse the stamp issuances of every block of a `get_blocks` response, keyed by block index."""
+    if not block_data or not isinstance(block_data, list):
+        raise ValueError("Invalid block data format")
+    results = {}
+    for block in block_data:
+        parsed_block_data = _parse_block_issuances(block)
+        results[parsed_block_data["block_index"]] = parsed_block_data["issuances"]
+    return results
+
+
 def _parse_issuances_from_block(block_data):
     if not block_data or not isinstance(block_data, list) or len(block_data) == 0:
         raise ValueError("Invalid block data format")
+    return _parse_block_issuances(block_data[0])
+
+
+def _parse_block_issuances(block_data):
     issuances = []
-    block_data = json.loads(json.dumps(block_data[0]))
+    block_data = json.loads(json.dumps(block_data))
     for tx in block_data["_messages"]:
         tx_data = json.loads(tx.get("bindings"))
         tx_data["msg_index"] = tx.get("message_index")
@@ -192,10 +344,33 @@ def _parse_issuances_from_block(block_data):
                     issuances.append(stamp_issuance)
     return {
         "block_index": block_data["block_index"],
-        "issuances": issuances,
+        "issuances": index_issuances_by_tx_hash(issuances),
     }
 
 
+def index_issuances_by_tx_hash(issuances):
+    """
+    Key the stamp issuances of a block by tx_hash. A transaction carries at most
+    one issuance, should CP ever report more the first one wins, as it always has.
+
+    Args:
+        issuances (list): The stamp issuances of a block, in CP message order.
+
+    Returns:
+        dict: The issuances keyed by tx_hash, in CP message order.
+    """
+    indexed = {}
+    for issuance in issuances:
+        tx_hash = issuance["tx_hash"]
+        if tx_hash in indexed:
+            logger.warning(
+                f"Duplicate CP stamp issuance for tx {tx_hash}, keeping message {indexed[tx_hash]['message_index']}"
+            )
+            continue
+        indexed[tx_hash] = issuance
+    return indexed
+
+
 def parse_base64_from_description(description):
     if description is not None and description.lower().find("stamp:") != -1:
         stamp_search = description[description.lower().find("stamp:") + 6 :]
@@ -245,5 +420,5 @@ def _check_for_stamp_issuance(issuance):
 
 
 def filter_issuances_by_tx_hash(issuances, tx_hash):
-    filtered_issuances = [issuance for issuance in issuances if issuance["tx_hash"] == tx_hash]
-    return filtered_issuances[0] if filtered_issuances else None
+    """Return the issuance of `tx_hash` from the issuances of a block keyed by tx_hash, or None."""
+    return issuances.get(tx_hash)
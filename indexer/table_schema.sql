@@ -29,6 +29,8 @@ CREATE TABLE IF NOT EXISTS transactions (
   `data` MEDIUMBLOB,
   `supported` BIT DEFAULT 1,
   `keyburn` tinyint(1) DEFAULT NULL,
+  `is_op_return` tinyint(1) DEFAULT NULL,
+  `p2wsh_data` MEDIUMBLOB DEFAULT NULL,
   PRIMARY KEY (`tx_index`),
   UNIQUE (`tx_hash`),
   UNIQUE KEY `tx_hash_index` (`tx_hash`, `tx_index`),
@@ -156,12 +158,51 @@ CREATE TABLE IF NOT EXISTS `balances` (
   INDEX `tick_tick_hash` (`tick`, `tick_hash`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_as_ci;
 
+CREATE TABLE IF NOT EXISTS `balance_snapshots` (
+  `block_index` int NOT NULL,
+  `id` VARCHAR(255) COLLATE utf8mb4_bin NOT NULL,
+  `address` varchar(255) COLLATE utf8mb4_bin NOT NULL,
+  `tick` varchar(32),
+  `tick_hash` varchar(64),
+  `amt` decimal(38,18),
+  `block_time` datetime,
+  `last_update` int,
+  PRIMARY KEY (`block_index`, `id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_as_ci;
+
+CREATE TABLE IF NOT EXISTS `undo_journal` (
+  `seq` BIGINT NOT NULL AUTO_INCREMENT,
+  `block_index` int NOT NULL,
+  `table_name` varchar(32) NOT NULL,
+  `row_id` VARCHAR(255) COLLATE utf8mb4_bin NOT NULL,
+  `tick` varchar(32),
+  `tick_hash` varchar(64),
+  `address` varchar(255) COLLATE utf8mb4_bin,
+  `amt` decimal(38,18),
+  `last_update` int,
+  `block_time` datetime,
+  PRIMARY KEY (`seq`),
+  INDEX `block_index` (`block_index`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_as_ci;
+
 CREATE TABLE IF NOT EXISTS s3objects (
   `id` VARCHAR(255) NOT NULL,
   `path_key` VARCHAR(255) NOT NULL,
   `md5` VARCHAR(255) NOT NULL,
+  `status` VARCHAR(16) NOT NULL DEFAULT 'uploaded',
+  `content_type` VARCHAR(255) DEFAULT NULL,
   PRIMARY KEY (id),
-  index `path_key` (`path_key`)
+  index `path_key` (`path_key`),
+  index `status` (`status`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_as_ci;
+
+CREATE TABLE IF NOT EXISTS s3_inventory (
+  `scope` VARCHAR(255) NOT NULL,
+  `last_key` VARCHAR(255) DEFAULT NULL,
+  `watermark` DATETIME DEFAULT NULL,
+  `run_started` DATETIME DEFAULT NULL,
+  `complete` TINYINT(1) NOT NULL DEFAULT 0,
+  PRIMARY KEY (`scope`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_as_ci;
 
 
@@ -0,0 +1,228 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import config
+from index_core.aws import InvalidationBatcher, S3UploadQueue, iter_s3_pages, write_s3_objects
+
+
+class LocalS3:
+    """The calls of the boto3 S3 client the upload queue makes, kept in memory. A moto client works the same."""
+
+    def __init__(self, failures=0, delays=None):
+        self.objects = {}
+        self.modified = {}
+        self.failures = failures
+        self.delays = delays or {}  # seconds an upload of a body takes
+        self.lock = threading.Lock()
+
+    def upload_fileobj(self, file_obj, bucket, key, ExtraArgs=None):
+        body = file_obj.read()
+        time.sleep(self.delays.get(body, 0))
+        with self.lock:
+            if self.failures:
+                self.failures -= 1
+                raise ConnectionError("S3 unavailable")
+            self.objects[(bucket, key)] = (body, ExtraArgs["ContentType"])
+            self.modified[(bucket, key)] = datetime.now(timezone.utc)
+
+    def head_object(self, Bucket, Key):
+        body, _ = self.objects[(Bucket, Key)]
+        return {"ETag": '"%s"' % hashlib.md5(body, usedforsecurity=False).hexdigest()}
+
+    def get_paginator(self, operation):
+        self.pages_listed = 0
+        return self
+
+    def paginate(self, Bucket, Prefix, PaginationConfig, StartAfter=""):
+        keys = sorted(key for bucket, key in self.objects if bucket == Bucket and key.startswith(Prefix) and key > StartAfter)
+        for i in range(0, len(keys), PaginationConfig["PageSize"]):
+            self.pages_listed += 1
+            contents = []
+            for key in keys[i : i + PaginationConfig["PageSize"]]:
+                contents.append(
+                    {"Key": key, "LastModified": self.modified[(Bucket, key)], **self.head_object(Bucket=Bucket, Key=key)}
+                )
+            yield {"Contents": contents}
+
+
+class RecordingDB:
+    def __init__(self, rows=()):
+        self.statements = []
+        self.rows = list(rows)
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, query, params=None):
+        self.statements.append((query, params))
+
+    def executemany(self, query, params):
+        self.statements.append((query, params))
+
+    def fetchall(self):
+        return self.rows
+
+
+def md5(body):
+    return hashlib.md5(body, usedforsecurity=False).hexdigest()
+
+
+class TestS3UploadQueue(unittest.TestCase):
+    def setUp(self):
+        self.spool = tempfile.mkdtemp()
+
+    def make_queue(self, s3):
+        return S3UploadQueue(workers=2, queue_size=2, spool_dir=self.spool, s3_client=s3, bucket_name="stamps", retry_delay=0)
+
+    def test_uploads_in_background_and_records_them(self):
+        s3 = LocalS3(failures=1)
+        upload_queue, db = self.make_queue(s3), RecordingDB()
+        files = {f"stamps/{i}.png": os.urandom(100) for i in range(10)}
+        for key, body in files.items():
+            upload_queue.enqueue(db, key, io.BytesIO(body), md5(body), "image/png")
+        upload_queue.commit()
+        upload_queue.wait()
+
+        self.assertEqual({key: s3.objects[("stamps", key)] for key in files}, {k: (b, "image/png") for k, b in files.items()})
+        self.assertEqual(os.listdir(self.spool), [])
+        self.assertEqual(upload_queue.snapshot().uploaded, 10)
+
+        upload_queue.record_uploads(db)
+        query, params = db.statements[-1]
+        self.assertIn("UPDATE s3objects SET status = 'uploaded'", query)
+        self.assertEqual(sorted(params), sorted(f"{key}_{md5(body)}" for key, body in files.items()))
+
+    def test_failed_uploads_stay_spooled_and_resume(self):
+        body = os.urandom(100)
+        upload_queue = self.make_queue(LocalS3(failures=3))
+        upload_queue.enqueue(RecordingDB(), "stamps/a.png", io.BytesIO(body), md5(body), "image/png")
+        upload_queue.commit()
+        upload_queue.wait()
+        self.assertEqual(upload_queue.snapshot().failed, 1)
+        self.assertEqual(len(os.listdir(self.spool)), 1)
+
+        s3 = LocalS3()
+        restarted = self.make_queue(s3)
+        restarted.resume(RecordingDB([("stamps/a.png", md5(body), "pending", "image/png")]))
+        restarted.wait()
+        self.assertEqual(s3.objects[("stamps", "stamps/a.png")], (body, "image/png"))
+        self.assertEqual(restarted.uploaded, [("stamps/a.png", md5(body))])
+
+    def test_uploads_are_queued_with_their_block(self):
+        old, new = os.urandom(100), os.urandom(100)
+        s3 = LocalS3(delays={old: 0.1})
+        upload_queue = self.make_queue(s3)
+        with mock.patch.dict(config.S3_OBJECTS, clear=True):
+            upload_queue.enqueue(RecordingDB(), "stamps/rolled_back.png", io.BytesIO(new), md5(new), "image/png")
+            upload_queue.discard()
+            upload_queue.enqueue(RecordingDB(), "stamps/a.png", io.BytesIO(old), md5(old), "image/png")
+            self.assertEqual(config.S3_OBJECTS, {})
+            upload_queue.commit()
+            # replaced while the first upload is still running
+            upload_queue.enqueue(RecordingDB(), "stamps/a.png", io.BytesIO(new), md5(new), "image/png", replacing=True)
+            upload_queue.commit()
+            upload_queue.wait()
+            self.assertEqual(config.S3_OBJECTS, {"stamps/a.png": md5(new)})
+        self.assertEqual(s3.objects, {("stamps", "stamps/a.png"): (new, "image/png")})
+        self.assertEqual(upload_queue.uploaded, [("stamps/a.png", md5(old)), ("stamps/a.png", md5(new))])
+
+
+class TestS3Inventory(unittest.TestCase):
+    def test_lists_pages_lazily_and_resumes(self):
+        s3 = LocalS3()
+        bodies = {f"stamps/{i}.png": os.urandom(10) for i in range(5)}
+        for key, body in bodies.items():
+            s3.upload_fileobj(io.BytesIO(body), "stamps", key, ExtraArgs={"ContentType": "image/png"})
+        s3.upload_fileobj(io.BytesIO(b"x"), "stamps", "other/x.png", ExtraArgs={"ContentType": "image/png"})
+
+        pages = iter_s3_pages(s3, "stamps", "stamps/", page_size=2)
+        last_key, objects = next(pages)
+        self.assertEqual(s3.pages_listed, 1)
+        self.assertEqual(
+            (last_key, objects), ("stamps/1.png", [(k, md5(bodies[k])) for k in ["stamps/0.png", "stamps/1.png"]])
+        )
+
+        resumed = list(iter_s3_pages(s3, "stamps", "stamps/", start_after=last_key, page_size=2))
+        self.assertEqual([page[0] for page in resumed], ["stamps/3.png", "stamps/4.png"])
+        self.assertEqual(sum(len(objects) for _, objects in resumed), 3)
+
+        watermark = datetime.now(timezone.utc).replace(tzinfo=None)
+        s3.modified[("stamps", "stamps/2.png")] += timedelta(hours=1)
+        newer = list(iter_s3_pages(s3, "stamps", "stamps/", modified_after=watermark, page_size=2))
+        self.assertEqual([objects for _, objects in newer], [[], [("stamps/2.png", md5(bodies["stamps/2.png"]))], []])
+
+    def test_writes_skip_uploads_in_progress(self):
+        db = RecordingDB([("stamps/1.png",)])
+        write_s3_objects(db, [("stamps/0.png", "a" * 32), ("stamps/1.png", "b" * 32)])
+        (_, delete_params), (insert, insert_params) = db.statements[1:]
+        self.assertEqual(delete_params, ["stamps/0.png"])
+        self.assertIn("INSERT IGNORE INTO s3objects", insert)
+        self.assertEqual(insert_params, [("stamps/0.png_" + "a" * 32, "stamps/0.png", "a" * 32)])
+
+
+class TestInvalidationBatcher(unittest.TestCase):
+    def setUp(self):
+        self.spool = os.path.join(tempfile.mkdtemp(), "invalidations.sqlite")
+        self.sent = []
+
+    def invalidate(self, paths, distribution_id):
+        if self.fail:
+            raise ConnectionError("CloudFront unavailable")
+        self.sent.append(paths)
+
+    def make_batcher(self, batch_size=3, fail=False):
+        self.fail = fail
+        batcher = InvalidationBatcher(self.spool, "E123", batch_size=batch_size, interval=3600, invalidate=self.invalidate)
+        batcher.enabled = True
+        return batcher
+
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(condition())
+
+    def test_batches_on_size_or_age(self):
+        batcher = self.make_batcher()
+        batcher.add(["stamps/a.png", "stamps/b.png"])
+        batcher.add(["stamps/a.png"])
+        paths, wait = batcher.next_batch()
+        self.assertIsNone(paths)
+        self.assertGreater(wait, 3500)
+        self.assertEqual(batcher.next_batch(now=time.time() + 3600)[0], ["/stamps/a.png", "/stamps/b.png"])
+        self.assertEqual(self.sent, [])
+
+        batcher.add(["stamps/c.png", "stamps/d.png"])
+        self.wait_for(lambda: self.sent)
+        self.assertEqual(len(self.sent[0]), 3)
+        self.assertEqual(self.sent[0][:2], ["/stamps/a.png", "/stamps/b.png"])
+        self.assertEqual(batcher.pending(), 1)
+
+    def test_spooled_paths_survive_failures_and_restarts(self):
+        batcher = self.make_batcher(batch_size=1, fail=True)
+        batcher.add(["stamps/a.png"])
+        self.wait_for(lambda: batcher.failures)
+        self.assertEqual(batcher.pending(), 1)
+
+        restarted = self.make_batcher(batch_size=1)
+        restarted.start()
+        self.wait_for(lambda: self.sent)
+        self.assertEqual(self.sent, [["/stamps/a.png"]])
+        self.assertEqual(restarted.pending(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
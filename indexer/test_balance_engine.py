@@ -0,0 +1,72 @@
+import random
+import unittest
+from decimal import Decimal as D
+from unittest import mock
+
+import index_core.src20 as src20
+from index_core.balance_engine import balance_engine
+from tests.sqlite_db import SqliteDB
+
+TICKS = ["kevin", "stamp", "𝕊𝕋𝔸𝕄ℙ"]
+ADDRESSES = [f"bc1qaddress{n}" for n in range(6)]
+
+
+def random_block(rng, reference):
+    """The valid MINT and TRANSFER operations of a block, updating the reference balances."""
+    processed = []
+    for _ in range(rng.randrange(1, 8)):
+        tick = rng.choice(TICKS)
+        amt = D(rng.randrange(1, 10**6)) / 10 ** rng.randrange(0, 9)
+        creator, destination = rng.sample(ADDRESSES, 2)
+        if rng.random() < 0.5 and reference.get((tick, creator), 0) >= amt:
+            op = "TRANSFER"
+            reference[(tick, creator)] -= amt
+        else:
+            op = "MINT"
+        reference[(tick, destination)] = reference.get((tick, destination), 0) + amt
+        processed.append(
+            {
+                "tick": tick,
+                "tick_hash": f"{tick}_hash",
+                "op": op,
+                "amt": amt,
+                "creator": creator,
+                "destination": destination,
+                "valid": 1,
+            }
+        )
+    return processed
+
+
+class TestBalanceEngine(unittest.TestCase):
+    def setUp(self):
+        self.db = SqliteDB()
+        balance_engine.invalidate()
+        self.addCleanup(balance_engine.invalidate)
+
+    def running_balances(self, enabled):
+        with mock.patch.object(balance_engine, "enabled", enabled):
+            return [src20.get_running_user_balances(self.db, tick, f"{tick}_hash", list(ADDRESSES), []) for tick in TICKS]
+
+    def test_matches_the_balances_table(self):
+        rng = random.Random(13)
+        reference = {}
+        with mock.patch.object(balance_engine, "enabled", True):
+            for block_index in range(800000, 800030):
+                src20.update_src20_balances(self.db, block_index, 1700000000 + block_index, random_block(rng, reference))
+                if block_index % 10 == 0:
+                    src20.clear_zero_balances(self.db)
+                self.db.commit()
+                from_engine = self.running_balances(True)
+                self.assertEqual(from_engine, self.running_balances(False))
+
+        self.assertEqual(
+            {(balance.tick, balance.address): balance.total_balance for ticks in from_engine for balance in ticks},
+            {(tick, address): reference.get((tick, address), 0) for tick in TICKS for address in ADDRESSES},
+        )
+        balance_engine.invalidate()  # loaded again from the table
+        self.assertEqual(self.running_balances(True), from_engine)
+
+
+if __name__ == "__main__":
+    unittest.main()
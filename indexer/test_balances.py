@@ -0,0 +1,111 @@
+import random
+import unittest
+from datetime import datetime, timezone
+from decimal import Decimal as D
+from unittest import mock
+
+import config
+import index_core.database as database
+from tests.sqlite_db import SqliteDB
+
+# "bc1qpad\t" sorts before "bc1qpad" under the PAD SPACE utf8mb4_bin, after it in Python
+ADDRESSES = ["bc1qpad", "bc1qpad\t", "bc1qtrail ", "bc1qzz", "bc1qZZa"]
+
+
+def insert_src20_valid(db, block_index, op, tick, creator, destination, amt):
+    with db.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM SRC20Valid")
+        tx_index = cursor.fetchone()[0]
+        cursor.execute(
+            """
+            INSERT INTO SRC20Valid (id, tx_hash, tx_index, block_index, p, op, tick, tick_hash, creator, destination, amt, block_time)
+            VALUES (%s, %s, %s, %s, 'SRC-20', %s, %s, %s, %s, %s, %s, %s)
+            """,
+            (
+                f"0_{tx_index}_tx{tx_index}",
+                f"tx{tx_index}",
+                tx_index,
+                block_index,
+                op,
+                tick,
+                f"{tick}_hash",
+                creator,
+                destination,
+                amt,
+                datetime.fromtimestamp(1700000000 + block_index, tz=timezone.utc),
+            ),
+        )
+
+
+class TestBalancesMatch(unittest.TestCase):
+    def setUp(self):
+        self.db = SqliteDB()
+        for n, address in enumerate(ADDRESSES):
+            insert_src20_valid(self.db, 800000 + n, "MINT", "kevin", address, address, D("1000.5"))
+        insert_src20_valid(self.db, 800010, "TRANSFER", "kevin", ADDRESSES[0], ADDRESSES[1], D("0.000000000000000001"))
+        self.db.commit()
+
+    def rebuilt(self):
+        all_balances = {}
+        database.replay_src20_valid(self.db, all_balances)
+        return all_balances
+
+    def test_ids_out_of_python_order(self):
+        database.rebuild_balances(self.db)
+        self.assertEqual(len(self.db.dump("balances", "id")), len(ADDRESSES))
+        self.assertTrue(database.balances_match(self.db, self.rebuilt()))
+
+    def test_differences_are_found(self):
+        database.rebuild_balances(self.db)
+        with self.db.cursor() as cursor:
+            cursor.execute("UPDATE balances SET amt = amt + 1 WHERE id = %s", ("kevin_bc1qpad\t",))
+        self.assertFalse(database.balances_match(self.db, self.rebuilt()))
+
+        database.rebuild_balances(self.db)
+        self.assertTrue(database.balances_match(self.db, self.rebuilt()))
+        with self.db.cursor() as cursor:
+            cursor.execute("DELETE FROM balances WHERE id = %s", ("kevin_bc1qzz",))
+        self.assertFalse(database.balances_match(self.db, self.rebuilt()))
+
+        database.rebuild_balances(self.db)
+        all_balances = self.rebuilt()
+        del all_balances["kevin_bc1qtrail "]
+        self.assertFalse(database.balances_match(self.db, all_balances))
+
+
+class TestBalanceSnapshots(unittest.TestCase):
+    def setUp(self):
+        self.db = SqliteDB()
+        rng = random.Random(14)
+        for block_index in range(800001, 800041):
+            for _ in range(rng.randrange(0, 4)):
+                creator, destination = rng.sample(ADDRESSES, 2)
+                amt = D(rng.randrange(1, 10**6)) / 10 ** rng.randrange(0, 19)
+                insert_src20_valid(self.db, block_index, rng.choice(["MINT", "TRANSFER"]), "kevin", creator, destination, amt)
+        self.db.commit()
+
+    def replayed(self, through_block):
+        all_balances = {}
+        database.replay_src20_valid(self.db, all_balances, through_block=through_block)
+        return all_balances
+
+    def test_snapshots_reproduce_the_balances(self):
+        for block_index in range(800010, 800041, 10):
+            database.save_balance_snapshot(self.db, block_index)
+            self.db.commit()
+            self.assertEqual(database.load_balance_snapshot(self.db), (block_index, self.replayed(block_index)))
+        with self.db.cursor() as cursor:
+            cursor.execute("SELECT DISTINCT block_index FROM balance_snapshots ORDER BY block_index")
+            self.assertEqual([row[0] for row in cursor.fetchall()], [800030, 800040][-config.BALANCE_SNAPSHOT_KEEP :])
+
+        # purging drops the snapshots above the purged block, the balances are rebuilt from the one left
+        database.purge_block_db(self.db, 800035)
+        self.assertEqual(database.load_balance_snapshot(self.db), (800030, self.replayed(800030)))
+        with mock.patch.object(database, "replay_src20_valid", wraps=database.replay_src20_valid) as replay:
+            database.rebuild_balances(self.db)
+        replay.assert_called_once_with(self.db, mock.ANY, after_block=800030)
+        self.assertTrue(database.balances_match(self.db, self.replayed(None)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+import unittest
+from decimal import Decimal as D
+from types import SimpleNamespace
+from unittest import mock
+
+import index_core.database as database
+import index_core.src20 as src20
+from index_core.balance_engine import balance_engine
+from index_core.blocks import TxResult, commit_and_update_block
+from tests.sqlite_db import SqliteDB
+
+BLOCK_INDEX = 800001
+BLOCK_TIME = 1700000000
+TABLES = ["blocks", "transactions", "StampTableV4", "SRC20", "SRC20Valid", "balances", "undo_journal", "collection_stamps"]
+
+
+def tx_result(tx_index):
+    return TxResult(
+        tx_index=tx_index,
+        source="bc1qsource",
+        destination="bc1qdestination",
+        btc_amount=546,
+        fee=1000,
+        data=b"stamp:",
+        decoded_tx=None,
+        keyburn=1,
+        is_op_return=False,
+        tx_hash=f"tx{tx_index}",
+        block_index=BLOCK_INDEX,
+        block_hash="hash1",
+        block_time=BLOCK_TIME,
+        p2wsh_data=None,
+    )
+
+
+def parsed_stamp(stamp, tx_index):
+    return SimpleNamespace(
+        stamp=stamp,
+        block_index=BLOCK_INDEX,
+        cpid=f"A{stamp}",
+        asset_longname=None,
+        creator="bc1qsource",
+        divisible=0,
+        keyburn=1,
+        locked=1,
+        message_index=None,
+        stamp_base64="c3RhbXA=",
+        stamp_mimetype="image/png",
+        stamp_url=None,
+        supply=1,
+        block_time=None,
+        tx_hash=f"tx{tx_index}",
+        tx_index=tx_index,
+        ident="STAMP",
+        src_data=None,
+        stamp_hash=f"hash{stamp}",
+        is_btc_stamp=1,
+        file_hash=f"file{stamp}",
+        is_valid_base64=1,
+    )
+
+
+class TestBlockWriteBatch(unittest.TestCase):
+    def setUp(self):
+        self.db = SqliteDB()
+        balance_engine.invalidate()
+        self.addCleanup(balance_engine.invalidate)
+
+    def parse_block(self, stamps):
+        """Parse a block with a transaction per stamp and an SRC-20 mint, leaving the writes to commit."""
+        processed = [
+            {
+                "tx_hash": "tx0",
+                "tx_index": 0,
+                "block_index": BLOCK_INDEX,
+                "block_time": BLOCK_TIME,
+                "p": "SRC-20",
+                "op": "MINT",
+                "tick": "kevin",
+                "tick_hash": "kevin_hash",
+                "amt": D("1000"),
+                "creator": "bc1qsource",
+                "destination": "bc1qsource",
+                "valid": 1,
+            }
+        ]
+        src20.update_src20_balances(self.db, BLOCK_INDEX, BLOCK_TIME, processed)
+        batch = database.BlockWriteBatch(BLOCK_INDEX, "hash1", BLOCK_TIME, "hash0", 1)
+        batch.set_hashes("txlist", "ledger", "messages")
+        batch.transactions.extend(tx_result(stamp.tx_index) for stamp in stamps)
+        batch.stamps.extend(stamps)
+        batch.src20.extend(processed)
+        batch.add_collection_data([(b"c" * 16, "POSH")], [(b"c" * 16, stamp.stamp) for stamp in stamps], [])
+        return batch
+
+    def row_counts(self):
+        return {table: len(self.db.dump(table, "1")) for table in TABLES}
+
+    def test_block_is_committed_whole(self):
+        batch = self.parse_block([parsed_stamp(1, 0), parsed_stamp(2, 1)])
+        self.assertEqual(commit_and_update_block(self.db, BLOCK_INDEX, batch), BLOCK_INDEX + 1)
+        self.db.rollback()
+        self.assertEqual(
+            self.row_counts(),
+            {
+                "blocks": 1,
+                "transactions": 2,
+                "StampTableV4": 2,
+                "SRC20": 1,
+                "SRC20Valid": 1,
+                "balances": 1,
+                "undo_journal": 2,
+                "collection_stamps": 2,
+            },
+        )
+        self.assertEqual(
+            self.db.dump("blocks", "block_index", "txlist_hash, ledger_hash, messages_hash, indexed"),
+            [("txlist", "ledger", "messages", 1)],
+        )
+
+    def test_failure_partway_leaves_no_rows(self):
+        # a repeated stamp fails after the blocks and transactions rows, a repeated transaction after the blocks row
+        for failing_stamps in ([parsed_stamp(1, 0), parsed_stamp(1, 1)], [parsed_stamp(1, 0), parsed_stamp(2, 0)]):
+            with self.subTest(failing_stamps=failing_stamps):
+                batch = self.parse_block(failing_stamps)
+                with mock.patch.object(self.db, "close"), self.assertRaises(SystemExit):
+                    commit_and_update_block(self.db, BLOCK_INDEX, batch)
+                self.assertEqual(self.row_counts(), dict.fromkeys(TABLES, 0))
+
+    def test_failure_after_the_writes_leaves_no_rows(self):
+        batch = self.parse_block([parsed_stamp(1, 0)])
+        with mock.patch("index_core.blocks.record_block", side_effect=RuntimeError("journal")), mock.patch.object(
+            self.db, "close"
+        ), self.assertRaises(SystemExit):
+            commit_and_update_block(self.db, BLOCK_INDEX, batch)
+        self.assertEqual(self.row_counts(), dict.fromkeys(TABLES, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+
+import index_core.check as check
+import index_core.database as database
+from tests.sqlite_db import SqliteDB
+
+FIRST_BLOCK = 800001
+
+
+def parse_block(db, block_index, contents, hash_chain=None):
+    """
+    Hash and store a block. Without a hash chain the previous hashes are read
+    back from the blocks table, as `consensus_hash` did before the chain.
+    """
+    txlist_content, ledger_content, messages_content = contents
+    previous = hash_chain.previous_hashes(db, block_index) if hash_chain is not None else (None, None, None)
+    txlist_hash, _ = check.consensus_hash(db, block_index, "txlist_hash", previous[0], txlist_content, False)
+    ledger_hash, _ = check.consensus_hash(db, block_index, "ledger_hash", previous[1], ledger_content, False)
+    messages_hash, _ = check.consensus_hash(db, block_index, "messages_hash", previous[2], messages_content, False)
+    if hash_chain is not None:
+        hash_chain.advance(block_index, txlist_hash, ledger_hash, messages_hash)
+    database.insert_block(
+        db,
+        block_index,
+        f"hash{block_index}",
+        1700000000,
+        f"hash{block_index - 1}",
+        1,
+        txlist_hash,
+        ledger_hash,
+        messages_hash,
+        1,
+    )
+    db.commit()
+
+
+def block_contents(block_index, fork=""):
+    # blocks without SRC-20 operations have an empty ledger hash
+    ledger_content = f"kevin,bc1q{fork},{block_index}" if block_index % 3 else ""
+    return f"[stamp {block_index}{fork}]", ledger_content, f"['tx{block_index}{fork}']"
+
+
+class TestConsensusHashChain(unittest.TestCase):
+    def new_db(self):
+        db = SqliteDB()
+        database.insert_block(db, FIRST_BLOCK - 1, "hash0", 1700000000, None, 1, "a" * 64, "b" * 64, "c" * 64, 1)
+        db.commit()
+        return db
+
+    def test_reseeds_after_a_rollback(self):
+        db, hash_chain = self.new_db(), check.ConsensusHashChain()
+        history = [block_contents(block_index) for block_index in range(FIRST_BLOCK, FIRST_BLOCK + 10)]
+        for block_index, contents in enumerate(history, FIRST_BLOCK):
+            parse_block(db, block_index, contents, hash_chain)
+
+        for fork, fork_block in enumerate((FIRST_BLOCK + 9, FIRST_BLOCK + 4, FIRST_BLOCK + 6)):
+            with self.subTest(fork_block=fork_block):
+                database.rollback_blocks(db, fork_block)
+                for block_index in range(fork_block, FIRST_BLOCK + 10):
+                    history[block_index - FIRST_BLOCK] = block_contents(block_index, fork=f"_fork{fork}")
+                    parse_block(db, block_index, history[block_index - FIRST_BLOCK], hash_chain)
+
+                expected_db = self.new_db()
+                for block_index, contents in enumerate(history, FIRST_BLOCK):
+                    parse_block(expected_db, block_index, contents)
+                self.assertEqual(db.dump("blocks", "block_index"), expected_db.dump("blocks", "block_index"))
+
+
+if __name__ == "__main__":
+    unittest.main()
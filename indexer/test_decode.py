@@ -0,0 +1,146 @@
+import json
+import os
+import unittest
+from unittest import mock
+
+from bitcoin.core import CMutableTransaction, COutPoint, CTransaction, CTxIn, CTxOut
+from bitcoin.core.script import OP_1, OP_3, OP_CHECKMULTISIG, OP_CHECKSIG, OP_DUP, OP_EQUALVERIFY, OP_HASH160, CScript
+from bitcoin.wallet import CBitcoinAddress
+
+import config
+import index_core.arc4 as arc4
+import index_core.backend as backend
+import index_core.blocks as blocks
+import index_core.util as util
+from index_core.prevouts import PrevoutCache
+
+BLOCK_INDEX = 800001
+
+
+def p2pkh_script():
+    return CScript([OP_DUP, OP_HASH160, os.urandom(20), OP_EQUALVERIFY, OP_CHECKSIG])
+
+
+def spend(outpoint, outputs):
+    return CTransaction.from_tx(CMutableTransaction([CTxIn(outpoint, CScript([os.urandom(71)]))], outputs))
+
+
+def src20_outputs(parent_txid, payload):
+    """The multisig outputs carrying an SRC-20 payload, ARC4 encrypted with the txid of the spent output."""
+    data = config.PREFIX + json.dumps(payload).encode()
+    chunk = len(data).to_bytes(2, "big") + data
+    chunk += b"\x00" * (-len(chunk) % 62)
+    chunk = arc4.arc4_decrypt_chunk(chunk, arc4.init_arc4(parent_txid[::-1]))
+    burnkey = bytes.fromhex(config.BURNKEYS[0])
+    return [
+        CTxOut(
+            546,
+            CScript(
+                [
+                    OP_1,
+                    b"\x02" + chunk[i : i + 31] + b"\x00",
+                    b"\x03" + chunk[i + 31 : i + 62] + b"\x00",
+                    burnkey,
+                    OP_3,
+                    OP_CHECKMULTISIG,
+                ]
+            ),
+        )
+        for i in range(0, len(chunk), 62)
+    ]
+
+
+def address(script_pubkey):
+    return str(CBitcoinAddress.from_scriptPubKey(script_pubkey))
+
+
+class TestDecodeBlockTransactions(unittest.TestCase):
+    def setUp(self):
+        cache = mock.patch.object(blocks, "prevout_cache", PrevoutCache(size=100, path=None))
+        cache.start()
+        self.addCleanup(cache.stop)
+        block_index = mock.patch.object(util, "CURRENT_BLOCK_INDEX", BLOCK_INDEX)
+        block_index.start()
+        self.addCleanup(block_index.stop)
+
+        self.parents = [spend(COutPoint(os.urandom(32), 0), [CTxOut(10000, p2pkh_script())]) for _ in range(3)]
+        self.destination = p2pkh_script()
+        self.txs = [
+            spend(
+                COutPoint(parent.GetTxid(), 0),
+                [
+                    CTxOut(546, self.destination),
+                    *src20_outputs(parent.GetTxid(), {"p": "src-20", "op": "mint", "tick": "kevin", "amt": str(n)}),
+                    CTxOut(5000, p2pkh_script()),
+                ],
+            )
+            for n, parent in enumerate(self.parents)
+        ]
+        self.txs.append(spend(COutPoint(os.urandom(32), 0), [CTxOut(1000, p2pkh_script())]))  # not a stamp
+        self.txhash_list = [tx.GetTxid()[::-1].hex() for tx in self.txs]
+        self.raw_transactions = {tx_hash: tx.serialize().hex() for tx_hash, tx in zip(self.txhash_list, self.txs)}
+
+    def decode(self, raw_transactions=None):
+        parents = {parent.GetTxid()[::-1].hex(): parent.serialize().hex() for parent in self.parents}
+        with mock.patch.object(
+            backend, "getrawtransaction_batch", side_effect=lambda txids: {txid: parents[txid] for txid in txids}
+        ) as getrawtransaction_batch:
+            results = blocks.decode_block_transactions(
+                None, self.txhash_list, BLOCK_INDEX, {}, raw_transactions or self.raw_transactions
+            )
+        self.getrawtransaction_batch = getrawtransaction_batch
+        # the CTransaction is only kept in the thread mode, it isn't stored
+        return [result._replace(decoded_tx=None) for result in results]
+
+    def test_stamps_are_decoded(self):
+        results = self.decode()
+        self.assertEqual([result.tx_hash for result in results], self.txhash_list)
+        for n, (result, parent) in enumerate(zip(results, self.parents)):
+            self.assertEqual(result.source, address(parent.vout[0].scriptPubKey))
+            self.assertEqual(result.destination, address(self.destination))
+            self.assertEqual(json.loads(result.data), {"p": "src-20", "op": "mint", "tick": "kevin", "amt": str(n)})
+            self.assertEqual(result.keyburn, 1)
+        self.assertEqual(results[-1][1:6], (None,) * 5)
+
+    def test_parents_are_fetched_in_one_batch(self):
+        blocks.prevout_cache.add_ctx(self.parents[0])
+        with mock.patch.object(backend, "getrawtransaction", side_effect=AssertionError("fetched one at a time")):
+            expected = self.decode()
+            self.getrawtransaction_batch.assert_called_once()
+            self.assertCountEqual(
+                self.getrawtransaction_batch.call_args[0][0], [parent.GetTxid()[::-1].hex() for parent in self.parents[1:]]
+            )
+
+            # all cached by now
+            self.assertEqual(self.decode(), expected)
+            self.getrawtransaction_batch.assert_not_called()
+
+    def test_raw_forms_decode_alike(self):
+        expected = self.decode()
+        raw_block = memoryview(b"".join(tx.serialize() for tx in self.txs))
+        slices, offset = {}, 0
+        for tx_hash, tx in zip(self.txhash_list, self.txs):
+            slices[tx_hash] = raw_block[offset : offset + len(tx.serialize())]
+            offset += len(tx.serialize())
+        for raw_transactions in (
+            {tx_hash: bytes.fromhex(tx_hex) for tx_hash, tx_hex in self.raw_transactions.items()},
+            slices,
+            dict(zip(self.txhash_list, self.txs)),
+        ):
+            with self.subTest(raw_type=type(raw_transactions[self.txhash_list[0]]).__name__):
+                self.assertEqual(self.decode(raw_transactions), expected)
+                for tx_hash, tx in zip(self.txhash_list, self.txs):
+                    self.assertEqual(backend.raw_tx_bytes(raw_transactions[tx_hash]), tx.serialize())
+
+    def test_process_mode_matches_thread_mode(self):
+        with mock.patch.object(config, "TX_DECODE_MODE", "thread"):
+            in_threads = self.decode()
+        with mock.patch.object(config, "TX_DECODE_MODE", "process"), mock.patch.object(config, "TX_DECODE_WORKERS", 2):
+            self.addCleanup(setattr, blocks, "_decode_pool", None)
+            self.addCleanup(lambda: blocks._decode_pool.shutdown())
+            in_processes = self.decode()
+        self.assertEqual(in_processes, in_threads)
+
+
+if __name__ == "__main__":
+    unittest.main()
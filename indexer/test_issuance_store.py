@@ -0,0 +1,47 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import config
+import index_core.util as util
+from index_core.issuance_store import IssuanceStore
+
+
+class TestIssuanceStore(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "cp_issuances.sqlite")
+        patch = mock.patch.object(util, "CP_BLOCK_COUNT", 1000)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_round_trip_of_confirmed_blocks(self):
+        last_confirmed = 1000 - config.REORG_CHECK_DEPTH
+        results = {
+            block_index: {f"tx{block_index}": {"cpid": f"A{block_index}", "quantity": 1}}
+            for block_index in range(last_confirmed - 2, last_confirmed + 3)
+        }
+        results[last_confirmed - 2] = {}  # blocks without stamp issuances are stored too
+        IssuanceStore(self.path).put_many(results)
+
+        reopened = IssuanceStore(self.path)
+        stored = reopened.get_many(list(results))
+        self.assertEqual(
+            stored, {block_index: results[block_index] for block_index in results if block_index <= last_confirmed}
+        )
+        self.assertEqual(reopened.get(last_confirmed), results[last_confirmed])
+        self.assertIsNone(reopened.get(last_confirmed + 1))
+
+    def test_nothing_is_stored_without_the_cp_tip_or_a_path(self):
+        with mock.patch.object(util, "CP_BLOCK_COUNT", None):
+            IssuanceStore(self.path).put(1, {"tx": {}})
+        self.assertIsNone(IssuanceStore(self.path).get(1))
+
+        store = IssuanceStore(None)
+        store.put(1, {"tx": {}})
+        self.assertIsNone(store.get(1))
+        self.assertIsNone(store.conn)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import unittest
+from unittest import mock
+
+from bitcoin.core import CBlock, CMutableTransaction, COutPoint, CTransaction, CTxIn, CTxOut
+from bitcoin.core.script import OP_1, OP_3, OP_CHECKMULTISIG, OP_CHECKSIG, OP_DUP, OP_EQUALVERIFY, OP_HASH160, CScript
+
+import index_core.backend as backend
+import index_core.prefetch as prefetch
+from index_core.prevouts import PrevoutCache
+
+
+def p2pkh_script():
+    return CScript([OP_DUP, OP_HASH160, os.urandom(20), OP_EQUALVERIFY, OP_CHECKSIG])
+
+
+def multisig_script():
+    return CScript([OP_1, b"\x02" + os.urandom(32), b"\x03" + os.urandom(32), b"\x02" + b"\x22" * 32, OP_3, OP_CHECKMULTISIG])
+
+
+def spend(outpoint, outputs):
+    return CTransaction.from_tx(CMutableTransaction([CTxIn(outpoint, CScript([os.urandom(71)]))], outputs))
+
+
+class TestFetchBlock(unittest.TestCase):
+    def setUp(self):
+        cache = mock.patch.object(prefetch, "prevout_cache", PrevoutCache(size=100, path=None))
+        self.cache = cache.start()
+        self.addCleanup(cache.stop)
+
+    def test_parents_are_fetched_in_the_worker(self):
+        earlier_parent = spend(COutPoint(os.urandom(32), 0), [CTxOut(1000, p2pkh_script())])
+        in_block_parent = spend(COutPoint(os.urandom(32), 0), [CTxOut(1000, p2pkh_script())])
+        coinbase = CMutableTransaction([CTxIn(COutPoint(), CScript([b"\x01" * 4]))], [CTxOut(50 * 10**8, p2pkh_script())])
+        stamp_txs = [
+            spend(COutPoint(earlier_parent.GetTxid(), 0), [CTxOut(1000, multisig_script())]),
+            spend(COutPoint(in_block_parent.GetTxid(), 0), [CTxOut(1000, multisig_script())]),
+        ]
+        payment_tx = spend(COutPoint(os.urandom(32), 0), [CTxOut(1000, p2pkh_script())])
+        cblock = CBlock(vtx=[CTransaction.from_tx(coinbase), in_block_parent, *stamp_txs, payment_tx])
+
+        with mock.patch.object(backend, "getblockhash", return_value="00" * 32), mock.patch.object(
+            backend, "getrawblock", return_value=cblock.serialize()
+        ), mock.patch.object(
+            backend, "getrawtransaction_batch", return_value={"parent": earlier_parent.serialize().hex()}
+        ) as batch:
+            block = prefetch.fetch_block(100)
+
+        # the in-block parent comes from the block itself, the payment tx isn't a candidate
+        batch.assert_called_once_with([earlier_parent.GetTxid()[::-1].hex()])
+        self.assertEqual(len(block.txhash_list), 5)
+        for stamp_tx in stamp_txs:
+            self.assertIn((stamp_tx.vin[0].prevout.hash, 0), self.cache)
+        self.assertNotIn((payment_tx.vin[0].prevout.hash, 0), self.cache)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import unittest
+
+import bitcoin as bitcoinlib
+from bitcoin.core import CBlock, CMutableTransaction, COutPoint, CTransaction, CTxIn, CTxInWitness, CTxOut, CTxWitness
+from bitcoin.core.script import (
+    OP_1,
+    OP_3,
+    OP_CHECKMULTISIG,
+    OP_CHECKSIG,
+    OP_DUP,
+    OP_EQUALVERIFY,
+    OP_HASH160,
+    CScript,
+    CScriptWitness,
+)
+
+from index_core.prefilter import scan_block, select_candidates
+
+
+def p2pkh_script():
+    return CScript([OP_DUP, OP_HASH160, os.urandom(20), OP_EQUALVERIFY, OP_CHECKSIG])
+
+
+def multisig_script():
+    return CScript([OP_1, b"\x02" + os.urandom(32), b"\x03" + os.urandom(32), b"\x02" + b"\x22" * 32, OP_3, OP_CHECKMULTISIG])
+
+
+def p2wsh_script():
+    return CScript([0, os.urandom(32)])
+
+
+def make_tx(outputs, segwit=False, num_inputs=1):
+    vin = [CTxIn(COutPoint(os.urandom(32), n), CScript([os.urandom(71)])) for n in range(num_inputs)]
+    vout = [CTxOut(1000, script) for script in outputs]
+    witness = CTxWitness()
+    if segwit:
+        witness = CTxWitness([CTxInWitness(CScriptWitness([os.urandom(72), os.urandom(33)])) for _ in vin])
+    return CTransaction.from_tx(CMutableTransaction(vin, vout, witness=witness))
+
+
+class TestPrefilter(unittest.TestCase):
+    def setUp(self):
+        coinbase = CMutableTransaction([CTxIn(COutPoint(), CScript([b"\x01" * 4]))], [CTxOut(50 * 10**8, multisig_script())])
+        self.multisig_tx = make_tx([p2pkh_script(), multisig_script(), multisig_script()])
+        self.segwit_multisig_tx = make_tx([multisig_script()], segwit=True, num_inputs=3)
+        self.p2wsh_tx = make_tx([p2wsh_script(), p2pkh_script()], segwit=True)
+        self.payment_tx = make_tx([p2pkh_script()] * 300)  # more than 0xfc outputs, exercises the varint prefix
+        self.cblock = CBlock(
+            vtx=[
+                CTransaction.from_tx(coinbase),
+                self.multisig_tx,
+                self.segwit_multisig_tx,
+                self.p2wsh_tx,
+                self.payment_tx,
+            ]
+        )
+        self.scanned_block = scan_block(self.cblock.serialize())
+
+    def test_txids_match_cblock(self):
+        expected = [bitcoinlib.core.b2lx(ctx.GetTxid()) for ctx in self.cblock.vtx]
+        self.assertEqual([scanned_tx.tx_hash for scanned_tx in self.scanned_block.transactions], expected)
+        self.assertEqual(self.scanned_block.header.GetHash(), self.cblock.GetHash())
+
+    def test_slices_deserialize_to_same_tx(self):
+        for scanned_tx, ctx in zip(self.scanned_block.transactions, self.cblock.vtx):
+            raw_tx = self.scanned_block.raw_block[scanned_tx.start : scanned_tx.end]
+            self.assertEqual(raw_tx, ctx.serialize())
+            self.assertEqual(scanned_tx.prevout, (ctx.vin[0].prevout.hash, ctx.vin[0].prevout.n))
+
+    def test_candidates(self):
+        issuance_tx_hash = bitcoinlib.core.b2lx(self.p2wsh_tx.GetTxid())
+        raw_transactions, stats = select_candidates(self.scanned_block, {issuance_tx_hash})
+        expected = {bitcoinlib.core.b2lx(ctx.GetTxid()) for ctx in (self.multisig_tx, self.segwit_multisig_tx, self.p2wsh_tx)}
+        self.assertEqual(set(raw_transactions), expected)
+        self.assertEqual((stats.total, stats.candidates, stats.multisig, stats.p2wsh, stats.issuances), (5, 3, 2, 1, 1))
+        self.assertEqual(bytes(raw_transactions[issuance_tx_hash]), self.p2wsh_tx.serialize())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+
+from bitcoin.core import CMutableTransaction, COutPoint, CTransaction, CTxIn, CTxOut
+from bitcoin.core.script import OP_CHECKSIG, OP_DUP, OP_EQUALVERIFY, OP_HASH160, CScript
+
+from index_core.prevouts import PrevoutCache
+
+
+def transaction(outputs=2):
+    scripts = [CScript([OP_DUP, OP_HASH160, os.urandom(20), OP_EQUALVERIFY, OP_CHECKSIG]) for _ in range(outputs)]
+    return CTransaction.from_tx(
+        CMutableTransaction(
+            [CTxIn(COutPoint(os.urandom(32), 0), CScript([os.urandom(71)]))],
+            [CTxOut(1000, script) for script in scripts],
+        )
+    )
+
+
+class TestPrevoutCache(unittest.TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = os.path.join(tmp_dir.name, "prevouts.msgpack")
+
+    def test_raw_and_deserialized_transactions_give_the_same_entries(self):
+        tx = transaction()
+        from_raw, from_ctx = PrevoutCache(size=10, path=None), PrevoutCache(size=10, path=None)
+        from_raw.add_transaction(tx.GetTxid(), tx.serialize())
+        from_ctx.add_ctx(tx)
+        for n, vout in enumerate(tx.vout):
+            self.assertEqual(from_raw.get((tx.GetTxid(), n)), [bytes(vout.scriptPubKey), None])
+            self.assertEqual(from_ctx.get((tx.GetTxid(), n)), [bytes(vout.scriptPubKey), None])
+        self.assertIsNone(from_raw.get((tx.GetTxid(), 2)))
+        self.assertEqual(from_raw.stats(), {"size": 2, "hits": 2, "misses": 1})
+
+    def test_recently_used_entries_are_kept(self):
+        cache = PrevoutCache(size=4, path=None)
+        txs = [transaction() for _ in range(3)]
+        cache.add_ctx(txs[0])
+        cache.add_ctx(txs[1])
+        cache.get((txs[0].GetTxid(), 1))
+        cache.add_ctx(txs[2])
+        self.assertEqual(
+            [prevout in cache for prevout in ((txs[0].GetTxid(), 0), (txs[0].GetTxid(), 1), (txs[1].GetTxid(), 0))],
+            [False, True, False],
+        )
+
+    def test_saved_entries_and_addresses_are_loaded(self):
+        cache = PrevoutCache(size=10, path=self.path)
+        txs = [transaction() for _ in range(3)]
+        for tx in txs:
+            cache.add_ctx(tx)
+        cache.set_address(cache.get((txs[2].GetTxid(), 0)), "bc1qsource")
+        cache.save()
+
+        # a smaller cache keeps the newest entries
+        loaded = PrevoutCache(size=3, path=self.path)
+        loaded.load()
+        self.assertEqual(len(loaded.cache), 3)
+        self.assertNotIn((txs[1].GetTxid(), 0), loaded)
+        self.assertEqual(loaded.get((txs[2].GetTxid(), 0)), [bytes(txs[2].vout[0].scriptPubKey), "bc1qsource"])
+        self.assertEqual(loaded.get((txs[1].GetTxid(), 1)), cache.get((txs[1].GetTxid(), 1)))
+
+    def test_unreadable_file_is_ignored(self):
+        with open(self.path, "wb") as f:
+            f.write(b"\xc1not msgpack")
+        cache = PrevoutCache(size=10, path=self.path)
+        cache.load()
+        self.assertEqual(len(cache.cache), 0)
+        PrevoutCache(size=10, path=os.path.join(os.path.dirname(self.path), "missing")).load()
+
+
+if __name__ == "__main__":
+    unittest.main()
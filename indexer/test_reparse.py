@@ -0,0 +1,78 @@
+import unittest
+from decimal import Decimal as D
+from unittest import mock
+
+import config
+import index_core.blocks as blocks
+import index_core.check as check
+import index_core.database as database
+from index_core.balance_engine import balance_engine
+from index_core.exceptions import DatabaseError
+from tests.parsed_blocks import BLOCKS, FIRST_BLOCK, parse_blocks
+from tests.sqlite_db import SqliteDB
+
+TABLES = {
+    "blocks": ("block_index", "*"),
+    "transactions": ("tx_index", "*"),
+    "StampTableV4": ("stamp", "*"),
+    "SRC20": ("id", "*"),
+    "SRC20Valid": ("id", "*"),
+    # the balances rebuilt before the reparsed blocks keep the block_time of their last change, not of their first one
+    "balances": ("id", "id, address, p, tick, tick_hash, amt, locked_amt, last_update"),
+    # and the seq of the reparsed journal entries isn't reused
+    "undo_journal": ("seq", "block_index, table_name, row_id, tick, tick_hash, address, amt, last_update"),
+}
+
+
+class TestReparse(unittest.TestCase):
+    def setUp(self):
+        database.reset_all_caches()
+        balance_engine.invalidate()
+        self.addCleanup(balance_engine.invalidate)
+        for patcher in (
+            mock.patch.object(config, "BLOCK_FIRST", FIRST_BLOCK - 1),
+            mock.patch.object(blocks, "validate_src20_ledger_hash"),
+            mock.patch("index_core.files.store_files_to_disk"),
+            # the database is created from the current table_schema.sql
+            mock.patch.object(database, "upgrade_schema"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.db = SqliteDB()
+        database.insert_block(self.db, FIRST_BLOCK - 1, "hash0", 1700000000, None, 1, "a" * 64, "b" * 64, "c" * 64, 1)
+        self.db.commit()
+        check.hash_chain.seed(self.db, FIRST_BLOCK)
+        parse_blocks(self.db, BLOCKS)
+        self.parsed = self.dump()
+
+    def dump(self):
+        return {table: self.db.dump(table, order_by, columns) for table, (order_by, columns) in TABLES.items()}
+
+    def test_parsed_blocks(self):
+        self.assertEqual(len(self.parsed["transactions"]), 9)
+        self.assertEqual(len(self.parsed["SRC20Valid"]), 7)
+        self.assertEqual(
+            self.db.dump("balances", "id", "id, amt", "amt <> 0"),
+            [("kevin_bc1qalice", D("1350.25")), ("kevin_bc1qcarol", D("250.25")), ("stamp_bc1qcarol", D("100"))],
+        )
+
+    def test_reparse_gives_the_same_hashes_and_ledger(self):
+        for block_index in (FIRST_BLOCK, FIRST_BLOCK + 2, FIRST_BLOCK + len(BLOCKS) - 1):
+            with self.subTest(block_index=block_index):
+                blocks.reparse(self.db, block_index)
+                self.assertEqual(self.dump(), self.parsed)
+
+    def test_interrupted_reparse(self):
+        database.reset_parsed_blocks(self.db, FIRST_BLOCK + 1)
+        with mock.patch.object(check, "cp_version"), self.assertRaisesRegex(DatabaseError, "run `reparse`"):
+            blocks.follow(self.db)
+
+        # resumes from the first block left without hashes
+        with mock.patch.object(blocks, "reinitialize", wraps=blocks.reinitialize) as reinitialize:
+            blocks.reparse(self.db)
+        reinitialize.assert_called_once_with(self.db, FIRST_BLOCK + 1)
+        self.assertEqual(self.dump(), self.parsed)
+
+
+if __name__ == "__main__":
+    unittest.main()
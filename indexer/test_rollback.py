@@ -0,0 +1,155 @@
+import random
+import unittest
+from decimal import Decimal as D
+from unittest import mock
+
+import config
+import index_core.database as database
+import index_core.src20 as src20
+from index_core.balance_engine import balance_engine
+from tests.sqlite_db import SqliteDB
+
+FIRST_BLOCK = 800001
+TICKS = ["kevin", "stamp"]
+ADDRESSES = [f"bc1qaddress{n}" for n in range(5)]
+# the rebuilt balances keep the block_time of their last change, not of their first one
+BALANCE_COLUMNS = "id, address, p, tick, tick_hash, amt, locked_amt, last_update"
+TABLES = {
+    "blocks": "block_index",
+    "SRC20": "id",
+    "SRC20Valid": "id",
+    "balances": "id",
+    "undo_journal": "seq",
+}
+
+
+def random_blocks(seed, count):
+    """The valid SRC-20 operations of `count` blocks, some of them emptying balances."""
+    rng = random.Random(seed)
+    reference = {}
+    blocks = []
+    tx_index = 0
+    for block_index in range(FIRST_BLOCK, FIRST_BLOCK + count):
+        processed = []
+        for _ in range(rng.randrange(0, 5)):
+            tick = rng.choice(TICKS)
+            creator, destination = rng.sample(ADDRESSES, 2)
+            balance = reference.get((tick, creator), 0)
+            if balance and rng.random() < 0.5:
+                op = "TRANSFER"
+                amt = balance if rng.random() < 0.3 else (balance / 3).quantize(D("1e-18"))
+                reference[(tick, creator)] = balance - amt
+            else:
+                op = "MINT"
+                amt = D(rng.randrange(1, 10**6)) / 10 ** rng.randrange(0, 9)
+            reference[(tick, destination)] = reference.get((tick, destination), 0) + amt
+            processed.append(
+                {
+                    "tx_hash": f"tx{tx_index}",
+                    "tx_index": tx_index,
+                    "block_index": block_index,
+                    "block_time": 1700000000 + block_index,
+                    "p": "SRC-20",
+                    "op": op,
+                    "tick": tick,
+                    "tick_hash": f"{tick}_hash",
+                    "amt": amt,
+                    "creator": creator,
+                    "destination": destination,
+                    "valid": 1,
+                }
+            )
+            tx_index += 1
+        blocks.append(processed)
+    return blocks
+
+
+def parse_blocks(db, blocks):
+    """Write the blocks the way blocks.follow does, one transaction each."""
+    balance_engine.invalidate()  # loaded from this database
+    for processed in blocks:
+        block_index = FIRST_BLOCK + len(db.dump("blocks", "block_index"))
+        block_time = 1700000000 + block_index
+        src20.update_src20_balances(db, block_index, block_time, [dict(src20_dict) for src20_dict in processed])
+        if block_index % 5 == 0:
+            src20.clear_zero_balances(db, block_index)
+        batch = database.BlockWriteBatch(block_index, f"hash{block_index}", block_time, f"hash{block_index - 1}", 1)
+        batch.src20.extend(processed)
+        batch.flush(db)
+        database.journal_block(db, block_index)
+        db.commit()
+
+
+class TestRollback(unittest.TestCase):
+    def setUp(self):
+        balance_engine.invalidate()
+        self.addCleanup(balance_engine.invalidate)
+        self.blocks = random_blocks(16, 30)
+
+    def assertSameTables(self, db, expected_db, tables=TABLES):
+        for table, order_by in tables.items():
+            self.assertEqual(db.dump(table, order_by), expected_db.dump(table, order_by), table)
+
+    def assertSameRebuiltBalances(self, db, rebuilt_db):
+        self.assertSameTables(db, rebuilt_db, {"SRC20": "id", "SRC20Valid": "id", "blocks": "block_index"})
+        # the rebuild also keeps the emptied balances that the blocks deleted
+        self.assertEqual(
+            db.dump("balances", "id", BALANCE_COLUMNS, "amt <> 0"),
+            rebuilt_db.dump("balances", "id", BALANCE_COLUMNS, "amt <> 0"),
+        )
+
+    def test_undo_matches_never_parsing_the_blocks(self):
+        for enabled in (False, True):
+            for count in (1, 7, 30):
+                with self.subTest(balance_engine=enabled, blocks=count), mock.patch.object(balance_engine, "enabled", enabled):
+                    db = SqliteDB()
+                    parse_blocks(db, self.blocks)
+                    with mock.patch.object(database, "rebuild_balances") as rebuild_balances:
+                        database.rollback_blocks(db, FIRST_BLOCK + 30 - count)
+                    rebuild_balances.assert_not_called()
+
+                    expected_db = SqliteDB()
+                    parse_blocks(expected_db, self.blocks[: 30 - count])
+                    # the journal seq of the rolled back blocks isn't reused
+                    self.assertSameTables(
+                        db, expected_db, {table: TABLES[table] for table in TABLES if table != "undo_journal"}
+                    )
+
+                    # parsing the blocks again gives the same balances
+                    parse_blocks(db, self.blocks[30 - count :])
+                    full_db = SqliteDB()
+                    parse_blocks(full_db, self.blocks)
+                    self.assertSameTables(db, full_db, {"balances": "id", "SRC20Valid": "id"})
+
+    def test_undo_matches_a_full_rebuild(self):
+        db, rebuilt_db = SqliteDB(), SqliteDB()
+        parse_blocks(db, self.blocks)
+        parse_blocks(rebuilt_db, self.blocks)
+        database.rollback_blocks(db, FIRST_BLOCK + 20)
+        database.purge_block_db(rebuilt_db, FIRST_BLOCK + 20)
+        database.rebuild_balances(rebuilt_db)
+        self.assertSameRebuiltBalances(db, rebuilt_db)
+
+    def test_blocks_missing_from_the_journal_are_rebuilt(self):
+        expected_db = SqliteDB()
+        parse_blocks(expected_db, self.blocks[:20])
+        database.rebuild_balances(expected_db)
+
+        with mock.patch.object(config, "BLOCK_UNDO_DEPTH", 5):
+            db = SqliteDB()
+            parse_blocks(db, self.blocks)
+            self.assertFalse(database.undo_blocks(db, FIRST_BLOCK + 20))
+            database.rollback_blocks(db, FIRST_BLOCK + 20)
+        self.assertSameRebuiltBalances(db, expected_db)
+
+        db = SqliteDB()
+        parse_blocks(db, self.blocks)
+        with db.cursor() as cursor:
+            cursor.execute("DELETE FROM undo_journal WHERE table_name = 'blocks' AND block_index = %s", (FIRST_BLOCK + 25,))
+        balances = db.dump("balances", "id")
+        self.assertFalse(database.undo_blocks(db, FIRST_BLOCK + 20))
+        self.assertEqual(db.dump("balances", "id"), balances)
+
+
+if __name__ == "__main__":
+    unittest.main()
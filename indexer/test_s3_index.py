@@ -0,0 +1,36 @@
+import random
+import unittest
+
+from index_core.s3_index import S3ObjectIndex
+
+
+def random_entry(rng, tx_hashes):
+    key = f"stamps/{rng.choice(tx_hashes)}.{rng.choice(['png', 'svg', 'html'])}"
+    if rng.random() < 0.05:
+        key = f"stamps/{rng.choice(['src20', 'STAMP', 'x'])}_{rng.randrange(10)}.svg"
+    md5 = rng.randbytes(16).hex()
+    if rng.random() < 0.05:
+        md5 = f"{md5}-{rng.randrange(2, 9)}"  # multipart ETag
+    return key, md5
+
+
+class TestS3ObjectIndex(unittest.TestCase):
+    def test_matches_dict(self):
+        rng = random.Random(25)
+        tx_hashes = [rng.randbytes(32).hex() for _ in range(300)]
+        items = [random_entry(rng, tx_hashes) for _ in range(200)]
+        index, reference = S3ObjectIndex.from_items(items, prefix="stamps/", merge_size=16), dict(items)
+        for _ in range(1000):
+            key, md5 = random_entry(rng, tx_hashes)
+            index[key] = md5
+            reference[key] = md5
+            probe = random_entry(rng, tx_hashes)[0]
+            self.assertEqual(index.get(probe), reference.get(probe))
+        self.assertTrue(all(index.get(key) == md5 for key, md5 in reference.items()))
+        self.assertEqual(len(index), len(reference))
+        self.assertNotIn("stamps/" + "0" * 64 + ".png", index)
+        self.assertNotIn("other/" + tx_hashes[0] + ".png", index)
+
+
+if __name__ == "__main__":
+    unittest.main()
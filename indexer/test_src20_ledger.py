@@ -0,0 +1,100 @@
+import random
+import unittest
+from decimal import Decimal as D
+
+from index_core.src20 import Src20BlockLedger
+
+
+def scan_running_balances(processed, tick, tick_hash, addresses):
+    """The block scan Src20BlockLedger replaces, kept as the reference."""
+    found = []
+    for prior_tx in reversed(processed):
+        if prior_tx.get("valid") == 1:
+            for address in addresses:
+                total_balance = None
+                if (
+                    prior_tx["creator"] == address
+                    and prior_tx["tick"] == tick
+                    and prior_tx["tick_hash"] == tick_hash
+                    and "total_balance_creator" in prior_tx
+                ):
+                    total_balance = prior_tx["total_balance_creator"]
+                elif (
+                    prior_tx["destination"] == address
+                    and prior_tx["tick"] == tick
+                    and prior_tx["tick_hash"] == tick_hash
+                    and "total_balance_destination" in prior_tx
+                ):
+                    total_balance = prior_tx["total_balance_destination"]
+                if total_balance is not None:
+                    found.append((address, total_balance))
+                    addresses.remove(address)
+    return found
+
+
+def scan_mint_total(processed, tick):
+    for item in reversed(processed):
+        if item["tick"] == tick and item["op"] == "MINT" and "total_minted" in item:
+            return item["total_minted"]
+    return 0
+
+
+def scan_deploy(processed, tick):
+    for item in processed:
+        if item.get("tick") == tick and item.get("op") == "DEPLOY" and item.get("valid") == 1:
+            return item.get("lim"), item.get("max"), item.get("dec")
+    return None, None, None
+
+
+def random_op(rng, ticks, addresses, n):
+    op = rng.choice(["DEPLOY", "MINT", "TRANSFER"])
+    tick = rng.choice(ticks)
+    src20_dict = {
+        "tick": tick,
+        "tick_hash": f"{tick}_hash",
+        "op": op,
+        "creator": rng.choice(addresses),
+        "destination": rng.choice(addresses),
+        "status": None,
+    }
+    if rng.random() < 0.8:
+        src20_dict["valid"] = 1
+        if op == "DEPLOY":
+            src20_dict.update({"lim": D(n), "max": D(n * 10), "dec": 18})
+        elif op == "MINT":
+            src20_dict.update({"total_minted": D(n), "total_balance_destination": D(n)})
+        else:
+            src20_dict.update({"total_balance_creator": D(n), "total_balance_destination": D(n + 1)})
+    return src20_dict
+
+
+class TestSrc20BlockLedger(unittest.TestCase):
+    def test_lookups_match_block_scan(self):
+        rng = random.Random(20)
+        ticks = ["stamp", "kevin", "pepe"]
+        addresses = [f"bc1q{i}" for i in range(6)]
+        for _ in range(50):
+            ledger, processed = Src20BlockLedger(), []
+            for n in range(rng.randrange(1, 60)):
+                src20_dict = random_op(rng, ticks, addresses, n)
+                ledger.append(src20_dict)
+                processed.append(src20_dict)
+                if "valid" not in src20_dict and rng.random() < 0.5:  # invalid ops get appended twice
+                    ledger.append(src20_dict)
+                    processed.append(src20_dict)
+
+                tick = rng.choice(ticks)
+                query = rng.sample(addresses, rng.randrange(1, 4))
+                expected_remaining, remaining = list(query), list(query)
+                self.assertEqual(
+                    ledger.get_running_balances(tick, f"{tick}_hash", remaining),
+                    scan_running_balances(processed, tick, f"{tick}_hash", expected_remaining),
+                )
+                self.assertEqual(remaining, expected_remaining)
+                self.assertEqual(ledger.get_mint_total(tick), scan_mint_total(processed, tick))
+                self.assertEqual(ledger.get_deploy(tick), scan_deploy(processed, tick))
+            self.assertEqual(str(ledger), str(processed))
+
+
+if __name__ == "__main__":
+    unittest.main()
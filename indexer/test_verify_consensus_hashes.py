@@ -0,0 +1,70 @@
+import unittest
+from unittest import mock
+
+import config
+import index_core.blocks as blocks
+import index_core.check as check
+import index_core.database as database
+from index_core.balance_engine import balance_engine
+from tests.parsed_blocks import BLOCKS, FIRST_BLOCK, parse_blocks
+from tests.sqlite_db import SqliteDB
+from tools import verify_consensus_hashes
+
+LAST_BLOCK = FIRST_BLOCK + len(BLOCKS) - 1
+
+
+class TestVerifySegment(unittest.TestCase):
+    def setUp(self):
+        database.reset_all_caches()
+        balance_engine.invalidate()
+        self.addCleanup(balance_engine.invalidate)
+        self.db = SqliteDB()
+        for patcher in (
+            mock.patch.object(config, "BLOCK_FIRST", FIRST_BLOCK - 1),
+            mock.patch.object(blocks, "validate_src20_ledger_hash"),
+            mock.patch("index_core.files.store_files_to_disk"),
+            mock.patch.object(verify_consensus_hashes, "connect", return_value=self.db),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        database.insert_block(self.db, FIRST_BLOCK - 1, "hash0", 1700000000, None, 1, "a" * 64, "b" * 64, "c" * 64, 1)
+        self.db.commit()
+        check.hash_chain.seed(self.db, FIRST_BLOCK)
+        parse_blocks(self.db, BLOCKS)
+
+    def verify_segment(self, first, last):
+        # the segment closes its connections, all of them this database
+        with mock.patch.object(self.db, "close"):
+            return verify_consensus_hashes.verify_segment(first, last)
+
+    def test_parsed_blocks_verify(self):
+        for first in (FIRST_BLOCK, FIRST_BLOCK + 2, LAST_BLOCK):
+            with self.subTest(first=first):
+                self.assertEqual(
+                    self.verify_segment(first, LAST_BLOCK),
+                    verify_consensus_hashes.SegmentResult(first, LAST_BLOCK, LAST_BLOCK - first + 1, [], []),
+                )
+
+    def test_mismatches_point_at_their_block(self):
+        with self.db.cursor() as cursor:
+            cursor.execute(
+                "UPDATE SRC20Valid SET destination_bal = destination_bal + 1 WHERE block_index = %s", (FIRST_BLOCK + 1,)
+            )
+            cursor.execute("UPDATE StampTableV4 SET cpid = 'A1' WHERE block_index = %s", (FIRST_BLOCK + 3,))
+        result = self.verify_segment(FIRST_BLOCK, LAST_BLOCK)
+        self.assertEqual(
+            [(mismatch.block_index, mismatch.field) for mismatch in result.mismatches],
+            [(FIRST_BLOCK + 1, "ledger_hash"), (FIRST_BLOCK + 3, "txlist_hash")],
+        )
+
+    def test_blocks_without_stored_balances_are_unverifiable(self):
+        with self.db.cursor() as cursor:
+            cursor.execute(
+                "UPDATE SRC20Valid SET creator_bal = NULL WHERE block_index = %s AND op = 'TRANSFER'", (LAST_BLOCK,)
+            )
+        result = self.verify_segment(FIRST_BLOCK, LAST_BLOCK)
+        self.assertEqual((result.mismatches, result.unverifiable), ([], [LAST_BLOCK]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import concurrent.futures
+import json
+import unittest
+from unittest import mock
+
+import index_core.util as util
+import index_core.xcprequest as xcprequest
+from index_core.issuance_store import IssuanceStore
+from index_core.xcprequest import IssuancePrefetcher
+
+
+def fake_block_data(block_index, indicator=None):
+    return {f"tx{block_index}": {"block_index": block_index}}
+
+
+class TestIssuancePrefetcher(unittest.TestCase):
+    def setUp(self):
+        patches = [
+            mock.patch.object(xcprequest, "_multi_block_supported", False),
+            mock.patch.object(xcprequest, "get_xcp_block_data", side_effect=fake_block_data),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.prefetcher = IssuancePrefetcher(window=4, workers=2)
+        self.addCleanup(self.prefetcher.shutdown)
+
+    def test_following_the_tip_does_not_restart(self):
+        with mock.patch.object(self.prefetcher, "reset", wraps=self.prefetcher.reset) as reset:
+            for block_index in range(100, 110):
+                self.assertEqual(self.prefetcher.get(block_index, block_index), fake_block_data(block_index))
+            self.assertEqual(reset.call_count, 1)  # the first block starts the window
+
+            self.assertEqual(self.prefetcher.get(105, 109), fake_block_data(105))  # rollback
+            self.assertEqual(reset.call_count, 2)
+        self.assertEqual(self.prefetcher.get(106, 109), fake_block_data(106))
+
+    def test_catch_up_is_fetched_ahead(self):
+        self.assertEqual(self.prefetcher.get(10, 20), fake_block_data(10))
+        concurrent.futures.wait([future for _, _, future in self.prefetcher.pending])
+        self.assertEqual(self.prefetcher.ahead, 3)  # the window counts the block handed out
+        for block_index in range(11, 15):
+            self.assertEqual(self.prefetcher.get(block_index, 20), fake_block_data(block_index))
+
+
+def cp_issuance(block_index, message_index, tx_hash, description="stamp:aGVsbG8=", status="valid"):
+    bindings = {
+        "asset": f"A{message_index}",
+        "quantity": 1,
+        "divisible": False,
+        "locked": True,
+        "source": "bc1qsource",
+        "issuer": "bc1qsource",
+        "transfer": False,
+        "description": description,
+        "reset": False,
+        "status": status,
+        "tx_hash": tx_hash,
+    }
+    return {
+        "command": "insert",
+        "category": "issuances",
+        "message_index": message_index,
+        "block_index": block_index,
+        "bindings": json.dumps(bindings),
+    }
+
+
+def cp_block(block_index):
+    """A get_blocks result with a stamp issuance, one CP reported twice and issuances that aren't stamps."""
+    return {
+        "block_index": block_index,
+        "_messages": [
+            cp_issuance(block_index, 1, f"tx{block_index}a"),
+            cp_issuance(block_index, 2, f"tx{block_index}b", description="not an image"),
+            cp_issuance(block_index, 3, f"tx{block_index}c", status="invalid: bad asset"),
+            cp_issuance(block_index, 4, f"tx{block_index}d"),
+            cp_issuance(block_index, 5, f"tx{block_index}a", description="stamp:d29ybGQ="),
+        ],
+    }
+
+
+class TestXcpBlocksData(unittest.TestCase):
+    def setUp(self):
+        patches = [
+            mock.patch.object(xcprequest, "issuance_store", IssuanceStore(None)),
+            mock.patch.object(util, "CP_BLOCK_COUNT", 1000),
+            mock.patch.object(xcprequest, "_get_block", side_effect=lambda params: [cp_block(*params["block_indexes"])]),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_issuances_are_keyed_by_tx_hash(self):
+        issuances = xcprequest.get_xcp_block_data(100)
+        self.assertEqual(list(issuances), ["tx100a", "tx100d"])
+        # the first issuance of a transaction is kept
+        self.assertEqual(issuances["tx100a"]["message_index"], 1)
+        self.assertIs(xcprequest.filter_issuances_by_tx_hash(issuances, "tx100d"), issuances["tx100d"])
+        self.assertIsNone(xcprequest.filter_issuances_by_tx_hash(issuances, "tx100b"))
+
+    def test_blocks_are_fetched_in_one_call(self):
+        with mock.patch.object(
+            xcprequest, "_get_blocks", side_effect=lambda params: [cp_block(block) for block in params["block_indexes"]]
+        ) as get_blocks, mock.patch.object(xcprequest, "get_xcp_block_data") as get_xcp_block_data:
+            results = xcprequest.get_xcp_blocks_data([100, 101, 102])
+        get_blocks.assert_called_once_with(params={"block_indexes": [100, 101, 102]})
+        get_xcp_block_data.assert_not_called()
+        self.assertEqual(results, {block: xcprequest.get_xcp_block_data(block) for block in (100, 101, 102)})
+
+    def test_missing_blocks_are_fetched_one_at_a_time(self):
+        expected = {block: xcprequest.get_xcp_block_data(block) for block in (100, 101, 102)}
+        for response in ([cp_block(100), cp_block(102)], [{"block_index": 100}], None):
+            with self.subTest(response=response), mock.patch.object(xcprequest, "_get_blocks", return_value=response):
+                self.assertEqual(xcprequest.get_xcp_blocks_data([100, 101, 102]), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
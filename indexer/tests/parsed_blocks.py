@@ -0,0 +1,64 @@
+"""SRC-20 blocks parsed and committed the way `blocks.follow` does, for the tests that check what parsing them stores."""
+
+import json
+
+import index_core.blocks as blocks
+import index_core.database as database
+
+FIRST_BLOCK = 800001
+
+BLOCKS = [
+    [
+        ("bc1qdeployer", {"p": "src-20", "op": "deploy", "tick": "kevin", "max": "10000", "lim": "1000"}),
+        ("bc1qalice", {"p": "src-20", "op": "mint", "tick": "kevin", "amt": "1000"}),
+    ],
+    [
+        ("bc1qbob", {"p": "src-20", "op": "mint", "tick": "kevin", "amt": "600.5"}),
+        ("bc1qbob", {"p": "src-20", "op": "mint", "tick": "stamp", "amt": "1"}),  # not deployed yet
+    ],
+    [],
+    [
+        ("bc1qalice", {"p": "src-20", "op": "transfer", "tick": "kevin", "amt": "250.25"}, "bc1qcarol"),
+        ("bc1qcarol", {"p": "src-20", "op": "transfer", "tick": "stamp", "amt": "1"}, "bc1qalice"),  # no balance
+        ("bc1qdeployer", {"p": "src-20", "op": "deploy", "tick": "stamp", "max": "100", "lim": "100"}),
+    ],
+    [
+        ("bc1qcarol", {"p": "src-20", "op": "mint", "tick": "stamp", "amt": "100"}),
+        ("bc1qbob", {"p": "src-20", "op": "transfer", "tick": "kevin", "amt": "600.5"}, "bc1qalice"),  # empties it
+    ],
+]
+
+
+def parse_blocks(db, blocks_txs):
+    """Parse and commit the blocks the way `blocks.follow` does, from their transaction results."""
+    tx_index = 0
+    for block_index, txs in enumerate(blocks_txs, FIRST_BLOCK):
+        block_time = 1700000000 + block_index
+        tx_results = []
+        for source, payload, *destination in txs:
+            tx_results.append(
+                blocks.TxResult(
+                    tx_index=tx_index,
+                    source=source,
+                    destination=destination[0] if destination else source,
+                    btc_amount=546,
+                    fee=1000,
+                    data=json.dumps(payload).encode(),
+                    decoded_tx=None,
+                    keyburn=1,
+                    is_op_return=False,
+                    tx_hash=f"{tx_index:064x}",
+                    block_index=block_index,
+                    block_hash=f"hash{block_index}",
+                    block_time=block_time,
+                    p2wsh_data=None,
+                )
+            )
+            tx_index += 1
+        blocks.util.CURRENT_BLOCK_INDEX = block_index
+        batch = database.BlockWriteBatch(block_index, f"hash{block_index}", block_time, f"hash{block_index - 1}", 1)
+        block_processor = blocks.BlockProcessor(db, batch)
+        block_processor.insert_transactions(tx_results)
+        block_processor.process_transaction_results(tx_results)
+        block_processor.finalize_block(block_index, block_time, [tx.tx_hash for tx in tx_results])
+        blocks.commit_and_update_block(db, block_index, batch)
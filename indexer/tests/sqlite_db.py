@@ -0,0 +1,221 @@
+"""
+An in-memory SQLite database behind the subset of the pymysql connection API
+the indexer uses, with the tables of table_schema.sql, so that the database
+code can be tested without a MySQL server.
+
+The MySQL dialect of the schema and of the queries is translated on the fly.
+DECIMAL columns keep their exact values as text, compared as numbers, the
+default collation of the text columns is case insensitive and utf8mb4_bin
+pads with spaces, like MySQL's.
+"""
+
+import re
+import sqlite3
+from datetime import datetime, timezone
+from decimal import ROUND_HALF_UP
+from decimal import Decimal as D
+from pathlib import Path
+
+import pymysql
+
+AMT_QUANTUM = D("1e-18")
+SCHEMA_PATH = Path(__file__).resolve().parent.parent / "table_schema.sql"
+
+
+def _compare(a, b):
+    return (a > b) - (a < b)
+
+
+def _collate_bin(a, b):
+    # utf8mb4_bin is a PAD SPACE collation, the shorter string is compared as if padded with spaces
+    a, b = a.encode("utf-8"), b.encode("utf-8")
+    length = max(len(a), len(b))
+    return _compare(a.ljust(length, b" "), b.ljust(length, b" "))
+
+
+def _collate_ci(a, b):
+    return _compare(a.lower(), b.lower())
+
+
+def _collate_decimal(a, b):
+    return _compare(D(a), D(b))
+
+
+def _from_unixtime(value):
+    if value is None:
+        return None
+    return datetime.fromtimestamp(int(value), tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _unix_timestamp(value):
+    if value is None:
+        return None
+    return int(datetime.strptime(value, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc).timestamp())
+
+
+def _dec_add(a, b):
+    if a is None or b is None:
+        return None
+    return str(D(a) + D(b))
+
+
+def _substring_index(value, delimiter, count):
+    if value is None:
+        return None
+    parts = value.split(delimiter)
+    return delimiter.join(parts[:count] if count >= 0 else parts[count:])
+
+
+def _adapt_datetime(value):
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+
+sqlite3.register_adapter(D, str)
+sqlite3.register_adapter(datetime, _adapt_datetime)
+# DECIMAL(38,18) values are read back with their 18 decimals
+sqlite3.register_converter("DECTEXT", lambda value: D(value.decode()).quantize(AMT_QUANTUM, rounding=ROUND_HALF_UP))
+sqlite3.register_converter("DATETIME", lambda value: datetime.strptime(value.decode(), "%Y-%m-%d %H:%M:%S"))
+
+
+def translate_schema(schema):
+    """Return the CREATE TABLE statements of a MySQL schema in the SQLite dialect."""
+    statements = []
+    for statement in schema.split(";"):
+        statement = "\n".join(line for line in statement.splitlines() if not line.strip().startswith("--"))
+        match = re.search(r"CREATE TABLE IF NOT EXISTS\s+(\S+)\s*\((.*)\)", statement, re.S)
+        if match is None:
+            continue
+        table, body = match.groups()
+        items = []
+        for item in body.splitlines():
+            item = item.strip().rstrip(",")
+            if not item or re.match(r"(INDEX|index|FOREIGN KEY|CONSTRAINT)\b", item):
+                continue
+            if re.match(r"PRIMARY KEY \(`seq`\)", item):
+                continue
+            item = re.sub(r"^UNIQUE (KEY )?`\w+` ", "UNIQUE ", item)
+            item = re.sub(r"BIGINT NOT NULL AUTO_INCREMENT", "INTEGER PRIMARY KEY AUTOINCREMENT", item)
+            item = re.sub(r"decimal\(\d+,\d+\)", "DECTEXT COLLATE DECIMAL", item, flags=re.I)
+            item = re.sub(r"\bjson\b", "TEXT", item)
+            if re.match(r"`\w+` (varchar|text|mediumtext)", item, re.I) and "COLLATE" not in item:
+                item += " COLLATE utf8mb4_0900_as_ci"
+            items.append(item)
+        statements.append(f"CREATE TABLE {table} (\n  " + ",\n  ".join(items) + "\n)")
+    return statements
+
+
+def translate_query(query, params):
+    """Return a MySQL query and its pymysql parameters in the SQLite dialect."""
+    query = query.replace("INSERT IGNORE", "INSERT OR IGNORE")
+    match = re.search(r"DELETE\s+(\w+)\s+FROM\s+(\w+)\s+(JOIN.*)", query, re.S)
+    if match is not None:
+        table, _, rest = match.groups()
+        query = f"DELETE FROM {table} WHERE rowid IN (SELECT {table}.rowid FROM {table} {rest})"
+    head, duplicate, update = query.partition("ON DUPLICATE KEY UPDATE")
+    if duplicate:
+        update = re.sub(r"(\w+)\s*\+\s*VALUES\((\w+)\)", r"DEC_ADD(\1, excluded.\2)", update)
+        update = re.sub(r"VALUES\((\w+)\)", r"excluded.\1", update)
+        query = f"{head}ON CONFLICT DO UPDATE SET {update}"
+    if params is None:
+        return query, ()
+    if isinstance(params, dict):
+        raise NotImplementedError("named parameters")
+    params = list(params)
+    parts = re.split(r"(%s|%%)", query)
+    translated, values = [], []
+    for part in parts:
+        if part == "%%":
+            translated.append("%")
+        elif part == "%s":
+            value = params.pop(0)
+            if isinstance(value, (list, tuple)) and re.search(r"IN\s*$", translated[-1], re.I):
+                translated.append("(" + ", ".join(["?"] * len(value)) + ")")
+                values.extend(value)
+            else:
+                translated.append("?")
+                values.append(value)
+        else:
+            translated.append(part)
+    return "".join(translated), values
+
+
+class Cursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.cursor = connection.conn.cursor()
+        self.rowcount = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def execute(self, query, params=None):
+        query, values = translate_query(query, params)
+        try:
+            self.cursor.execute(query, values)
+        except sqlite3.IntegrityError as e:
+            raise pymysql.IntegrityError(str(e)) from e
+        self.rowcount = self.cursor.rowcount
+        return self.rowcount
+
+    def executemany(self, query, params):
+        rowcount = 0
+        for row in params:
+            rowcount += self.execute(query, row)
+        self.rowcount = rowcount
+        return rowcount
+
+    def fetchone(self):
+        return self.cursor.fetchone()
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def close(self):
+        self.cursor.close()
+
+
+class SqliteDB:
+    """A pymysql like connection to an in-memory database with the tables of table_schema.sql."""
+
+    def __init__(self, schema_path=SCHEMA_PATH):
+        self.conn = sqlite3.connect(":memory:", detect_types=sqlite3.PARSE_DECLTYPES)
+        self.conn.create_collation("utf8mb4_bin", _collate_bin)
+        self.conn.create_collation("utf8mb4_0900_as_ci", _collate_ci)
+        self.conn.create_collation("DECIMAL", _collate_decimal)
+        self.conn.create_function("FROM_UNIXTIME", 1, _from_unixtime)
+        self.conn.create_function("UNIX_TIMESTAMP", 1, _unix_timestamp)
+        self.conn.create_function("DEC_ADD", 2, _dec_add)
+        self.conn.create_function("SUBSTRING_INDEX", 3, _substring_index)
+        for statement in translate_schema(Path(schema_path).read_text()):
+            self.conn.execute(statement)
+
+    def cursor(self, cursor_class=None):
+        return Cursor(self)
+
+    def begin(self):
+        if not self.conn.in_transaction:
+            self.conn.execute("BEGIN")
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def ping(self, reconnect=True):
+        pass
+
+    def close(self):
+        self.conn.close()
+
+    def dump(self, table, order_by, columns="*", where="1"):
+        """Return the rows of a table, for comparing database states in tests."""
+        return self.conn.execute(f"SELECT {columns} FROM {table} WHERE {where} ORDER BY {order_by}").fetchall()  # nosec
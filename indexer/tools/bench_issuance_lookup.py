@@ -0,0 +1,73 @@
+"""
+Benchmark the per-transaction CP issuance lookup of the block loop on a
+synthetic block, comparing the former list scan with the tx_hash index.
+
+    python tools/bench_issuance_lookup.py --txs 4000 --issuances 500
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+if os.getcwd().endswith("/indexer"):
+    sys.path.append(os.getcwd())
+    sys.path.append(os.path.join(os.getcwd(), "src"))
+    dotenv_path = os.path.join(os.getcwd(), ".env")
+else:
+    sys.path.append(os.path.join(os.getcwd(), "indexer"))
+    sys.path.append(os.path.join(os.getcwd(), "indexer/src"))
+    dotenv_path = os.path.join(os.getcwd(), "indexer/.env")
+
+from dotenv import load_dotenv
+
+load_dotenv(dotenv_path=dotenv_path, override=True)
+
+from index_core.xcprequest import filter_issuances_by_tx_hash, index_issuances_by_tx_hash  # noqa: E402
+
+
+def list_scan(issuances, tx_hash):
+    """The lookup as it was before issuances were keyed by tx_hash."""
+    filtered_issuances = [issuance for issuance in issuances if issuance["tx_hash"] == tx_hash]
+    return filtered_issuances[0] if filtered_issuances else None
+
+
+def make_block(num_txs, num_issuances):
+    txhash_list = [os.urandom(32).hex() for _ in range(num_txs)]
+    issuances = [
+        {"tx_hash": tx_hash, "cpid": f"A{i}", "message_index": i}
+        for i, tx_hash in enumerate(txhash_list[:: num_txs // num_issuances])
+    ][:num_issuances]
+    return txhash_list, issuances
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare CP issuance lookups per block.")
+    parser.add_argument("--txs", type=int, default=4000, help="transactions in the block")
+    parser.add_argument("--issuances", type=int, default=500, help="stamp issuances in the block")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per lookup, the best one is reported")
+    args = parser.parse_args()
+
+    txhash_list, issuances = make_block(args.txs, args.issuances)
+    indexed = index_issuances_by_tx_hash(issuances)
+    assert all(list_scan(issuances, tx_hash) is filter_issuances_by_tx_hash(indexed, tx_hash) for tx_hash in txhash_list)
+
+    def run_list_scan():
+        for tx_hash in txhash_list:
+            list_scan(issuances, tx_hash)
+
+    def run_indexed():
+        for tx_hash in txhash_list:
+            filter_issuances_by_tx_hash(indexed, tx_hash)
+
+    print(f"{args.txs} transactions, {len(issuances)} issuances per block")
+    scan_time = min(timeit.repeat(run_list_scan, number=1, repeat=args.repeat))
+    index_time = min(timeit.repeat(lambda: index_issuances_by_tx_hash(issuances), number=1, repeat=args.repeat))
+    lookup_time = min(timeit.repeat(run_indexed, number=1, repeat=args.repeat))
+    print(f"list scan: {scan_time * 1000:.2f}ms/block")
+    print(f"  indexed: {(index_time + lookup_time) * 1000:.2f}ms/block (index {index_time * 1000:.2f}ms)")
+    print(f"  speedup: {scan_time / (index_time + lookup_time):.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark the memory and lookup time of the S3 object index on synthetic stamp
+keys, comparing the former dict of {"key", "md5"} dicts with S3ObjectIndex.
+
+    python tools/bench_s3_index.py --entries 1000000
+"""
+
+import argparse
+import os
+import random
+import sys
+import timeit
+import tracemalloc
+
+if os.getcwd().endswith("/indexer"):
+    sys.path.append(os.getcwd())
+    sys.path.append(os.path.join(os.getcwd(), "src"))
+    dotenv_path = os.path.join(os.getcwd(), ".env")
+else:
+    sys.path.append(os.path.join(os.getcwd(), "indexer"))
+    sys.path.append(os.path.join(os.getcwd(), "indexer/src"))
+    dotenv_path = os.path.join(os.getcwd(), "indexer/.env")
+
+from dotenv import load_dotenv
+
+load_dotenv(dotenv_path=dotenv_path, override=True)
+
+from index_core.s3_index import S3ObjectIndex  # noqa: E402
+
+PREFIX = "stamps/"
+SUFFIXES = ["png", "svg", "gif", "html", "webp", "json", "txt"]
+
+
+def iter_items(entries, seed=25):
+    rng = random.Random(seed)
+    for _ in range(entries):
+        yield f"{PREFIX}{rng.randbytes(32).hex()}.{rng.choice(SUFFIXES)}", rng.randbytes(16).hex()
+
+
+def dict_of_dicts(items):
+    """The structure as it was before S3ObjectIndex."""
+    return {key: {"key": key, "md5": md5} for key, md5 in items}
+
+
+def measure(build, entries):
+    """
+    Return the structure `build` makes of the synthetic objects and the bytes it
+    keeps, including the key and md5 strings it holds on to.
+    """
+    tracemalloc.start()
+    structure = build(iter_items(entries))
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return structure, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the memory and lookups of the S3 object index.")
+    parser.add_argument("--entries", type=int, default=1000000, help="objects in the bucket")
+    parser.add_argument("--lookups", type=int, default=100000, help="lookups timed, half of them misses")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per lookup, the best one is reported")
+    args = parser.parse_args()
+
+    mapping, dict_size = measure(dict_of_dicts, args.entries)
+    index, index_size = measure(lambda items: S3ObjectIndex.from_items(items, prefix=PREFIX), args.entries)
+
+    rng = random.Random(0)
+    probes = rng.sample(list(mapping), args.lookups // 2) + [key for key, _ in iter_items(args.lookups // 2, seed=1)]
+    rng.shuffle(probes)
+    assert all(index.get(key) == (mapping[key]["md5"] if key in mapping else None) for key in probes)
+
+    def run_dict():
+        for key in probes:
+            mapping.get(key)
+
+    def run_index():
+        for key in probes:
+            index.get(key)
+
+    dict_time = min(timeit.repeat(run_dict, number=1, repeat=args.repeat))
+    index_time = min(timeit.repeat(run_index, number=1, repeat=args.repeat))
+    print(f"{args.entries} objects, {len(probes)} lookups")
+    print(f" dict of dicts: {dict_size / 2**20:.1f}MiB, {dict_time / len(probes) * 1e6:.2f}us/lookup")
+    print(f" S3ObjectIndex: {index_size / 2**20:.1f}MiB, {index_time / len(probes) * 1e6:.2f}us/lookup")
+    print(f"    memory cut: {dict_size / index_size:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark the "thread" and "process" transaction decode modes on recorded blocks.
+
+Record raw blocks from the node once:
+    python tools/bench_tx_decode.py --record 840000 840001 840002 --out blocks/
+then compare the decode modes on them:
+    python tools/bench_tx_decode.py blocks/*.hex --workers 8
+
+Only the decoding stage is measured. Source address resolution needs the node
+and is identical in both modes.
+"""
+
+import argparse
+import concurrent.futures
+import os
+import sys
+import time
+
+if os.getcwd().endswith("/indexer"):
+    sys.path.append(os.getcwd())
+    sys.path.append(os.path.join(os.getcwd(), "src"))
+    dotenv_path = os.path.join(os.getcwd(), ".env")
+else:
+    sys.path.append(os.path.join(os.getcwd(), "indexer"))
+    sys.path.append(os.path.join(os.getcwd(), "indexer/src"))
+    dotenv_path = os.path.join(os.getcwd(), "indexer/.env")
+
+from dotenv import load_dotenv
+
+load_dotenv(dotenv_path=dotenv_path, override=True)
+
+from bitcoin.core import CBlock  # noqa: E402
+
+import index_core.backend as backend  # noqa: E402
+import index_core.util as util  # noqa: E402
+from index_core.blocks import decode_tx, decode_tx_batch, make_decode_batches  # noqa: E402
+from index_core.exceptions import BTCOnlyError, DecodeError  # noqa: E402
+
+
+def record_blocks(heights, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    for height in heights:
+        block_hex = backend.getblock(backend.getblockhash(height))
+        path = os.path.join(out_dir, f"{height}.hex")
+        with open(path, "w") as f:
+            f.write(block_hex)
+        print(f"recorded {path}")
+
+
+def load_block(path):
+    with open(path) as f:
+        cblock = CBlock.deserialize(bytes.fromhex(f.read().strip()))
+    return backend.get_tx_list(cblock)
+
+
+def decode_one(tx_hex):
+    try:
+        return decode_tx(backend.deserialize(tx_hex))
+    except (DecodeError, BTCOnlyError):
+        return None
+
+
+def bench_threads(blocks):
+    start = time.perf_counter()
+    for txhash_list, raw_transactions in blocks:
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            futures = [executor.submit(decode_one, raw_transactions[tx_hash]) for tx_hash in txhash_list]
+            for future in concurrent.futures.as_completed(futures):
+                future.result()
+    return time.perf_counter() - start
+
+
+def bench_processes(blocks, workers):
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        # start the workers before timing, the indexer keeps its pool for its whole run
+        list(pool.map(decode_tx_batch, [[]] * workers))
+        start = time.perf_counter()
+        for txhash_list, raw_transactions in blocks:
+            batches = make_decode_batches(txhash_list, {}, raw_transactions, workers)
+            list(pool.map(decode_tx_batch, batches))
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the thread and process tx decode modes.")
+    parser.add_argument("blocks", nargs="*", help="files holding the raw hex of a block")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="worker processes")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per mode, the best one is reported")
+    parser.add_argument("--record", type=int, nargs="+", metavar="HEIGHT", help="record blocks from the node instead")
+    parser.add_argument("--out", default="blocks", help="output directory for --record")
+    args = parser.parse_args()
+
+    if args.record:
+        record_blocks(args.record, args.out)
+        return
+    if not args.blocks:
+        parser.error("no recorded blocks given")
+
+    util.CURRENT_BLOCK_INDEX = 0  # get_tx_list checks protocol changes against the current block
+    blocks = [load_block(path) for path in args.blocks]
+    num_txs = sum(len(txhash_list) for txhash_list, _ in blocks)
+    print(f"{len(blocks)} blocks, {num_txs} transactions")
+
+    thread_time = min(bench_threads(blocks) for _ in range(args.repeat))
+    process_time = min(bench_processes(blocks, args.workers) for _ in range(args.repeat))
+    for mode, elapsed in (("thread", thread_time), ("process", process_time)):
+        print(f"{mode:>8}: {elapsed:.3f}s total, {elapsed / len(blocks) * 1000:.1f}ms/block, {num_txs / elapsed:.0f} tx/s")
+    print(f"speedup: {thread_time / process_time:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
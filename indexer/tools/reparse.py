@@ -0,0 +1,44 @@
+"""
+Reparse the stored transactions after a change of the protocol rules, without
+bitcoind or CP. Without --from-block an interrupted reparse is resumed, or all
+blocks are reparsed:
+
+    python tools/reparse.py --from-block 796000
+"""
+
+import argparse
+import os
+import sys
+
+if os.getcwd().endswith("/indexer"):
+    sys.path.append(os.getcwd())
+    sys.path.append(os.path.join(os.getcwd(), "src"))
+    dotenv_path = os.path.join(os.getcwd(), ".env")
+else:
+    sys.path.append(os.path.join(os.getcwd(), "indexer"))
+    sys.path.append(os.path.join(os.getcwd(), "indexer/src"))
+    dotenv_path = os.path.join(os.getcwd(), "indexer/.env")
+
+from dotenv import load_dotenv
+
+load_dotenv(dotenv_path=dotenv_path, override=True)
+
+import index_core.server as server  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reparse the stored transactions.")
+    parser.add_argument("--from-block", type=int, help="first block to reparse")
+    parser.add_argument("--verbose", action="store_true", help="log every parsed transaction")
+    args = parser.parse_args()
+
+    db = server.initialize(log_file="reparse.log")
+    if db is None:
+        print("Failed to connect to database")
+        exit(1)
+
+    server.reparse(db, block_index=args.from_block, quiet=not args.verbose)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+Audit the stored txlist_hash and ledger_hash chains of the blocks table without
+reparsing.
+
+Every block is recomputed from the stamps and SRC-20 operations stored for it,
+with the same rules as `check.consensus_hash`, on top of the hash stored for the
+previous block, and compared with the stored hash and the checkpoints. Each link
+is checked on its own, so a mismatch points at the block that introduced it and
+block ranges are verified in parallel, each seeded from the hashes stored just
+before it:
+
+    python tools/verify_consensus_hashes.py --start 779652 --segment 10000 --workers 8
+
+The messages_hash chain covers every txid of a block, which isn't stored, so it
+can only be verified by a reparse.
+"""
+
+import argparse
+import concurrent.futures
+import itertools
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+
+if os.getcwd().endswith("/indexer"):
+    sys.path.append(os.getcwd())
+    sys.path.append(os.path.join(os.getcwd(), "src"))
+    dotenv_path = os.path.join(os.getcwd(), ".env")
+else:
+    sys.path.append(os.path.join(os.getcwd(), "indexer"))
+    sys.path.append(os.path.join(os.getcwd(), "indexer/src"))
+    dotenv_path = os.path.join(os.getcwd(), "indexer/.env")
+
+from dotenv import load_dotenv
+
+load_dotenv(dotenv_path=dotenv_path, override=True)
+
+import pymysql as mysql  # noqa: E402
+
+import config  # noqa: E402
+import index_core.check as check  # noqa: E402
+from index_core.src20 import process_balance_updates  # noqa: E402
+from index_core.stamp import create_valid_stamp_dict  # noqa: E402
+
+Mismatch = namedtuple("Mismatch", ["block_index", "field", "stored", "calculated", "error"])
+SegmentResult = namedtuple("SegmentResult", ["first", "last", "blocks", "mismatches", "unverifiable"])
+
+
+def connect():
+    return mysql.connect(
+        host=os.environ.get("RDS_HOSTNAME", "db"),
+        user=os.environ.get("RDS_USER"),
+        password=os.environ.get("RDS_PASSWORD"),
+        port=int(os.environ.get("RDS_PORT", 3306)),
+        database=os.environ.get("RDS_DATABASE"),
+    )
+
+
+def stream_by_block(conn, query, params):
+    """Stream the rows of `query`, whose first column is the block index, grouped by block."""
+    cursor = conn.cursor(mysql.cursors.SSCursor)
+    cursor.execute(query, params)
+    return itertools.groupby(cursor, key=lambda row: row[0])
+
+
+def txlist_content(stamp_rows):
+    """The txlist content of a block, as built from its ValidStamp dicts by `create_check_hashes`."""
+    valid_stamps = [
+        create_valid_stamp_dict(
+            stamp,
+            tx_hash,
+            cpid,
+            True,
+            bool(is_valid_base64),
+            stamp_base64,
+            False,
+            # src_data was json.dumps'ed before it was stored in a JSON column
+            json.dumps(json.loads(src_data)) if src_data is not None else "",
+        )
+        for _, stamp, tx_hash, cpid, is_valid_base64, stamp_base64, src_data in stamp_rows
+    ]
+    return str(sorted(valid_stamps, key=lambda x: x.get("stamp_number", "")))
+
+
+def ledger_content(src20_rows):
+    """
+    The ledger content of a block, rebuilt from the balances its valid SRC-20
+    operations left, or None if some of them have no balance stored.
+    """
+    balance_updates = {}
+    for _, _, op, creator, destination, tick, tick_hash, creator_bal, destination_bal in src20_rows:
+        changes = [(destination, destination_bal)]
+        if op == "TRANSFER":
+            changes.insert(0, (creator, creator_bal))
+        for address, balance in changes:
+            if balance is None:
+                return None
+            key = (tick, tick_hash, address)
+            balance_updates.setdefault(key, {"tick": tick, "address": address, "original_amt": 0})["net_change"] = balance
+    return process_balance_updates(list(balance_updates.values()))
+
+
+def verify_segment(first, last):
+    """
+    Verify the txlist and ledger hashes of the blocks from `first` to `last`.
+
+    Returns:
+        SegmentResult: The number of blocks checked, the mismatches and the blocks whose ledger couldn't be rebuilt.
+    """
+    blocks_conn, stamps_conn, src20_conn = connect(), connect(), connect()
+    mismatches = []
+    unverifiable = []
+    try:
+        with blocks_conn.cursor() as cursor:
+            cursor.execute("SELECT txlist_hash FROM blocks WHERE block_index = %s", (first - 1,))
+            row = cursor.fetchone()
+            previous_txlist_hash = row[0] if row else None
+            cursor.execute(
+                """SELECT ledger_hash FROM blocks WHERE ledger_hash IS NOT NULL AND ledger_hash <> '' AND block_index < %s
+                ORDER BY block_index DESC LIMIT 1""",
+                (first,),
+            )
+            row = cursor.fetchone()
+            previous_ledger_hash = row[0] if row else None
+
+        blocks = blocks_conn.cursor(mysql.cursors.SSCursor)
+        blocks.execute(
+            """SELECT block_index, txlist_hash, ledger_hash FROM blocks
+            WHERE block_index BETWEEN %s AND %s ORDER BY block_index""",
+            (first, last),
+        )
+        stamps = stream_by_block(
+            stamps_conn,
+            f"""SELECT block_index, stamp, tx_hash, cpid, is_valid_base64, stamp_base64, src_data
+            FROM {config.STAMP_TABLE}
+            WHERE block_index BETWEEN %s AND %s AND is_btc_stamp = 1 AND cpid IS NOT NULL
+            ORDER BY block_index""",  # nosec
+            (first, last),
+        )
+        src20 = stream_by_block(
+            src20_conn,
+            f"""SELECT block_index, CAST(SUBSTRING_INDEX(id, '_', 1) AS UNSIGNED) AS seq, op, creator, destination,
+                tick, tick_hash, creator_bal, destination_bal
+            FROM {config.SRC20_VALID_TABLE}
+            WHERE block_index BETWEEN %s AND %s AND op IN ('MINT', 'TRANSFER')
+            ORDER BY block_index, seq""",  # nosec
+            (first, last),
+        )
+        stamp_block, stamp_rows = next(stamps, (None, None))
+        src20_block, src20_rows = next(src20, (None, None))
+
+        count = 0
+        for block_index, stored_txlist_hash, stored_ledger_hash in blocks:
+            count += 1
+            block_stamps = []
+            while stamp_block is not None and stamp_block <= block_index:
+                if stamp_block == block_index:
+                    block_stamps = list(stamp_rows)
+                stamp_block, stamp_rows = next(stamps, (None, None))
+            block_src20 = []
+            while src20_block is not None and src20_block <= block_index:
+                if src20_block == block_index:
+                    block_src20 = list(src20_rows)
+                src20_block, src20_rows = next(src20, (None, None))
+
+            contents = {"txlist_hash": txlist_content(block_stamps)}
+            if block_index >= config.CP_SRC20_GENESIS_BLOCK:
+                contents["ledger_hash"] = ledger_content(block_src20)
+                if contents["ledger_hash"] is None:
+                    unverifiable.append(block_index)
+                    del contents["ledger_hash"]
+            stored = {"txlist_hash": stored_txlist_hash, "ledger_hash": stored_ledger_hash or ""}
+            previous = {"txlist_hash": previous_txlist_hash, "ledger_hash": previous_ledger_hash}
+
+            for field, content in contents.items():
+                previous_hash = check.initial_consensus_hash(block_index, field) or previous[field]
+                calculated_hash = error = None
+                try:
+                    calculated_hash = check.calculate_consensus_hash(block_index, field, previous_hash, content)
+                    check.check_consensus_checkpoint(block_index, field, calculated_hash)
+                except (check.ConsensusError, AttributeError, TypeError) as e:
+                    error = str(e)
+                if error or calculated_hash != stored[field]:
+                    mismatches.append(Mismatch(block_index, field, stored[field], calculated_hash, error))
+
+            # the next links are checked against the stored chain, so that one bad block doesn't hide the others
+            previous_txlist_hash = stored_txlist_hash
+            if stored_ledger_hash:
+                previous_ledger_hash = stored_ledger_hash
+        return SegmentResult(first, last, count, mismatches, unverifiable)
+    finally:
+        for conn in (blocks_conn, stamps_conn, src20_conn):
+            conn.close()
+
+
+def init_worker(testnet):
+    configure_network(testnet)
+
+
+def configure_network(testnet):
+    config.TESTNET = testnet
+    config.BLOCK_FIRST = config.BLOCK_FIRST_TESTNET if testnet else config.BLOCK_FIRST_MAINNET
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify the stored consensus hash chains against the stored data.")
+    parser.add_argument("--start", type=int, help="first block to verify, defaults to the first block in the database")
+    parser.add_argument("--end", type=int, help="last block to verify, defaults to the last block in the database")
+    parser.add_argument("--segment", type=int, default=10000, help="blocks verified per task")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--testnet", action="store_true", help="use the testnet genesis and checkpoints")
+    parser.add_argument("--show", type=int, default=20, help="mismatches to print")
+    args = parser.parse_args()
+
+    configure_network(args.testnet)
+    conn = connect()
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT MIN(block_index), MAX(block_index) FROM blocks")
+        min_block, max_block = cursor.fetchone()
+    conn.close()
+    if min_block is None:
+        sys.exit("The blocks table is empty.")
+    first = max(args.start if args.start is not None else min_block, min_block)
+    last = min(args.end if args.end is not None else max_block, max_block)
+
+    segments = [(start, min(start + args.segment - 1, last)) for start in range(first, last + 1, args.segment)]
+    print(f"Verifying blocks {first} to {last} in {len(segments)} segments on {args.workers} processes")
+    start_time = time.time()
+    blocks = 0
+    mismatches = []
+    unverifiable = []
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=args.workers, initializer=init_worker, initargs=(args.testnet,)
+    ) as executor:
+        futures = [executor.submit(verify_segment, *segment) for segment in segments]
+        for future in concurrent.futures.as_completed(futures):
+            result = future.result()
+            blocks += result.blocks
+            mismatches.extend(result.mismatches)
+            unverifiable.extend(result.unverifiable)
+            print(f"  {result.first}-{result.last}: {result.blocks} blocks, {len(result.mismatches)} mismatches")
+
+    mismatches.sort()
+    print(f"Verified {blocks} blocks in {time.time() - start_time:.1f}s")
+    if unverifiable:
+        print(f"{len(unverifiable)} blocks have SRC-20 operations without stored balances, their ledger_hash was skipped")
+    for mismatch in mismatches[: args.show]:
+        print(
+            f"  block {mismatch.block_index} {mismatch.field}: stored {mismatch.stored}, "
+            f"calculated {mismatch.calculated}{' (' + mismatch.error + ')' if mismatch.error else ''}"
+        )
+    if mismatches:
+        sys.exit(f"{len(mismatches)} mismatches")
+    print("All verified links match.")
+
+
+if __name__ == "__main__":
+    main()